@@ -7,11 +7,15 @@ from alembic import context
 
 from app.core.config import settings 
 
-from app.core.database import engine, Base
+from app.core.database import Base, database_url
 from app.auth.models import User,PasswordResetTokens
 from app.cart.models import Cart
 from app.products.models import Products
 from app.orders.models import OrderItem,Orders
+from app.idempotency.models import IdempotencyKeys
+from app.analytics.models import SalesDaily, SalesDailyCategory, SalesDailyProduct
+from app.promotions.models import Promotions
+from app.orders.partitions import PARTITION_NAME
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -23,7 +27,7 @@ if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
 # Set your DB URL dynamically from settings
-db_url = f"postgresql://{settings.db_username}:{settings.db_password}@{settings.db_hostname}:{settings.db_port}/{settings.db_name}"
+db_url = database_url(settings.db_hostname, settings.db_port)
 config.set_main_option("sqlalchemy.url", db_url)
 
 # add your model's MetaData object here
@@ -32,6 +36,22 @@ config.set_main_option("sqlalchemy.url", db_url)
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+
+# The monthly partitions of orders and order_items are managed by app.orders.partitions,
+# keep autogenerate from proposing to drop them or the foreign keys postgres adds for them
+def is_partition(table_name):
+    return bool(PARTITION_NAME.search(table_name)) or table_name.endswith("_default")
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if reflected and compare_to is None:
+        if type_ == "table":
+            return not is_partition(name)
+        if type_ == "foreign_key_constraint":
+            return not is_partition(object.referred_table.name)
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -55,6 +75,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -77,7 +98,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,41 @@
+"""add orders user_id created_at index
+
+Covering index for the keyset paginated order history:
+WHERE user_id = ? ORDER BY created_at DESC, id DESC, selecting only indexed or
+included columns. Built concurrently so the orders table stays writable.
+
+Revision ID: 1155939c9c72
+Revises: e72b77086ff7
+Create Date: 2026-10-19 09:48:37.120562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1155939c9c72'
+down_revision: Union[str, None] = 'e72b77086ff7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_orders_user_id_created_at',
+            'orders',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False,
+            postgresql_include=['total_amount', 'status'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_orders_user_id_created_at', table_name='orders', postgresql_concurrently=True)
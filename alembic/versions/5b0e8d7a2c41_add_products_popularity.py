@@ -0,0 +1,61 @@
+"""add products popularity
+
+Forward decayed units sold per product (see app/products/popularity.py), filled
+from the paid orders, and the indexes behind sort_by=popularity. The indexes are
+built concurrently so the products table stays writable. The backfill uses
+popularity_half_life_days from the settings and the same epoch as the application.
+
+Revision ID: 5b0e8d7a2c41
+Revises: d93a6c2f51e7
+Create Date: 2026-10-19 11:41:17.508230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0e8d7a2c41'
+down_revision: Union[str, None] = 'd93a6c2f51e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('popularity', sa.Float(), server_default='0', nullable=False))
+    op.get_bind().execute(sa.text("""
+        UPDATE products SET popularity = sales.score
+        FROM (
+            SELECT i.product_id,
+                   SUM(i.quantity * power(2, extract(epoch FROM o.created_at - timestamp '2026-01-01')
+                                             / :half_life_seconds)) AS score
+            FROM order_items i
+            JOIN orders o ON o.id = i.order_id AND o.created_at = i.created_at
+            WHERE o.status = 'paid'
+            GROUP BY i.product_id
+        ) AS sales
+        WHERE products.id = sales.product_id
+    """), {"half_life_seconds": settings.popularity_half_life_days * 86400})
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_products_popularity', 'products', [sa.text('popularity DESC'), 'id'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_products_category_popularity', 'products', ['category', sa.text('popularity DESC'), 'id'],
+            unique=False, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_category_popularity', table_name='products', postgresql_concurrently=True)
+        op.drop_index('ix_products_popularity', table_name='products', postgresql_concurrently=True)
+    op.drop_column('products', 'popularity')
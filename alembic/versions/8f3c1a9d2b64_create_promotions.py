@@ -0,0 +1,55 @@
+"""create promotions
+
+Promotion rules applied at checkout (see app/promotions/engine.py), and the
+discount recorded on every order item. The order item columns have a constant
+default, so adding them does not rewrite the partitions.
+
+Revision ID: 8f3c1a9d2b64
+Revises: 5b0e8d7a2c41
+Create Date: 2026-10-19 12:26:48.913604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3c1a9d2b64'
+down_revision: Union[str, None] = '5b0e8d7a2c41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('promotions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('kind', sa.Enum('category_percent', 'buy_x_get_y', 'cart_threshold', name='promotion_kind'), nullable=False),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('percent_off', sa.Float(), nullable=True),
+    sa.Column('buy_quantity', sa.Integer(), nullable=True),
+    sa.Column('get_quantity', sa.Integer(), nullable=True),
+    sa.Column('min_subtotal', sa.Float(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.Column('starts_at', sa.DateTime(), nullable=True),
+    sa.Column('ends_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_promotions_id'), 'promotions', ['id'], unique=False)
+    op.add_column('order_items', sa.Column('discount_amount', sa.Float(), server_default='0', nullable=False))
+    op.add_column('order_items', sa.Column('promotion_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('order_items', 'promotion_id')
+    op.drop_column('order_items', 'discount_amount')
+    op.drop_index(op.f('ix_promotions_id'), table_name='promotions')
+    op.drop_table('promotions')
+    sa.Enum(name='promotion_kind').drop(op.get_bind(), checkfirst=False)
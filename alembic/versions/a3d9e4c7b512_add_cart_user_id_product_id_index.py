@@ -0,0 +1,40 @@
+"""add cart user_id product_id index
+
+Every cart lookup filters on user_id, and the add, update and remove paths on
+product_id too. Without this index each of them scanned the whole cart table.
+Built concurrently so the cart stays writable.
+
+Revision ID: a3d9e4c7b512
+Revises: 8f3c1a9d2b64
+Create Date: 2026-10-19 16:02:11.408317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d9e4c7b512'
+down_revision: Union[str, None] = '8f3c1a9d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_cart_user_id_product_id',
+            'cart',
+            ['user_id', 'product_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_cart_user_id_product_id', table_name='cart', postgresql_concurrently=True)
@@ -0,0 +1,180 @@
+"""partition orders by month
+
+Revision ID: d93a6c2f51e7
+Revises: b410f3811708
+Create Date: 2026-10-19 11:08:41.203516
+
+Turns orders and order_items into tables range partitioned on created_at with one
+partition per month. order_items gets the created_at of its order so that both
+tables are split the same way and an order keeps its items in the same month.
+The existing rows are copied into the new tables inside this migration, the ID
+sequences are kept. Partitions for later months are created by
+`python -m app.orders.partitions create` (also run on application startup).
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd93a6c2f51e7'
+down_revision: Union[str, None] = 'b410f3811708'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months created ahead of the current one
+MONTHS_AHEAD = 3
+
+
+def _detach_sequences() -> None:
+    # Keep the ID sequences alive when the old tables are dropped
+    for table in ('orders', 'order_items'):
+        op.execute(f"ALTER TABLE {table}_old ALTER COLUMN id DROP DEFAULT")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+
+def _attach_sequences() -> None:
+    for table in ('orders', 'order_items'):
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+
+def _rename_old_tables() -> None:
+    # Free the names of the primary key indexes, the tables are copied and dropped afterwards
+    for table in ('orders', 'order_items'):
+        op.rename_table(table, f'{table}_old')
+        op.execute(f"ALTER TABLE {table}_old RENAME CONSTRAINT {table}_pkey TO {table}_old_pkey")
+    _detach_sequences()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('order_items_order_id_fkey', 'order_items', type_='foreignkey')
+    op.drop_index('ix_order_items_id', table_name='order_items')
+    op.drop_index('ix_orders_user_id_created_at', table_name='orders')
+    op.drop_index('ix_orders_id', table_name='orders')
+    _rename_old_tables()
+
+    op.create_table('orders',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('status', postgresql.ENUM('pending', 'paid', 'cancelled', name='order_status', create_type=False), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='orders_user_id_fkey'),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_table('order_items',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price_at_purchase', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id', 'created_at'], ['orders.id', 'orders.created_at'], name='order_items_order_fkey'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], name='order_items_product_id_fkey'),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    _attach_sequences()
+
+    # Rows outside every monthly partition land here instead of failing the insert
+    op.execute("CREATE TABLE orders_default PARTITION OF orders DEFAULT")
+    op.execute("CREATE TABLE order_items_default PARTITION OF order_items DEFAULT")
+
+    # One partition per month, from the oldest order up to MONTHS_AHEAD months from now
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month date := date_trunc('month', LEAST((SELECT min(created_at) FROM orders_old), now()));
+            last_month date := date_trunc('month', now()) + interval '{MONTHS_AHEAD} months';
+            suffix text;
+        BEGIN
+            WHILE month <= last_month LOOP
+                suffix := to_char(month, '"p"YYYY_MM');
+                EXECUTE format('CREATE TABLE orders_%s PARTITION OF orders FOR VALUES FROM (%L) TO (%L)',
+                               suffix, month, month + interval '1 month');
+                EXECUTE format('CREATE TABLE order_items_%s PARTITION OF order_items FOR VALUES FROM (%L) TO (%L)',
+                               suffix, month, month + interval '1 month');
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+
+    op.execute("""
+        INSERT INTO orders (id, user_id, total_amount, status, created_at)
+        SELECT id, user_id, total_amount, status, COALESCE(created_at, now()) FROM orders_old
+    """)
+    op.execute("""
+        INSERT INTO order_items (id, order_id, product_id, quantity, price_at_purchase, created_at)
+        SELECT i.id, i.order_id, i.product_id, i.quantity, i.price_at_purchase, COALESCE(o.created_at, now())
+        FROM order_items_old i LEFT JOIN orders o ON o.id = i.order_id
+    """)
+
+    op.create_index(op.f('ix_orders_id'), 'orders', ['id'], unique=False)
+    op.create_index(
+        'ix_orders_user_id_created_at', 'orders',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+        unique=False, postgresql_include=['total_amount', 'status'],
+    )
+    op.create_index(op.f('ix_order_items_id'), 'order_items', ['id'], unique=False)
+    op.create_index('ix_order_items_order_id_created_at', 'order_items', ['order_id', 'created_at'], unique=False)
+
+    op.drop_table('order_items_old')
+    op.drop_table('orders_old')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('order_items_order_fkey', 'order_items', type_='foreignkey')
+    op.drop_index('ix_order_items_order_id_created_at', table_name='order_items')
+    op.drop_index('ix_order_items_id', table_name='order_items')
+    op.drop_index('ix_orders_user_id_created_at', table_name='orders')
+    op.drop_index('ix_orders_id', table_name='orders')
+    _rename_old_tables()
+
+    op.create_table('orders',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('status', postgresql.ENUM('pending', 'paid', 'cancelled', name='order_status', create_type=False), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='orders_user_id_fkey'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('order_items',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price_at_purchase', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], name='order_items_order_id_fkey'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], name='order_items_product_id_fkey'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _attach_sequences()
+
+    op.execute("""
+        INSERT INTO orders (id, user_id, total_amount, status, created_at)
+        SELECT id, user_id, total_amount, status, created_at FROM orders_old
+    """)
+    op.execute("""
+        INSERT INTO order_items (id, order_id, product_id, quantity, price_at_purchase)
+        SELECT id, order_id, product_id, quantity, price_at_purchase FROM order_items_old
+    """)
+
+    op.create_index(op.f('ix_orders_id'), 'orders', ['id'], unique=False)
+    op.create_index(
+        'ix_orders_user_id_created_at', 'orders',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+        unique=False, postgresql_include=['total_amount', 'status'],
+    )
+    op.create_index(op.f('ix_order_items_id'), 'order_items', ['id'], unique=False)
+
+    # Drops the partitions together with the partitioned tables
+    op.drop_table('order_items_old')
+    op.drop_table('orders_old')
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import Date, cast, delete, distinct, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.analytics import models
+from app.orders.models import OrderItem, Orders, OrderStatus
+from app.products.models import Products
+
+MEASURES = ("revenue", "units", "order_count")
+
+
+def _upsert(model, keys, rows_or_select):
+    if isinstance(rows_or_select, list):
+        query = insert(model).values(rows_or_select)
+    else:
+        query = insert(model).from_select(list(keys) + list(MEASURES), rows_or_select)
+    # Add the new figures to the ones already rolled up
+    return query.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={measure: getattr(model, measure) + getattr(query.excluded, measure) for measure in MEASURES},
+    )
+
+
+def _rows(totals: dict, keys):
+    # Sorted so that concurrent transactions lock the rollup rows in the same order
+    return [
+        dict(zip(keys, key if isinstance(key, tuple) else (key,)), revenue=revenue, units=units, order_count=count)
+        for key, (revenue, units, count) in sorted(totals.items())
+    ]
+
+
+"""
+Add newly paid orders to the sales rollups.
+
+Runs inside the caller's transaction (the checkout finalize step), so the rollups
+are committed together with the order status. The upserts are issued last and in
+a fixed key order to keep row locks on the hot daily rows short and deadlock free.
+
+Args:
+    db (Session): Database session.
+    orders (list): Paid orders, each with created_at and lines (product_id, quantity, price, category, discount).
+
+Returns:
+    None
+"""
+def record_orders(db: Session, orders):
+    daily = defaultdict(lambda: [0.0, 0, 0])
+    by_category = defaultdict(lambda: [0.0, 0, 0])
+    by_product = defaultdict(lambda: [0.0, 0, 0])
+
+    for order in orders:
+        day = order.created_at.date()
+        daily[day][2] += 1
+        seen_categories = set()
+        for line in order.lines:
+            revenue = line.quantity * line.price - line.discount
+            category = line.category or models.UNCATEGORIZED
+            for totals in (daily[day], by_category[(day, category)], by_product[(day, line.product_id)]):
+                totals[0] += revenue
+                totals[1] += line.quantity
+            by_product[(day, line.product_id)][2] += 1
+            if category not in seen_categories:
+                seen_categories.add(category)
+                by_category[(day, category)][2] += 1
+
+    if not daily:
+        return
+    db.execute(_upsert(models.SalesDaily, ("day",), _rows(daily, ("day",))))
+    db.execute(_upsert(models.SalesDailyCategory, ("day", "category"), _rows(by_category, ("day", "category"))))
+    db.execute(_upsert(models.SalesDailyProduct, ("day", "product_id"), _rows(by_product, ("day", "product_id"))))
+
+
+"""
+Remove every row from the sales rollups (first step of a backfill).
+
+Args:
+    db (Session): Database session.
+
+Returns:
+    None
+"""
+def clear_rollups(db: Session):
+    for model in (models.SalesDaily, models.SalesDailyCategory, models.SalesDailyProduct):
+        db.execute(delete(model))
+    db.commit()
+
+
+"""
+Roll up the paid orders with first_id <= id < last_id from the raw tables.
+
+Args:
+    db (Session): Database session.
+    first_id (int): First order ID of the batch.
+    last_id (int): Order ID after the batch.
+
+Returns:
+    None
+"""
+def rollup_order_range(db: Session, first_id: int, last_id: int):
+    day = cast(Orders.created_at, Date).label("day")
+    category = func.coalesce(Products.category, models.UNCATEGORIZED).label("category")
+    revenue = func.sum(OrderItem.quantity * OrderItem.price_at_purchase - OrderItem.discount_amount).label("revenue")
+    units = func.sum(OrderItem.quantity).label("units")
+    order_count = func.count(distinct(Orders.id)).label("order_count")
+
+    def paid_items(*columns):
+        return (
+            select(*columns, revenue, units, order_count)
+            .select_from(Orders)
+            .join(OrderItem, (OrderItem.order_id == Orders.id) & (OrderItem.created_at == Orders.created_at))
+            .where(Orders.status == OrderStatus.paid, Orders.id >= first_id, Orders.id < last_id)
+            .group_by(*columns)
+        )
+
+    db.execute(_upsert(models.SalesDaily, ("day",), paid_items(day)))
+    db.execute(_upsert(
+        models.SalesDailyCategory, ("day", "category"),
+        paid_items(day, category).join(Products, Products.id == OrderItem.product_id),
+    ))
+    db.execute(_upsert(models.SalesDailyProduct, ("day", "product_id"), paid_items(day, OrderItem.product_id)))
+    db.commit()
+
+
+"""
+Read revenue, units and order count from the rollups.
+
+Args:
+    db (Session): Database session.
+    start (date): First day (inclusive).
+    end (date): Last day (inclusive).
+    group_by (str): "day", "category" or "day_category".
+
+Returns:
+    list: Rows with the grouping columns and the summed measures.
+"""
+def get_sales(db: Session, start: date, end: date, group_by: str):
+    if group_by == "day":
+        return db.query(models.SalesDaily).filter(
+            models.SalesDaily.day >= start, models.SalesDaily.day <= end
+        ).order_by(models.SalesDaily.day).all()
+
+    if group_by == "day_category":
+        return db.query(models.SalesDailyCategory).filter(
+            models.SalesDailyCategory.day >= start, models.SalesDailyCategory.day <= end
+        ).order_by(models.SalesDailyCategory.day, models.SalesDailyCategory.category).all()
+
+    revenue = func.sum(models.SalesDailyCategory.revenue)
+    return db.query(
+        models.SalesDailyCategory.category,
+        revenue.label("revenue"),
+        func.sum(models.SalesDailyCategory.units).label("units"),
+        func.sum(models.SalesDailyCategory.order_count).label("order_count"),
+    ).filter(
+        models.SalesDailyCategory.day >= start, models.SalesDailyCategory.day <= end
+    ).group_by(models.SalesDailyCategory.category).order_by(revenue.desc()).all()
+
+
+"""
+Read the best selling products from the rollups.
+
+Args:
+    db (Session): Database session.
+    start (date): First day (inclusive).
+    end (date): Last day (inclusive).
+    limit (int): Number of products to return.
+    rank_by (str): "revenue" or "units".
+
+Returns:
+    list: Rows with product_id, name, category and the summed measures.
+"""
+def get_top_products(db: Session, start: date, end: date, limit: int, rank_by: str):
+    revenue = func.sum(models.SalesDailyProduct.revenue)
+    units = func.sum(models.SalesDailyProduct.units)
+    return db.query(
+        models.SalesDailyProduct.product_id,
+        Products.name,
+        Products.category,
+        revenue.label("revenue"),
+        units.label("units"),
+        func.sum(models.SalesDailyProduct.order_count).label("order_count"),
+    ).join(Products, Products.id == models.SalesDailyProduct.product_id).filter(
+        models.SalesDailyProduct.day >= start, models.SalesDailyProduct.day <= end
+    ).group_by(
+        models.SalesDailyProduct.product_id, Products.name, Products.category
+    ).order_by((units if rank_by == "units" else revenue).desc()).limit(limit).all()
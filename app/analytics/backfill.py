@@ -0,0 +1,52 @@
+"""
+Rebuild the sales rollups from the order history
+
+Clears sales_daily, sales_daily_category and sales_daily_product, then rolls up
+the paid orders in batches of order IDs, one transaction per batch. Orders paid
+after the backfill started are added by checkout as usual; run it when few
+orders are pending so none is counted twice.
+
+Usage:
+    python -m app.analytics.backfill --batch-size 10000
+"""
+import argparse
+import time
+
+from sqlalchemy import func
+
+# The auth models must be loaded first, they import the cart and order models
+from app.auth.models import User
+from app.analytics import analytics_crud
+from app.core.database import SessionLocal
+from app.orders.models import Orders
+
+
+def run(batch_size: int):
+    db = SessionLocal()
+    try:
+        first_id, last_id = db.query(func.min(Orders.id), func.max(Orders.id)).one()
+        analytics_crud.clear_rollups(db)
+        if first_id is None:
+            print("No orders to roll up")
+            return
+
+        started = time.perf_counter()
+        batch_start = first_id
+        while batch_start <= last_id:
+            # The batch ends at the ID batch_size orders further, so gaps in the IDs cost nothing
+            batch_end = db.query(Orders.id).filter(Orders.id >= batch_start).order_by(Orders.id) \
+                .offset(batch_size).limit(1).scalar() or last_id + 1
+            batch_end = min(batch_end, last_id + 1)
+            analytics_crud.rollup_order_range(db, batch_start, batch_end)
+            print(f"Rolled up orders {batch_start} to {batch_end - 1}")
+            batch_start = batch_end
+        print(f"Backfill finished in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the sales rollups from the order history")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Order IDs per transaction")
+    args = parser.parse_args()
+    run(args.batch_size)
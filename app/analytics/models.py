@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Date, Float, ForeignKey, Integer, String
+
+from app.core.database import Base
+
+# Category used in the rollups for products without a category
+UNCATEGORIZED = "uncategorized"
+
+
+# SQLAlchemy model for the daily sales rollup
+class SalesDaily(Base):
+    __tablename__ = "sales_daily"
+
+    day = Column(Date, primary_key=True)
+    revenue = Column(Float, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+
+
+# SQLAlchemy model for the daily sales rollup per product category
+class SalesDailyCategory(Base):
+    __tablename__ = "sales_daily_category"
+
+    day = Column(Date, primary_key=True)
+    category = Column(String, primary_key=True)
+    revenue = Column(Float, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+
+
+# SQLAlchemy model for the daily sales rollup per product
+class SalesDailyProduct(Base):
+    __tablename__ = "sales_daily_product"
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    revenue = Column(Float, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.analytics import schemas, analytics_crud as crud
+from app.auth.dependency import allow_only_admin
+from app.core.database import get_db
+
+import logging
+
+# Create a logger instance for the current module
+logger = logging.getLogger(__name__)
+
+# Create a API Router for the admin sales analytics
+analytics_router = APIRouter(prefix="/admin/analytics", tags=["Admin Analytics"])
+
+# Range used when the caller gives no start date
+DEFAULT_RANGE_DAYS = 30
+
+
+def _date_range(start: Optional[date], end: Optional[date]):
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start, end
+
+
+"""
+Revenue, units and order count (Admin only).
+
+Args:
+    start (date, optional): First day, defaults to 30 days before end.
+    end (date, optional): Last day, defaults to today.
+    group_by (str): "day", "category" or "day_category".
+    db (Session): Database session.
+    admin: Admin user info.
+
+Returns:
+    List[SalesRow]: Sales figures per group.
+"""
+@analytics_router.get("/sales", response_model=List[schemas.SalesRow])
+def sales(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    group_by: str = Query("day", regex="^(day|category|day_category)$"),
+    db: Session = Depends(get_db),
+    admin: dict = Depends(allow_only_admin),
+):
+    try:
+        start, end = _date_range(start, end)
+        rows = crud.get_sales(db, start, end, group_by)
+        logger.info(f"Sales by {group_by} from {start} to {end} retrieved by admin")
+        return rows
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Sales analytics failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve sales analytics")
+
+
+"""
+Best selling products (Admin only).
+
+Args:
+    start (date, optional): First day, defaults to 30 days before end.
+    end (date, optional): Last day, defaults to today.
+    limit (int): Number of products.
+    rank_by (str): "revenue" or "units".
+    db (Session): Database session.
+    admin: Admin user info.
+
+Returns:
+    List[TopProduct]: Products with their sales figures, best first.
+"""
+@analytics_router.get("/top-products", response_model=List[schemas.TopProduct])
+def top_products(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    rank_by: str = Query("revenue", regex="^(revenue|units)$"),
+    db: Session = Depends(get_db),
+    admin: dict = Depends(allow_only_admin),
+):
+    try:
+        start, end = _date_range(start, end)
+        rows = crud.get_top_products(db, start, end, limit, rank_by)
+        logger.info(f"Top products from {start} to {end} retrieved by admin")
+        return rows
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Top products analytics failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve top products")
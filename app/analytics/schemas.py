@@ -0,0 +1,28 @@
+from datetime import date
+from typing import Optional
+from pydantic import BaseModel
+
+
+# Sales figures of one day and/or category
+class SalesRow(BaseModel):
+    day: Optional[date] = None
+    category: Optional[str] = None
+    revenue: float
+    units: int
+    order_count: int
+
+    class Config:
+        orm_mode = True
+
+
+# Sales figures of one product
+class TopProduct(BaseModel):
+    product_id: int
+    name: str
+    category: Optional[str] = None
+    revenue: float
+    units: int
+    order_count: int
+
+    class Config:
+        orm_mode = True
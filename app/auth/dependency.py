@@ -2,11 +2,15 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer
 
 from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import SessionLocal, get_async_db, get_db
 from app.auth import models 
 from app.core.config import settings
+from app.core.tracing import traced
+from app.monitoring.metrics import auth_failures
 
 import logging
 
@@ -27,6 +31,7 @@ Returns:
     models.User: The user object found using the ID inside the token.
 
 """
+@traced("auth.extract_user")
 def extract_user(token: HTTPAuthorizationCredentials= Depends(http_scheme),db: Session = Depends(get_db)) -> models.User:
     try:
         payload = jwt.decode(token.credentials, settings.secret_key, algorithms=[settings.algorithm])
@@ -36,7 +41,10 @@ def extract_user(token: HTTPAuthorizationCredentials= Depends(http_scheme),db: S
 
         if user_in_db is None:
             logger.warning(f"User with ID {user_id} is not found in the database")
+            auth_failures.inc("unknown_user")
             raise HTTPException(status_code=404, detail="User not found")
+        # Detached, so a commit in the route does not expire it and reload it with another query
+        db.expunge(user_in_db)
         return user_in_db
     
     except HTTPException as http_exception:
@@ -44,6 +52,7 @@ def extract_user(token: HTTPAuthorizationCredentials= Depends(http_scheme),db: S
 
     except JWTError:
         logger.warning("JWT token decoding Failed")
+        auth_failures.inc("invalid_token")
         raise HTTPException(status_code=401, detail="Invalid token")
 
 """
@@ -57,6 +66,7 @@ Returns:
 def allow_only_admin(user: models.User = Depends(extract_user)):
     if user.role != "admin":
         logger.warning("Access denied! Admin access required")
+        auth_failures.inc("forbidden")
         raise HTTPException(status_code=403, detail="Admin access required")
     
     logger.info("Access granted")
@@ -73,7 +83,91 @@ Returns:
 def allow_only_user(user: models.User = Depends(extract_user)):
     if user.role != "user":
         logger.warning("Access denied! User access required")
+        auth_failures.inc("forbidden")
         raise HTTPException(status_code=403, detail="User access required")
     
     logger.info("Access granted")
-    return user
\ No newline at end of file
+    return user
+
+
+"""
+Function which checks the current user for routes that wait, like the long poll of
+the order status. The user is loaded in a session of its own that is closed right
+away, so the request holds neither a pooled connection nor a get_db slot while it waits.
+
+Args:
+    token (HTTPAuthorizationCredentials): Token extracted from the Authorization header.
+
+Returns:
+    models.User: The user object if the user is a normal user.
+
+"""
+def allow_only_user_without_session(token: HTTPAuthorizationCredentials = Depends(http_scheme)):
+    db = SessionLocal()
+    try:
+        user = extract_user(token, db)
+    finally:
+        db.close()
+    return allow_only_user(user)
+
+
+# ------------------------------------------------------------------------------------------------------------
+# Dependencies of the async routes (db_mode="async"), the user is loaded through an AsyncSession
+
+"""
+Function which extract the user info with an async session
+
+Args:
+    token (HTTPAuthorizationCredentials): Token extracted from the Authorization header.
+    db (AsyncSession): Async database session.
+
+Returns:
+    models.User: The user object found using the ID inside the token.
+
+"""
+@traced("auth.extract_user")
+async def extract_user_async(token: HTTPAuthorizationCredentials = Depends(http_scheme),
+                             db: AsyncSession = Depends(get_async_db)) -> models.User:
+    try:
+        payload = jwt.decode(token.credentials, settings.secret_key, algorithms=[settings.algorithm])
+        user_id: str = payload.get("sub")
+
+        user_in_db = (await db.execute(select(models.User).where(models.User.id == int(user_id)))).scalar_one_or_none()
+
+        if user_in_db is None:
+            logger.warning(f"User with ID {user_id} is not found in the database")
+            auth_failures.inc("unknown_user")
+            raise HTTPException(status_code=404, detail="User not found")
+        # Detached, a rollback in the route would expire it and an async session cannot reload it lazily
+        db.expunge(user_in_db)
+        return user_in_db
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except JWTError:
+        logger.warning("JWT token decoding Failed")
+        auth_failures.inc("invalid_token")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+"""
+Args:
+    user (models.User): The current authenticated user extracted from the token.
+
+Returns:
+    models.User: The same user object if the user is an admin.
+
+"""
+async def allow_only_admin_async(user: models.User = Depends(extract_user_async)):
+    return allow_only_admin(user)
+
+"""
+Args:
+    user (models.User): The current authenticated user extracted from the token.
+
+Returns:
+    models.User: The same user object if the user is a normal user.
+
+"""
+async def allow_only_user_async(user: models.User = Depends(extract_user_async)):
+    return allow_only_user(user)
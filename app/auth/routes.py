@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from app.auth.dependency import allow_only_admin, allow_only_user
 from app.auth.utils import create_access_token, create_refresh_token, hash_password, send_reset_password_email, verify_password
 from app.core.database import get_db
+from app.monitoring.metrics import auth_failures
 
 import logging
 
@@ -87,6 +88,7 @@ def sign_in(request:schemas.SignInRequest,db: Session= Depends(get_db)):
         # If email doesn't exist or password is incorrect, raise an exception
         if not user_in_db or not verify_password(request.password,user_in_db.hashed_password):
             logger.warning("Invalid credentials")
+            auth_failures.inc("invalid_credentials")
             raise HTTPException(status_code=401,detail="Invalid credentials")
         
         # If Login Credential correct then generete access and refresh tokens
@@ -176,6 +178,7 @@ def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(
 
         # If token doesn't exist or has expired, raise an exception
         if not token_entry or token_entry.expiration_time < datetime.utcnow():
+            auth_failures.inc("invalid_reset_token")
             raise HTTPException(status_code=400, detail="Invalid or expired token")
 
         # Get the user object
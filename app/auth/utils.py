@@ -4,6 +4,8 @@ from passlib.context import CryptContext
 
 from jose import jwt
 from datetime import datetime, timedelta
+from typing import Optional
+from app.core import tracing
 from app.core.config import settings
 
 password = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -18,6 +20,7 @@ Args:
 Returns:
     The hashed password by using hash() function
 """
+@tracing.traced("auth.bcrypt_hash")
 def hash_password(pwd: str):
     return password.hash(pwd)
 
@@ -32,6 +35,7 @@ Args:
 Returns:
     bool value(True or False)
 """
+@tracing.traced("auth.bcrypt_verify")
 def verify_password(plain_password, hashed_password):
     return password.verify(plain_password, hashed_password)
 
@@ -47,9 +51,9 @@ Args:
 Returns:
     str: Encoded JWT access token as a string.
 """
-def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=settings.access_token_expire_minutes)):
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
-    expire = datetime.now() + expires_delta
+    expire = datetime.now() + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
@@ -87,7 +91,8 @@ def send_reset_password_email(to_email: str, token: str):
     reset_link = f"http://localhost:3000/reset-password?token={token}"
     msg.set_content(f"Hello,\nWe received a request to reset your password.\nClick the link below to reset it:\n{reset_link}\n\nThis link will expire in 30 minutes. If you didn’t request a password reset, you can safely ignore this email.\n\nThanks,\nYour Support Team")
 
-    with smtplib.SMTP(settings.smtp_host, settings.smtp_port) as server:
-        server.starttls()
-        server.login(settings.smtp_email, settings.smtp_password)
-        server.send_message(msg)
\ No newline at end of file
+    with tracing.span("smtp.send", tracing.CLIENT, {"server.address": settings.smtp_host}):
+        with smtplib.SMTP(settings.smtp_host, settings.smtp_port) as server:
+            server.starttls()
+            server.login(settings.smtp_email, settings.smtp_password)
+            server.send_message(msg)
\ No newline at end of file
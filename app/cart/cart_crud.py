@@ -1,4 +1,7 @@
-from sqlalchemy.orm import Session
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session, joinedload
 from app.cart import models, schemas
 
 """
@@ -8,29 +11,37 @@ Args:
     db: Database Session
     user_id: ID of the user
     item: Data of item to be added into the cart
+    before_commit: Called with the flushed cart item inside the transaction, before it commits
 
 Return:
     The created or updated cart item
 """
-def add_to_cart(db: Session, user_id: int, item: schemas.CartItemCreate):
+def add_to_cart(db: Session, user_id: int, item: schemas.CartItemCreate, before_commit: Optional[Callable] = None):
     # Check if the item already exists in the cart
-    existing_product = db.query(models.Cart).filter_by(user_id=user_id, product_id=item.product_id).first()
+    existing_product = db.execute(cart_item_query(user_id, item.product_id)).scalars().first()
     
     if existing_product:
         # If it exists, increase the quantity
         existing_product.quantity += item.quantity
-        db.commit()
-        db.refresh(existing_product)
-        return existing_product
-    
-    # If it does not exist, create a new cart item
-    cart_item = models.Cart(**item.dict(), user_id=user_id)
-    db.add(cart_item)
+        cart_item = existing_product
+    else:
+        # If it does not exist, create a new cart item
+        cart_item = models.Cart(**item.dict(), user_id=user_id)
+        db.add(cart_item)
+
+    if before_commit is not None:
+        db.flush()
+        before_commit(cart_item)
     db.commit()
     db.refresh(cart_item)
     return cart_item
 
 
+# The statements below are shared with cart_crud_async
+def cart_item_query(user_id: int, product_id: int):
+    return select(models.Cart).filter_by(user_id=user_id, product_id=product_id)
+
+
 """
 Function to get all items of user's cart
 
@@ -39,14 +50,18 @@ Args:
     user_id: ID of the user
 
 Return:
-    All cart item of specific user 
+    All cart item of specific user, with their product loaded in the same query
 """
 def get_cart(db: Session, user_id: int):
     # Find list of all item in the cart of specific user 
-    cart_items = db.query(models.Cart).filter_by(user_id=user_id).all()
+    cart_items = db.execute(cart_query(user_id)).scalars().all()
     return cart_items
 
 
+def cart_query(user_id: int):
+    return select(models.Cart).options(joinedload(models.Cart.product)).filter_by(user_id=user_id)
+
+
 """
 Function to update quatity of specific item in the cart
 
@@ -60,14 +75,21 @@ Return:
     Update cart items or none otherwise
 """
 def update_quantity(db: Session, user_id: int, product_id: int, quantity: int):
-    # Check if the item already exists in the cart
-    item = db.query(models.Cart).filter_by(user_id=user_id, product_id=product_id).first()
+    # Update the item in one statement, no row is returned if it is not in the cart
+    item = db.execute(update_quantity_query(user_id, product_id, quantity)).scalars().first()
+    db.commit()
     if item:
-        item.quantity = quantity
-        db.commit()
         db.refresh(item)
-        return item
-    return None
+    return item
+
+
+def update_quantity_query(user_id: int, product_id: int, quantity: int):
+    return (
+        update(models.Cart)
+        .where(models.Cart.user_id == user_id, models.Cart.product_id == product_id)
+        .values(quantity=quantity)
+        .returning(models.Cart)
+    )
 
 """
 Function to remove item from user's cart
@@ -81,10 +103,15 @@ Return:
     Boolean value (True:If item deleted successfully otherwise False)
 """
 def remove_from_cart(db: Session, user_id: int, product_id: int):
-    # Check if the item already exists in the cart
-    item = db.query(models.Cart).filter_by(user_id=user_id, product_id=product_id).first()
-    if item:
-        db.delete(item)
-        db.commit()
-        return True
-    return False
+    # Delete the item in one statement, no row is returned if it is not in the cart
+    removed = db.execute(remove_from_cart_query(user_id, product_id)).first()
+    db.commit()
+    return removed is not None
+
+
+def remove_from_cart_query(user_id: int, product_id: int):
+    return (
+        delete(models.Cart)
+        .where(models.Cart.user_id == user_id, models.Cart.product_id == product_id)
+        .returning(models.Cart.id)
+    )
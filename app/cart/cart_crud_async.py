@@ -0,0 +1,85 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cart import models, schemas
+from app.cart import cart_crud as crud
+
+# Async versions of cart_crud for the async routes, same statements through an AsyncSession
+
+
+"""
+Function to add item to the user cart
+
+Args:
+    db: Async database Session
+    user_id: ID of the user
+    item: Data of item to be added into the cart
+
+Return:
+    The created or updated cart item
+"""
+async def add_to_cart(db: AsyncSession, user_id: int, item: schemas.CartItemCreate):
+    # Check if the item already exists in the cart
+    existing_product = (await db.execute(crud.cart_item_query(user_id, item.product_id))).scalars().first()
+
+    if existing_product:
+        # If it exists, increase the quantity
+        existing_product.quantity += item.quantity
+        await db.commit()
+        await db.refresh(existing_product)
+        return existing_product
+
+    # If it does not exist, create a new cart item
+    cart_item = models.Cart(**item.dict(), user_id=user_id)
+    db.add(cart_item)
+    await db.commit()
+    await db.refresh(cart_item)
+    return cart_item
+
+
+"""
+Function to get all items of user's cart
+
+Args:
+    db: Async database Session
+    user_id: ID of the user
+
+Return:
+    All cart item of specific user, with their product loaded in the same query
+"""
+async def get_cart(db: AsyncSession, user_id: int):
+    return (await db.execute(crud.cart_query(user_id))).scalars().all()
+
+
+"""
+Function to update quatity of specific item in the cart
+
+Args:
+    db: Async database Session
+    user_id: ID of the user
+    product_id: Id of the product
+    quantity: New quantity value
+
+Return:
+    Update cart items or none otherwise
+"""
+async def update_quantity(db: AsyncSession, user_id: int, product_id: int, quantity: int):
+    item = (await db.execute(crud.update_quantity_query(user_id, product_id, quantity))).scalars().first()
+    await db.commit()
+    if item:
+        await db.refresh(item)
+    return item
+
+"""
+Function to remove item from user's cart
+
+Args:
+    db: Async database Session
+    user_id: ID of the user
+    product_id: Id of the product
+
+Return:
+    Boolean value (True:If item deleted successfully otherwise False)
+"""
+async def remove_from_cart(db: AsyncSession, user_id: int, product_id: int):
+    removed = (await db.execute(crud.remove_from_cart_query(user_id, product_id))).first()
+    await db.commit()
+    return removed is not None
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy import Column, ForeignKey, Index, Integer
 
 from sqlalchemy.orm import relationship
 
@@ -19,3 +19,8 @@ class Cart(Base):
     user = relationship("User", back_populates="cart_items")
     product = relationship("Products")
 
+    # Every cart lookup is by user, the add, update and remove paths by user and product
+    __table_args__ = (
+        Index("ix_cart_user_id_product_id", user_id, product_id),
+    )
+
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse
 
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
-from typing import List
+from typing import List, Optional
 
 from app.core.database import get_db
+from app.core.replicas import get_read_db, track_writes
 from app.cart import schemas, cart_crud as crud
 from app.auth.dependency import allow_only_user
+from app.idempotency.utils import hash_request, run_idempotent
+from app.monitoring.metrics import cart_adds
+from app.promotions.engine import CartLine, CompiledPromotions, promotion_engine
 
 import logging
 
@@ -15,26 +20,66 @@ import logging
 logger = logging.getLogger(__name__)
 
 # Create a API router for Cart  
-cart_router = APIRouter(prefix="/cart", tags=["Cart"])
+cart_router = APIRouter(prefix="/cart", tags=["Cart"], dependencies=[Depends(track_writes)])
+
+
+"""
+Function to add an item to the cart at most once per Idempotency-Key
+
+Args:
+    db: Database session
+    user_id: ID of the authenticated user
+    item: The product ID and quantity to add
+    idempotency_key: Value of the Idempotency-Key header
+
+Returns:
+    JSONResponse with the cart item, stored or replayed
+"""
+def add_item_once(db: Session, user_id: int, item: schemas.CartItemCreate, idempotency_key: str):
+    def response(cart_item):
+        return 200, schemas.CartItemResponse.model_validate(cart_item, from_attributes=True).model_dump()
+
+    # The response is stored with the added item, a retry after a crash cannot add it twice
+    def add(store_response):
+        cart_item = crud.add_to_cart(
+            db, user_id, item, before_commit=lambda cart_item: store_response(*response(cart_item))
+        )
+        logger.info("Item %s added to cart for user %s.", item.product_id, user_id)
+        return response(cart_item)
+
+    status_code, body, replayed = run_idempotent(
+        db, user_id, "cart:add", idempotency_key, hash_request("cart:add", item), add
+    )
+    return JSONResponse(status_code=status_code, content=body,
+                        headers={"Idempotent-Replayed": "true" if replayed else "false"})
 
 
 """
 Function  to add item in the cart
 
+A request sent with an Idempotency-Key header is applied only once, so a retried
+add does not increase the quantity a second time.
+
 Args:
     item: The product ID and quantity to add
     db: Database session
     user: The currently authenticated user
+    idempotency_key: Optional value of the Idempotency-Key header
 
 Returns:
     The added or updated cart item.
 """
 @cart_router.post("/", response_model=schemas.CartItemResponse)
-def add_item(item: schemas.CartItemCreate, db: Session = Depends(get_db), user=Depends(allow_only_user)):
+def add_item(item: schemas.CartItemCreate, db: Session = Depends(get_db), user=Depends(allow_only_user),
+             idempotency_key: Optional[str] = Header(None)):
     try:
-        logger.info(f"User {user.id} is adding item {item.product_id} to cart.")
-        cart_item = crud.add_to_cart(db, user.id, item)
-        logger.info(f"Item {item.product_id} added to cart for user {user.id}.")
+        logger.info("User %s is adding item %s to cart.", user.id, item.product_id)
+        if idempotency_key is None:
+            cart_item = crud.add_to_cart(db, user.id, item)
+            logger.info("Item %s added to cart for user %s.", item.product_id, user.id)
+        else:
+            cart_item = add_item_once(db, user.id, item, idempotency_key)
+        cart_adds.inc()
         return cart_item
     
     except SQLAlchemyError as e:
@@ -44,23 +89,48 @@ def add_item(item: schemas.CartItemCreate, db: Session = Depends(get_db), user=D
 
 
 """
-Function to add an item to the user's cart.
+Function to price cart items with the discounts checkout would apply
+
+Args:
+    cart_items: Cart items with their product loaded
+    promotions: Compiled promotions to apply
+
+Returns:
+    List of CartItemPreview
+"""
+def preview_cart(cart_items, promotions: CompiledPromotions):
+    lines = [
+        CartLine(item.product_id, item.quantity, item.product.price, item.product.category)
+        for item in cart_items
+    ]
+    return [
+        schemas.CartItemPreview(
+            id=item.id, user_id=item.user_id, product_id=item.product_id, quantity=item.quantity,
+            price=line.price, discount_amount=discount.discount, promotion_id=discount.promotion_id,
+        )
+        for item, line, discount in zip(cart_items, lines, promotion_engine.discounts(lines, promotions))
+    ]
+
+
+"""
+Function to view the user's cart with a preview of the promotion discounts.
+
+The discounts are the ones checkout would apply with the current promotions.
 
 Args:
-    item : The product ID and quantity to add.
     db : Database Session
     user : The currently authenticated user
 
 Returns:
-    The added or updated cart item.
+    The cart items with their price, discount and promotion.
 """
-@cart_router.get("/", response_model=List[schemas.CartItemResponse])
-def view_cart(db: Session = Depends(get_db), user=Depends(allow_only_user)):
+@cart_router.get("/", response_model=List[schemas.CartItemPreview])
+def view_cart(db: Session = Depends(get_read_db), user=Depends(allow_only_user)):
     try:
-        logger.info(f"Retrieving cart items for user {user.id}")
+        logger.info("Retrieving cart items for user %s", user.id)
         cart_items = crud.get_cart(db, user.id)
-        logger.info(f"{len(cart_items)} items found in cart for user {user.id}")
-        return cart_items
+        logger.info("%s items found in cart for user %s", len(cart_items), user.id)
+        return preview_cart(cart_items, promotion_engine.current())
 
     except SQLAlchemyError as e:
         logger.exception(f"Database error while retrieving cart for user {user.id}: {e}")
@@ -82,14 +152,14 @@ Returns:
 @cart_router.put("/{product_id}", response_model=schemas.CartItemResponse)
 def update_item_quantity(product_id: int, update: schemas.CartItemUpdate, db: Session = Depends(get_db), user=Depends(allow_only_user)):
     try:
-        logger.info(f"User {user.id} attempting to update item {product_id} to quantity {update.quantity}")
+        logger.info("User %s attempting to update item %s to quantity %s", user.id, product_id, update.quantity)
         updated = crud.update_quantity(db, user.id, product_id, update.quantity)
 
         if not updated:
             logger.warning(f"Item not found in cart for user {user.id}")
             raise HTTPException(status_code=404, detail="Item not found in cart")
 
-        logger.info(f"Cart item {product_id} updated to quantity {update.quantity} for user {user.id}")
+        logger.info("Cart item %s updated to quantity %s for user %s", product_id, update.quantity, user.id)
         return updated
     
     except SQLAlchemyError as e:
@@ -112,7 +182,7 @@ Returns:
 @cart_router.delete("/{product_id}")
 def delete_item(product_id: int, db: Session = Depends(get_db), user=Depends(allow_only_user)):
     try:
-        logger.info(f"User {user.id} attempting to remove item {product_id} from cart.")
+        logger.info("User %s attempting to remove item %s from cart.", user.id, product_id)
         success = crud.remove_from_cart(db, user.id, product_id)
         if not success:
             logger.warning("Item not found in the cart of user:{user.id}")
@@ -0,0 +1,151 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+
+from typing import List, Optional
+
+from app.core.database import SessionLocal, get_async_db
+from app.core.replicas import get_async_read_db, track_writes
+from app.cart import schemas, cart_crud_async as crud
+from app.cart.routes import add_item_once, preview_cart
+from app.auth.dependency import allow_only_user_async
+from app.monitoring.metrics import cart_adds
+from app.promotions.engine import promotion_engine
+
+import anyio
+import logging
+
+# Async versions of the cart routes, served on the event loop when db_mode is "async"
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+# Create a API router for Cart
+cart_router = APIRouter(prefix="/cart", tags=["Cart"], dependencies=[Depends(track_writes)])
+
+
+# The idempotency store waits on threads and polls the database, so it keeps running in the threadpool
+def _add_item_once(user_id: int, item: schemas.CartItemCreate, idempotency_key: str):
+    db = SessionLocal()
+    try:
+        return add_item_once(db, user_id, item, idempotency_key)
+    finally:
+        db.close()
+
+
+"""
+Function  to add item in the cart
+
+A request sent with an Idempotency-Key header is applied only once, so a retried
+add does not increase the quantity a second time.
+
+Args:
+    item: The product ID and quantity to add
+    db: Async database session
+    user: The currently authenticated user
+    idempotency_key: Optional value of the Idempotency-Key header
+
+Returns:
+    The added or updated cart item.
+"""
+@cart_router.post("/", response_model=schemas.CartItemResponse)
+async def add_item(item: schemas.CartItemCreate, db: AsyncSession = Depends(get_async_db),
+                   user=Depends(allow_only_user_async), idempotency_key: Optional[str] = Header(None)):
+    try:
+        logger.info("User %s is adding item %s to cart.", user.id, item.product_id)
+        if idempotency_key is None:
+            cart_item = await crud.add_to_cart(db, user.id, item)
+            logger.info("Item %s added to cart for user %s.", item.product_id, user.id)
+        else:
+            cart_item = await anyio.to_thread.run_sync(_add_item_once, user.id, item, idempotency_key)
+        cart_adds.inc()
+        return cart_item
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error("Error! While adding item in the cart")
+        raise HTTPException(status_code=500, detail="Error adding item to cart")
+
+
+"""
+Function to view the user's cart with a preview of the promotion discounts.
+
+Args:
+    db : Async database session
+    user : The currently authenticated user
+
+Returns:
+    The cart items with their price, discount and promotion.
+"""
+@cart_router.get("/", response_model=List[schemas.CartItemPreview])
+async def view_cart(db: AsyncSession = Depends(get_async_read_db), user=Depends(allow_only_user_async)):
+    try:
+        logger.info("Retrieving cart items for user %s", user.id)
+        cart_items = await crud.get_cart(db, user.id)
+        logger.info("%s items found in cart for user %s", len(cart_items), user.id)
+        promotions = promotion_engine.current()
+        return preview_cart(cart_items, promotions)
+
+    except SQLAlchemyError as e:
+        logger.exception(f"Database error while retrieving cart for user {user.id}: {e}")
+        raise HTTPException(status_code=500, detail="Error retrieving cart items")
+
+
+"""
+Function to update the quantity of a specific item in the user's cart.
+
+Args:
+    product_id : ID of the product to update.
+    update : New quantity for the item.
+    db: Async database session
+    user: The authenticated user making the request.
+
+Returns:
+    The updated cart item.
+"""
+@cart_router.put("/{product_id}", response_model=schemas.CartItemResponse)
+async def update_item_quantity(product_id: int, update: schemas.CartItemUpdate,
+                               db: AsyncSession = Depends(get_async_db), user=Depends(allow_only_user_async)):
+    try:
+        logger.info("User %s attempting to update item %s to quantity %s", user.id, product_id, update.quantity)
+        updated = await crud.update_quantity(db, user.id, product_id, update.quantity)
+
+        if not updated:
+            logger.warning(f"Item not found in cart for user {user.id}")
+            raise HTTPException(status_code=404, detail="Item not found in cart")
+
+        logger.info("Cart item %s updated to quantity %s for user %s", product_id, update.quantity, user.id)
+        return updated
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.exception("Database error while updating cart item ")
+        raise HTTPException(status_code=500, detail="Error updating cart item")
+
+
+"""
+Function to delete a specific item from the user's cart.
+
+Args:
+    product_id : ID of the product to remove from cart.
+    db : Async database session
+    user : The authenticated user making the request.
+
+Returns:
+    A message indicating successful removal.
+"""
+@cart_router.delete("/{product_id}")
+async def delete_item(product_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(allow_only_user_async)):
+    try:
+        logger.info("User %s attempting to remove item %s from cart.", user.id, product_id)
+        success = await crud.remove_from_cart(db, user.id, product_id)
+        if not success:
+            logger.warning(f"Item not found in the cart of user:{user.id}")
+            raise HTTPException(status_code=404, detail="Item not found in cart")
+        return {"message": "Item removed from cart"}
+
+    except SQLAlchemyError:
+        await db.rollback()
+        logger.error("Error while deleting the item from the cart")
+        raise HTTPException(status_code=500, detail="Error removing cart item")
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 # Cart item base schema
@@ -20,3 +22,9 @@ class CartItemResponse(CartItemBase):
 
     class Config:
         orm_mode = True
+
+# Cart item with the current price and the discount it would get at checkout
+class CartItemPreview(CartItemResponse):
+    price: float
+    discount_amount: float = 0
+    promotion_id: Optional[int] = None
@@ -0,0 +1,302 @@
+from datetime import datetime, timedelta
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.analytics import analytics_crud
+from app.cart.models import Cart
+from app.orders.cache import invalidate_order
+from app.orders.models import Orders, OrderItem, OrderStatus
+from app.products import popularity
+from app.products.models import Products
+from app.promotions.engine import promotion_engine
+from app.recommendations.index import related_products
+
+# A pending order older than this was abandoned (the process died during payment or in the queue)
+PENDING_TIMEOUT = timedelta(minutes=5)
+
+
+# Raised when the user already has an order that is still being placed
+class OrderAlreadyPending(Exception):
+    pass
+
+
+# Cart line priced at checkout, with the discount of the promotion applied to it
+class PricedLine(NamedTuple):
+    cart_id: int
+    product_id: int
+    quantity: int
+    price: float
+    category: str
+    discount: float
+    promotion_id: Optional[int]
+
+
+# Pending order created by reserve_order, together with the cart lines it was priced from
+class ReservedOrder(NamedTuple):
+    order_id: int
+    user_id: int
+    total: float
+    created_at: datetime
+    lines: list
+
+
+"""
+Function to load the cart of a user together with the product prices
+
+The cart rows are locked so that two concurrent checkouts of the same cart
+cannot both turn it into an order.
+
+Args:
+    db: Database Session
+    user_id: ID of the user
+
+Return:
+    List of rows (cart_id, product_id, quantity, price, category) fetched in one query
+"""
+def get_cart_lines(db: Session, user_id: int):
+    return db.execute(cart_lines_query(user_id)).all()
+
+
+# The statements below are shared with checkout_crud_async
+
+def cart_lines_query(user_id: int):
+    return (
+        select(Cart.id.label("cart_id"), Cart.product_id, Cart.quantity, Products.price, Products.category)
+        .join(Products, Products.id == Cart.product_id)
+        .where(Cart.user_id == user_id)
+        .order_by(Cart.id)
+        .with_for_update(of=Cart)
+    )
+
+
+def price_lines(lines, promotions) -> List[PricedLine]:
+    return [
+        PricedLine(*line, *discount)
+        for line, discount in zip(lines, promotion_engine.discounts(lines, promotions))
+    ]
+
+
+def pending_order_query(user_id: int):
+    return select(Orders.id).where(Orders.user_id == user_id, Orders.status == OrderStatus.pending).limit(1)
+
+
+def insert_order_query(user_id: int, total: float, created_at: datetime):
+    return (
+        insert(Orders)
+        .values(user_id=user_id, total_amount=total, status=OrderStatus.pending, created_at=created_at)
+        .returning(Orders.id)
+    )
+
+
+def complete_orders_query(orders: List[ReservedOrder]):
+    # Matching on the partition key as well lets postgres skip the other monthly partitions
+    return (
+        update(Orders)
+        .where(
+            tuple_(Orders.id, Orders.created_at).in_([(order.order_id, order.created_at) for order in orders]),
+            Orders.status == OrderStatus.pending,
+        )
+        .values(status=OrderStatus.paid)
+        .returning(Orders.id)
+    )
+
+
+def delete_cart_lines_query(orders: List[ReservedOrder]):
+    return delete(Cart).where(Cart.id.in_([line.cart_id for order in orders for line in order.lines]))
+
+
+def cancel_orders_query(order_ids: List[int]):
+    return (
+        update(Orders)
+        .where(Orders.id.in_(order_ids), Orders.status == OrderStatus.pending)
+        .values(status=OrderStatus.cancelled)
+        .returning(Orders.user_id, Orders.id)
+    )
+
+
+def stale_orders_query(created_before: datetime, user_id: Optional[int] = None):
+    query = (
+        update(Orders)
+        .where(Orders.status == OrderStatus.pending, Orders.created_at < created_before)
+        .values(status=OrderStatus.cancelled)
+        .returning(Orders.user_id, Orders.id)
+    )
+    if user_id is not None:
+        query = query.where(Orders.user_id == user_id)
+    return query
+
+
+def order_status_query(user_id: int, order_id: int):
+    return select(Orders.status).where(Orders.id == order_id, Orders.user_id == user_id)
+
+
+# Clear the cached details of the orders and feed the related products index after commit
+def after_complete(orders: List[ReservedOrder]):
+    for order in orders:
+        invalidate_order(order.user_id, order.order_id)
+    related_products.add_orders([[line.product_id for line in order.lines] for order in orders])
+
+
+def order_item_rows(order: ReservedOrder) -> list:
+    return [
+        {
+            "order_id": order.order_id,
+            "product_id": line.product_id,
+            "quantity": line.quantity,
+            "price_at_purchase": line.price,
+            "discount_amount": line.discount,
+            "promotion_id": line.promotion_id,
+            # Partition key, the items go to the same monthly partition as their order
+            "created_at": order.created_at,
+        }
+        for line in order.lines
+    ]
+
+
+"""
+Function to reserve a pending order for the cart of a user (first checkout phase)
+
+Only the order row is written here, in one short transaction that prices the
+locked cart and applies the active promotions. Payment runs after this commit,
+and the order items, the cart delete and the status change are written
+afterwards by complete_orders().
+
+Args:
+    db: Database Session
+    user_id: ID of the user
+    before_commit: Called with the ReservedOrder inside the transaction, before it commits
+
+Return:
+    ReservedOrder, or None if the cart is empty
+
+Raises:
+    OrderAlreadyPending: If an earlier order of the user is still pending
+"""
+def reserve_order(db: Session, user_id: int, before_commit: Optional[Callable] = None):
+    # Compiled before the cart is locked, a reload reads the promotions in its own session
+    promotions = promotion_engine.current()
+    try:
+        lines = get_cart_lines(db, user_id)
+        if not lines:
+            db.rollback()
+            return None
+        lines = price_lines(lines, promotions)
+
+        # The cart rows are locked, so a concurrent reservation of the same cart sees this order after commit
+        cancel_stale_orders(db, datetime.now() - PENDING_TIMEOUT, user_id=user_id, commit=False)
+        pending = db.execute(pending_order_query(user_id)).first()
+        if pending:
+            db.rollback()
+            raise OrderAlreadyPending(pending.id)
+
+        total = sum(line.quantity * line.price - line.discount for line in lines)
+        created_at = datetime.now()
+        order_id = db.execute(insert_order_query(user_id, total, created_at)).scalar_one()
+        reserved = ReservedOrder(order_id, user_id, total, created_at, lines)
+        if before_commit is not None:
+            before_commit(reserved)
+        db.commit()
+
+    except Exception:
+        db.rollback()
+        raise
+
+    return reserved
+
+
+"""
+Function to complete paid orders in a single transaction (last checkout phase)
+
+The status is switched first, so orders that stopped being pending in the meantime
+(e.g. cancelled as stale) are skipped. Then the order items are bulk inserted, the
+cart rows deleted and the sales rollups updated. The queued checkout passes many
+orders at once (group commit).
+
+Args:
+    db: Database Session
+    orders: Reserved orders to mark as paid
+    before_commit: Called with the completed orders inside the transaction, before it commits, if any completed
+
+Return:
+    List of the IDs of the orders that were completed
+"""
+def complete_orders(db: Session, orders: List[ReservedOrder], before_commit: Optional[Callable] = None):
+    try:
+        completed = set(db.execute(complete_orders_query(orders)).scalars().all())
+        orders = [order for order in orders if order.order_id in completed]
+
+        if orders:
+            db.execute(insert(OrderItem), [row for order in orders for row in order_item_rows(order)])
+            db.execute(delete_cart_lines_query(orders))
+            popularity.record_orders(db, orders)
+            analytics_crud.record_orders(db, orders)
+            if before_commit is not None:
+                before_commit(orders)
+        db.commit()
+
+    except Exception:
+        db.rollback()
+        raise
+
+    after_complete(orders)
+    return [order.order_id for order in orders]
+
+
+"""
+Function to cancel pending orders, e.g. after the payment failed
+
+Args:
+    db: Database Session
+    order_ids: IDs of the orders to cancel
+
+Return:
+    None
+"""
+def cancel_orders(db: Session, order_ids: List[int]):
+    cancelled = db.execute(cancel_orders_query(order_ids)).all()
+    db.commit()
+
+    for user_id, order_id in cancelled:
+        invalidate_order(user_id, order_id)
+
+
+"""
+Function to cancel pending orders whose queued work was lost (e.g. the process restarted)
+
+Args:
+    db: Database Session
+    created_before: Pending orders created before this time are cancelled
+    user_id: Only cancel the orders of this user
+    commit: Commit the transaction
+
+Return:
+    int: Number of cancelled orders
+"""
+def cancel_stale_orders(db: Session, created_before: datetime, user_id: Optional[int] = None, commit: bool = True):
+    cancelled = db.execute(stale_orders_query(created_before, user_id)).all()
+    if commit:
+        db.commit()
+
+    for cancelled_user_id, order_id in cancelled:
+        invalidate_order(cancelled_user_id, order_id)
+    return len(cancelled)
+
+
+"""
+Function to read the status of an order of a user
+
+Args:
+    db: Database Session
+    user_id: ID of the user
+    order_id: ID of the order
+
+Return:
+    OrderStatus, or None if the order does not exist
+"""
+def get_order_status(db: Session, user_id: int, order_id: int):
+    status = db.execute(order_status_query(user_id, order_id)).scalar_one_or_none()
+    # End the read transaction so the connection goes back to the pool between polls
+    db.rollback()
+    return status
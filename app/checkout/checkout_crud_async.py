@@ -0,0 +1,148 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analytics import analytics_crud
+from app.checkout import checkout_crud as crud
+from app.checkout.checkout_crud import OrderAlreadyPending, PENDING_TIMEOUT, ReservedOrder
+from app.orders.cache import invalidate_order
+from app.orders.models import OrderItem
+from app.products import popularity
+from app.promotions.engine import CompiledPromotions
+
+# Async versions of the checkout queries for the async routes. The statements are
+# the ones of checkout_crud, see there for the locking and partitioning notes.
+
+
+"""
+Function to reserve a pending order for the cart of a user (first checkout phase)
+
+Args:
+    db: Async database Session
+    user_id: ID of the user
+    promotions: Compiled promotions to price the cart with
+
+Return:
+    ReservedOrder, or None if the cart is empty
+
+Raises:
+    OrderAlreadyPending: If an earlier order of the user is still pending
+"""
+async def reserve_order(db: AsyncSession, user_id: int, promotions: CompiledPromotions):
+    try:
+        lines = (await db.execute(crud.cart_lines_query(user_id))).all()
+        if not lines:
+            await db.rollback()
+            return None
+        lines = crud.price_lines(lines, promotions)
+
+        await cancel_stale_orders(db, datetime.now() - PENDING_TIMEOUT, user_id=user_id, commit=False)
+        pending = (await db.execute(crud.pending_order_query(user_id))).first()
+        if pending:
+            await db.rollback()
+            raise OrderAlreadyPending(pending.id)
+
+        total = sum(line.quantity * line.price - line.discount for line in lines)
+        created_at = datetime.now()
+        order_id = (await db.execute(crud.insert_order_query(user_id, total, created_at))).scalar_one()
+        await db.commit()
+
+    except Exception:
+        await db.rollback()
+        raise
+
+    return ReservedOrder(order_id, user_id, total, created_at, lines)
+
+
+"""
+Function to complete paid orders in a single transaction (last checkout phase)
+
+The popularity and sales rollup updates are sync functions, they run on the same
+connection through run_sync.
+
+Args:
+    db: Async database Session
+    orders: Reserved orders to mark as paid
+
+Return:
+    List of the IDs of the orders that were completed
+"""
+async def complete_orders(db: AsyncSession, orders: List[ReservedOrder]):
+    try:
+        completed = set((await db.execute(crud.complete_orders_query(orders))).scalars().all())
+        orders = [order for order in orders if order.order_id in completed]
+
+        if orders:
+            await db.execute(insert(OrderItem), [row for order in orders for row in crud.order_item_rows(order)])
+            await db.execute(crud.delete_cart_lines_query(orders))
+            await db.run_sync(popularity.record_orders, orders)
+            await db.run_sync(analytics_crud.record_orders, orders)
+        await db.commit()
+
+    except Exception:
+        await db.rollback()
+        raise
+
+    crud.after_complete(orders)
+    return [order.order_id for order in orders]
+
+
+"""
+Function to cancel pending orders, e.g. after the payment failed
+
+Args:
+    db: Async database Session
+    order_ids: IDs of the orders to cancel
+
+Return:
+    None
+"""
+async def cancel_orders(db: AsyncSession, order_ids: List[int]):
+    cancelled = (await db.execute(crud.cancel_orders_query(order_ids))).all()
+    await db.commit()
+
+    for user_id, order_id in cancelled:
+        invalidate_order(user_id, order_id)
+
+
+"""
+Function to cancel pending orders whose queued work was lost
+
+Args:
+    db: Async database Session
+    created_before: Pending orders created before this time are cancelled
+    user_id: Only cancel the orders of this user
+    commit: Commit the transaction
+
+Return:
+    int: Number of cancelled orders
+"""
+async def cancel_stale_orders(db: AsyncSession, created_before: datetime, user_id: Optional[int] = None,
+                              commit: bool = True):
+    cancelled = (await db.execute(crud.stale_orders_query(created_before, user_id))).all()
+    if commit:
+        await db.commit()
+
+    for cancelled_user_id, order_id in cancelled:
+        invalidate_order(cancelled_user_id, order_id)
+    return len(cancelled)
+
+
+"""
+Function to read the status of an order of a user
+
+Args:
+    db: Async database Session
+    user_id: ID of the user
+    order_id: ID of the order
+
+Return:
+    OrderStatus, or None if the order does not exist
+"""
+async def get_order_status(db: AsyncSession, user_id: int, order_id: int):
+    status = (await db.execute(crud.order_status_query(user_id, order_id))).scalar_one_or_none()
+    # End the read transaction so the connection goes back to the pool between polls
+    await db.rollback()
+    return status
@@ -0,0 +1,252 @@
+import asyncio
+import queue
+import threading
+import time
+from datetime import datetime
+
+from app.checkout import checkout_crud as crud
+from app.core import tracing
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.payments.gateway import get_payment_gateway
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+
+"""
+Worker pool that pays and completes reserved orders in batches.
+
+Each worker blocks for one reserved order, then drains whatever else is queued
+(up to batch_size, waiting at most batch_wait seconds). The whole batch is charged
+concurrently on the worker's own event loop without any database connection, then
+the paid orders are completed in a single transaction and the declined ones are
+cancelled. If the batch transaction fails, its orders are retried one by one so a
+single bad order only cancels itself. If the batch fails outside of that, its
+orders that are still pending are cancelled, so their long polls see the outcome.
+
+Pending orders older than PENDING_TIMEOUT, whose queued work was lost, are
+cancelled when the pool starts and then every SWEEP_SECONDS by one of the workers.
+
+In a traced checkout the wait in the queue is a span of the checkout trace. A
+batch serves several checkouts, so it runs in a trace of its own linked with
+their wait spans.
+"""
+class OrderQueue:
+    SWEEP_SECONDS = 60.0
+
+    def __init__(self):
+        # Sized from the settings by start()
+        self.workers = 0
+        self.batch_size = 1
+        self.batch_wait = 0.0
+        self._queue = queue.Queue()
+        self._threads = []
+        # Order ID -> (event loop, event) of the requests waiting for the order to leave the pending status
+        self._done = {}
+        self._done_lock = threading.Lock()
+        # Order ID -> span of the wait in the queue, for traced checkouts
+        self._waiting = {}
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self):
+        self.workers = settings.checkout_workers
+        self.batch_size = settings.checkout_batch_size
+        self.batch_wait = settings.checkout_batch_wait_ms / 1000
+
+        self._sweep()
+        self._next_sweep = time.monotonic() + self.SWEEP_SECONDS
+
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"order-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} order workers")
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, order: crud.ReservedOrder):
+        waiting = tracing.start_span("order_queue.wait", tracing.PRODUCER, {"order.id": order.order_id})
+        with self._done_lock:
+            self._done[order.order_id] = []
+            if waiting is not None:
+                self._waiting[order.order_id] = waiting
+        self._queue.put(order)
+
+    """
+    Wait until a queued order is completed or cancelled. The request waits on its
+    event loop, the worker wakes it up, so a long poll holds no thread.
+
+    Args:
+        order_id (int): ID of the order.
+        timeout (float): Maximum number of seconds to wait.
+
+    Returns:
+        bool | None: True if it finished, False on timeout, None if the order is not queued in this process.
+    """
+    async def wait(self, order_id: int, timeout: float):
+        finished = asyncio.Event()
+        with self._done_lock:
+            waiting = self._done.get(order_id)
+            if waiting is None:
+                return None
+            waiting.append((asyncio.get_running_loop(), finished))
+        try:
+            await asyncio.wait_for(finished.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            self._drain(loop)
+        finally:
+            loop.close()
+
+    def _drain(self, loop):
+        while True:
+            self._sweep_if_due()
+            try:
+                order = self._queue.get(timeout=max(0.0, self._next_sweep - time.monotonic()))
+            except queue.Empty:
+                continue
+            if order is None:
+                return
+
+            batch = [order]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    order = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if order is None:
+                    # Put the stop marker back so this worker exits after the batch
+                    self._queue.put(None)
+                    break
+                batch.append(order)
+
+            self._process(batch, loop)
+
+    # Cancel the stale pending orders, in the worker whose turn it is
+    def _sweep_if_due(self):
+        with self._sweep_lock:
+            if time.monotonic() < self._next_sweep:
+                return
+            self._next_sweep = time.monotonic() + self.SWEEP_SECONDS
+        try:
+            self._sweep()
+        except Exception as e:
+            logger.error(f"Cancelling stale pending orders failed: {e}")
+
+    def _sweep(self):
+        db = SessionLocal()
+        try:
+            cancelled = crud.cancel_stale_orders(db, datetime.now() - crud.PENDING_TIMEOUT)
+            if cancelled:
+                logger.warning(f"Cancelled {cancelled} stale pending orders")
+        finally:
+            db.close()
+
+    def _process(self, batch, loop):
+        batch_span = self._start_batch_span(batch)
+        db = None
+        results = None
+        try:
+            # The payment tasks and the statements below are spans of the batch
+            with tracing.activate(batch_span):
+                results = loop.run_until_complete(get_payment_gateway().charge_many(batch))
+                paid = [order for order, result in zip(batch, results) if result.success]
+                declined = [order for order, result in zip(batch, results) if not result.success]
+
+                db = SessionLocal()
+                if declined:
+                    logger.warning(f"Payment declined for orders {[order.order_id for order in declined]}")
+                    crud.cancel_orders(db, [order.order_id for order in declined])
+                if paid:
+                    self._complete(db, paid)
+        except Exception as e:
+            logger.exception(f"Order worker failed: {e}")
+            if batch_span is not None:
+                batch_span.record_error(e)
+            self._fail(batch, results)
+        finally:
+            if db is not None:
+                db.close()
+            self._finish(batch)
+            if batch_span is not None:
+                batch_span.end()
+
+    # End the wait spans of the traced orders of a batch and start the trace of the batch, linked with them
+    def _start_batch_span(self, batch):
+        with self._done_lock:
+            waiting = [self._waiting.pop(order.order_id) for order in batch if order.order_id in self._waiting]
+        if not waiting:
+            return None
+        batch_span = tracing.start_trace("order_queue.batch", tracing.CONSUMER, links=waiting)
+        batch_span.set("orders", len(batch))
+        for span in waiting:
+            span.link(batch_span)
+            span.end()
+        return batch_span
+
+    def _complete(self, db, paid):
+        try:
+            completed = crud.complete_orders(db, paid)
+            logger.info(f"Completed {len(completed)} orders in one transaction")
+            expired = [order.order_id for order in paid if order.order_id not in completed]
+            if expired:
+                logger.error(f"Orders {expired} expired while being paid and need a refund")
+        except Exception as e:
+            logger.error(f"Batch of {len(paid)} orders failed, retrying one by one: {e}")
+            for order in paid:
+                try:
+                    crud.complete_orders(db, [order])
+                except Exception as e:
+                    logger.error(f"Order {order.order_id} was paid but could not be completed, cancelled and needs a refund: {e}")
+                    crud.cancel_orders(db, [order.order_id])
+
+    # Cancel the orders of a failed batch that are still pending. Without results the
+    # charges may or may not have gone through, so the orders are reconciled with the
+    # provider by order ID, which is the reference of their charges.
+    def _fail(self, batch, results):
+        order_ids = [order.order_id for order in batch]
+        if results is None:
+            logger.error(f"Payment of orders {order_ids} failed without a result, cancelled and to reconcile with the provider")
+        else:
+            paid = [order.order_id for order, result in zip(batch, results) if result.success]
+            if paid:
+                logger.error(f"Orders {paid} were paid, those still pending are cancelled and need a refund")
+        db = SessionLocal()
+        try:
+            crud.cancel_orders(db, order_ids)
+        except Exception as e:
+            logger.error(f"Orders {order_ids} could not be cancelled, left to the stale order sweep: {e}")
+        finally:
+            db.close()
+
+    def _finish(self, batch):
+        with self._done_lock:
+            waiting = [waiter for order in batch for waiter in self._done.pop(order.order_id, [])]
+        for loop, finished in waiting:
+            try:
+                loop.call_soon_threadsafe(finished.set)
+            except RuntimeError:
+                # The loop of the request was closed
+                pass
+
+
+order_queue = OrderQueue()
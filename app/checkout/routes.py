@@ -1,79 +1,235 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from typing import Callable, Optional
 
-from app.auth.dependency import allow_only_user
-from app.core.database import get_db
-from app.cart.models import Cart
-from app.orders.models import Orders, OrderItem
+from app.auth.dependency import allow_only_user, allow_only_user_without_session
+from app.core.database import SessionLocal, get_db
+from app.core.replicas import track_writes
+from app.checkout import checkout_crud as crud
+from app.checkout.order_queue import order_queue
+from app.core.config import settings
 from app.auth.models import User
+from app.idempotency.utils import hash_request, run_idempotent
+from app.monitoring.metrics import checkouts
+from app.orders.models import OrderStatus
+from app.payments.gateway import get_payment_gateway
 
-from datetime import datetime
-
+import anyio
 import logging
+import time
 
 # Create a logger instance  for current module 
 logger=logging.getLogger(__name__)
 
 # Create a API router for checkout
-checkout_router = APIRouter(prefix="/checkout", tags=["Checkout"])
+checkout_router = APIRouter(prefix="/checkout", tags=["Checkout"], dependencies=[Depends(track_writes)])
+
+# Interval used to poll the order status when the order is queued in another process
+STATUS_POLL_INTERVAL_SECONDS = 0.2
+
+
+"""
+Function to reserve a pending order for the cart of the current user
+
+Args:
+    db: Databse Session
+    current_user: Authenticated user with role user
+    before_commit: Called with the reserved order before the reservation commits
+
+Return:
+    The reserved order
+"""
+def reserve_order(db: Session, current_user: User, before_commit: Optional[Callable] = None):
+    try:
+        reserved = crud.reserve_order(db, current_user.id, before_commit)
+    except crud.OrderAlreadyPending as pending:
+        logger.warning(f"Order {pending} of user {current_user.id} is still being placed")
+        raise HTTPException(status_code=409, detail="A previous order is still being placed")
+
+    if not reserved:
+        logger.warning("Cart is empty")
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    return reserved
+
+
+"""
+Function to place the order of the current user: reserve -> pay -> finalize
+
+The reservation is committed before the payment provider is called and the
+order is finalized in a new transaction, so no database connection is held
+during the provider round trip.
+
+With an Idempotency-Key the response is stored in the transaction that completes
+the order, so a retry after a crash never pays for the order a second time.
+
+Args:
+    db: Databse Session
+    current_user: Authenticated user with role user
+    store_response: Stores the response of the idempotency key, see run_idempotent()
+
+Return:
+    Tuple of status code and payment message with order id and amount
+"""
+def place_order(db: Session, current_user: User, store_response: Optional[Callable] = None):
+    if settings.checkout_mode == "queued":
+        return queue_order(db, current_user, store_response)
+
+    reserved = reserve_order(db, current_user)
+
+    # Run the async payment client on the event loop while this worker thread waits
+    payment = anyio.from_thread.run(get_payment_gateway().charge, reserved.order_id, current_user.id, reserved.total)
+    if not payment.success:
+        crud.cancel_orders(db, [reserved.order_id])
+        logger.warning(f"Payment for order {reserved.order_id} of user {current_user.id} failed: {payment.error}")
+        raise HTTPException(status_code=402, detail=f"Payment failed: {payment.error}")
+
+    response = 200, {
+        "message": "Payment successful and order placed.",
+        "order_id": reserved.order_id,
+        "created_at": reserved.created_at.isoformat(),
+        "total": reserved.total
+    }
+    try:
+        completed = crud.complete_orders(
+            db, [reserved], before_commit=store_response and (lambda completed: store_response(*response))
+        )
+    except Exception:
+        crud.cancel_orders(db, [reserved.order_id])
+        logger.error(f"Order {reserved.order_id} was paid but could not be completed, cancelled and needs a refund")
+        raise
+
+    if not completed:
+        logger.error(f"Order {reserved.order_id} expired while being paid and needs a refund")
+        raise HTTPException(status_code=409, detail="Order expired during payment, please try again")
+
+    logger.info("Payment successful and Order %s placed by uses %s", reserved.order_id, current_user.id)
+    return response
+
+
+"""
+Function to reserve the order of the current user and hand it to the order workers
+
+Payment and completion happen in the workers.
+
+Args:
+    db: Databse Session
+    current_user: Authenticated user with role user
+    store_response: Stores the response of the idempotency key with the reservation
+
+Return:
+    Tuple of status code 202 and the pending order id and amount
+"""
+def queue_order(db: Session, current_user: User, store_response: Optional[Callable] = None):
+    def queued(reserved):
+        return 202, {
+            "message": "Order received and is being processed.",
+            "order_id": reserved.order_id,
+            "created_at": reserved.created_at.isoformat(),
+            "status": OrderStatus.pending.value,
+            "total": reserved.total
+        }
+
+    reserved = reserve_order(
+        db, current_user, before_commit=store_response and (lambda reserved: store_response(*queued(reserved)))
+    )
+
+    order_queue.submit(reserved)
+    logger.info("Order %s of user %s queued", reserved.order_id, current_user.id)
+    return queued(reserved)
 
 
 """
 Function for order payment 
 
+A request sent with an Idempotency-Key header is executed at most once, retries
+with the same key get the stored response back.
+
 Args:
     db:Databse Session
     current_user: Only authenticated user with role user
+    idempotency_key: Optional value of the Idempotency-Key header
 
 Return:
-    Successful payment message with order id and amount
+    Successful payment message with order id and amount, or 202 with a pending
+    order id when checkout_mode is "queued"
 """
 @checkout_router.post("/")
-def checkout(db: Session = Depends(get_db), current_user: User = Depends(allow_only_user)):
+def checkout(db: Session = Depends(get_db), current_user: User = Depends(allow_only_user),
+             idempotency_key: Optional[str] = Header(None)):
     try:
-        # Fetch all cart items
-        cart_items = db.query(Cart).filter(Cart.user_id == current_user.id).all()
-
-        if not cart_items:
-            logger.warning("Cart is empty")
-            raise HTTPException(status_code=400, detail="Cart is empty")
-
-        # Create an order
-        new_order = Orders(
-            user_id=current_user.id,
-            created_at=datetime.now(),
-            total_amount=sum(item.quantity * item.product.price for item in cart_items)
-        )
-        new_order.status="paid"
-        db.add(new_order)
-        db.commit()
-        db.refresh(new_order)
-
-        # Add order items
-        for item in cart_items:
-            order_item = OrderItem(
-                order_id=new_order.id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                price_at_purchase=item.product.price
+        headers = {}
+        if idempotency_key is None:
+            status_code, body = place_order(db, current_user)
+        else:
+            status_code, body, replayed = run_idempotent(
+                db, current_user.id, "checkout", idempotency_key, hash_request("checkout"),
+                lambda store_response: place_order(db, current_user, store_response)
             )
-            db.add(order_item)
-
-        # Clear cart
-        db.query(Cart).filter(Cart.user_id == current_user.id).delete()
-        
-        db.commit()
-
-        logger.info(f"Payment successful and Order {new_order.id} placed by uses {current_user.id}")
-        return {
-            "message": "Payment successful and order placed.",
-            "order_id": new_order.id,
-            "total": new_order.total_amount
-        }
+            headers["Idempotent-Replayed"] = "true" if replayed else "false"
+
+        if status_code == 202:
+            headers["Location"] = f"{checkout_router.prefix}/{body['order_id']}/status"
+        checkouts.inc(str(status_code))
+        return JSONResponse(status_code=status_code, content=body, headers=headers)
     
     except HTTPException as http_exception:
+        checkouts.inc(str(http_exception.status_code))
         raise http_exception
 
     except Exception as e:
+        checkouts.inc("500")
         logger.error(f"Checkout failed for user {current_user.id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error during checkout.")
+
+
+# Read the status of an order in a session of its own, so no connection is held between polls
+def read_order_status(user_id: int, order_id: int):
+    db = SessionLocal()
+    try:
+        return crud.get_order_status(db, user_id, order_id)
+    finally:
+        db.close()
+
+
+"""
+Function to check the status of an order, optionally waiting for it to leave "pending"
+
+The route runs on the event loop and reads the status in the threadpool with a
+short lived session, so a long poll holds neither a thread nor a connection while
+it waits.
+
+Args:
+    order_id: ID of the order
+    wait: Seconds to wait while the order is pending (long poll)
+    current_user: Only authenticated user with role user
+
+Return:
+    Order id and its current status
+"""
+@checkout_router.get("/{order_id}/status")
+async def order_status(order_id: int, wait: float = Query(0, ge=0),
+                       current_user: User = Depends(allow_only_user_without_session)):
+    try:
+        status = await anyio.to_thread.run_sync(read_order_status, current_user.id, order_id)
+        if status is None:
+            logger.warning(f"Order {order_id} not found for user {current_user.id}")
+            raise HTTPException(status_code=404, detail="Order not found")
+
+        deadline = time.monotonic() + min(wait, settings.checkout_status_max_wait_seconds)
+        if status == OrderStatus.pending and wait > 0:
+            # Wait on the worker if the order is queued in this process, otherwise poll the database
+            if await order_queue.wait(order_id, max(0.0, deadline - time.monotonic())) is not None:
+                status = await anyio.to_thread.run_sync(read_order_status, current_user.id, order_id)
+            while status == OrderStatus.pending and time.monotonic() < deadline:
+                await anyio.sleep(STATUS_POLL_INTERVAL_SECONDS)
+                status = await anyio.to_thread.run_sync(read_order_status, current_user.id, order_id)
+
+        return {"order_id": order_id, "status": status}
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Status check of order {order_id} failed for user {current_user.id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve order status")
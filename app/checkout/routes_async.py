@@ -0,0 +1,200 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.auth.dependency import allow_only_user_async
+from app.core.database import SessionLocal, get_async_db
+from app.core.replicas import track_writes
+from app.checkout import checkout_crud_async as crud
+from app.checkout.checkout_crud import OrderAlreadyPending
+from app.checkout.order_queue import order_queue
+from app.checkout.routes import STATUS_POLL_INTERVAL_SECONDS, place_order as place_order_sync
+from app.core.config import settings
+from app.auth.models import User
+from app.idempotency.utils import hash_request, run_idempotent
+from app.monitoring.metrics import checkouts
+from app.orders.models import OrderStatus
+from app.payments.gateway import get_payment_gateway
+from app.promotions.engine import promotion_engine
+
+import anyio
+import logging
+import time
+
+# Async versions of the checkout routes, served on the event loop when db_mode is "async"
+
+# Create a logger instance  for current module
+logger=logging.getLogger(__name__)
+
+# Create a API router for checkout
+checkout_router = APIRouter(prefix="/checkout", tags=["Checkout"], dependencies=[Depends(track_writes)])
+
+
+"""
+Function to reserve a pending order for the cart of the current user
+
+Args:
+    db: Async database Session
+    current_user: Authenticated user with role user
+
+Return:
+    The reserved order
+"""
+async def reserve_order(db: AsyncSession, current_user: User):
+    promotions = promotion_engine.current()
+    try:
+        reserved = await crud.reserve_order(db, current_user.id, promotions)
+    except OrderAlreadyPending as pending:
+        logger.warning(f"Order {pending} of user {current_user.id} is still being placed")
+        raise HTTPException(status_code=409, detail="A previous order is still being placed")
+
+    if not reserved:
+        logger.warning("Cart is empty")
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    return reserved
+
+
+"""
+Function to place the order of the current user: reserve -> pay -> finalize
+
+Args:
+    db: Async database Session
+    current_user: Authenticated user with role user
+
+Return:
+    Tuple of status code and payment message with order id and amount
+"""
+async def place_order(db: AsyncSession, current_user: User):
+    reserved = await reserve_order(db, current_user)
+
+    if settings.checkout_mode == "queued":
+        order_queue.submit(reserved)
+        logger.info("Order %s of user %s queued", reserved.order_id, current_user.id)
+        return 202, {
+            "message": "Order received and is being processed.",
+            "order_id": reserved.order_id,
+            "created_at": reserved.created_at.isoformat(),
+            "status": OrderStatus.pending.value,
+            "total": reserved.total
+        }
+
+    payment = await get_payment_gateway().charge(reserved.order_id, current_user.id, reserved.total)
+    if not payment.success:
+        await crud.cancel_orders(db, [reserved.order_id])
+        logger.warning(f"Payment for order {reserved.order_id} of user {current_user.id} failed: {payment.error}")
+        raise HTTPException(status_code=402, detail=f"Payment failed: {payment.error}")
+
+    try:
+        completed = await crud.complete_orders(db, [reserved])
+    except Exception:
+        await crud.cancel_orders(db, [reserved.order_id])
+        logger.error(f"Order {reserved.order_id} was paid but could not be completed, cancelled and needs a refund")
+        raise
+
+    if not completed:
+        logger.error(f"Order {reserved.order_id} expired while being paid and needs a refund")
+        raise HTTPException(status_code=409, detail="Order expired during payment, please try again")
+
+    logger.info("Payment successful and Order %s placed by uses %s", reserved.order_id, current_user.id)
+    return 200, {
+        "message": "Payment successful and order placed.",
+        "order_id": reserved.order_id,
+        "created_at": reserved.created_at.isoformat(),
+        "total": reserved.total
+    }
+
+
+# The idempotency store waits on threads and polls the database, so it keeps running in the threadpool
+def _place_order_once(current_user: User, idempotency_key: str):
+    db = SessionLocal()
+    try:
+        return run_idempotent(
+            db, current_user.id, "checkout", idempotency_key, hash_request("checkout"),
+            lambda store_response: place_order_sync(db, current_user, store_response)
+        )
+    finally:
+        db.close()
+
+
+"""
+Function for order payment
+
+A request sent with an Idempotency-Key header is executed at most once, retries
+with the same key get the stored response back.
+
+Args:
+    db: Async database Session
+    current_user: Only authenticated user with role user
+    idempotency_key: Optional value of the Idempotency-Key header
+
+Return:
+    Successful payment message with order id and amount, or 202 with a pending
+    order id when checkout_mode is "queued"
+"""
+@checkout_router.post("/")
+async def checkout(db: AsyncSession = Depends(get_async_db), current_user: User = Depends(allow_only_user_async),
+                   idempotency_key: Optional[str] = Header(None)):
+    try:
+        headers = {}
+        if idempotency_key is None:
+            status_code, body = await place_order(db, current_user)
+        else:
+            status_code, body, replayed = await anyio.to_thread.run_sync(
+                _place_order_once, current_user, idempotency_key
+            )
+            headers["Idempotent-Replayed"] = "true" if replayed else "false"
+
+        if status_code == 202:
+            headers["Location"] = f"{checkout_router.prefix}/{body['order_id']}/status"
+        checkouts.inc(str(status_code))
+        return JSONResponse(status_code=status_code, content=body, headers=headers)
+
+    except HTTPException as http_exception:
+        checkouts.inc(str(http_exception.status_code))
+        raise http_exception
+
+    except Exception as e:
+        checkouts.inc("500")
+        logger.error(f"Checkout failed for user {current_user.id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error during checkout.")
+
+
+"""
+Function to check the status of an order, optionally waiting for it to leave "pending"
+
+Args:
+    order_id: ID of the order
+    wait: Seconds to wait while the order is pending (long poll)
+    db: Async database Session
+    current_user: Only authenticated user with role user
+
+Return:
+    Order id and its current status
+"""
+@checkout_router.get("/{order_id}/status")
+async def order_status(order_id: int, wait: float = Query(0, ge=0), db: AsyncSession = Depends(get_async_db),
+                       current_user: User = Depends(allow_only_user_async)):
+    try:
+        status = await crud.get_order_status(db, current_user.id, order_id)
+        if status is None:
+            logger.warning(f"Order {order_id} not found for user {current_user.id}")
+            raise HTTPException(status_code=404, detail="Order not found")
+
+        deadline = time.monotonic() + min(wait, settings.checkout_status_max_wait_seconds)
+        if status == OrderStatus.pending and wait > 0:
+            # Wait on the worker if the order is queued in this process, otherwise poll the database
+            if await order_queue.wait(order_id, max(0.0, deadline - time.monotonic())) is not None:
+                status = await crud.get_order_status(db, current_user.id, order_id)
+            while status == OrderStatus.pending and time.monotonic() < deadline:
+                await anyio.sleep(STATUS_POLL_INTERVAL_SECONDS)
+                status = await crud.get_order_status(db, current_user.id, order_id)
+
+        return {"order_id": order_id, "status": status}
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Status check of order {order_id} failed for user {current_user.id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve order status")
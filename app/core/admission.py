@@ -0,0 +1,197 @@
+import math
+import re
+import time
+from typing import Dict, Optional
+
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.metrics import Counter
+
+# Workload class of the paths starting with each prefix, the first match wins. Paths of no class
+# (/metrics, the monitoring endpoints, the docs) are never shed, so the service can be watched while overloaded
+PATH_CLASSES = (
+    ("/admin/monitoring", None),
+    ("/admin", "admin"),
+    ("/auth", "auth"),
+    ("/checkout", "checkout"),
+    ("/cart", "cart"),
+    ("/orders", "browse"),
+    ("/products", "browse"),
+)
+
+# The order status is long polled: its latency is the wait for the order workers, not the load of the
+# database, and it holds no thread or connection while waiting. It is of no class, so the waits neither
+# drive the checkout limit down nor take the room of checkouts
+UNCLASSIFIED_PATHS = re.compile(r"^/checkout/[^/]+/status/?$")
+
+# Weights of the short (recent) and long (baseline) moving averages of the latency, ~10 and ~600 requests
+SHORT_WEIGHT = 2 / 11
+LONG_WEIGHT = 2 / 601
+
+# The recent latency may reach this multiple of the baseline before the limit goes down
+LATENCY_TOLERANCE = 1.5
+
+# Weight of a new limit against the current one, so a single slow request moves it a little
+LIMIT_SMOOTHING = 0.2
+
+# Requests rejected by workload class and reason ("priority" or "limit")
+requests_shed = Counter()
+
+
+"""
+Concurrency limit of one workload class, adapted to its latency.
+
+The limit follows the gradient between the baseline latency of the class and its
+recent latency: while requests are as fast as usual the limit grows by its square
+root, when they get slower than LATENCY_TOLERANCE times the baseline it shrinks in
+proportion, at most by half. A class that is not using half of its limit keeps it,
+its latency then says nothing about the limit.
+"""
+class WorkloadClass:
+    def __init__(self, name: str, share: float, min_limit: int, max_limit: int):
+        self.name = name
+        # Fraction of the capacity of the process the class may fill
+        self.share = share
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.short_latency = None
+        self.long_latency = None
+
+    def record(self, latency: float, in_flight: int):
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+            return
+        self.short_latency += (latency - self.short_latency) * SHORT_WEIGHT
+        self.long_latency += (latency - self.long_latency) * LONG_WEIGHT
+        # After an overload the baseline is left far above the recent latency, let it come down faster
+        if self.long_latency > 2 * self.short_latency:
+            self.long_latency *= 0.95
+
+        if in_flight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, LATENCY_TOLERANCE * self.long_latency / max(self.short_latency, 1e-6)))
+        limit = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - LIMIT_SMOOTHING) + limit * LIMIT_SMOOTHING
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 1),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "latency_ms": round(self.short_latency * 1000, 2) if self.short_latency is not None else None,
+            "baseline_latency_ms": round(self.long_latency * 1000, 2) if self.long_latency is not None else None,
+        }
+
+
+"""
+Admission decisions of the process, with one WorkloadClass per class.
+
+Every class shares the capacity of the process (the requests that can hold a
+pooled connection at once), but a class only gets its share of it: browse traffic
+is rejected once the process is half full while checkout may use all of it, so
+browsing is shed first and checkout last. On top of that a class is rejected when
+it reaches its own adaptive limit. Called from the event loop only, so the counts
+need no lock.
+"""
+class AdmissionController:
+    def __init__(self, capacity: int, shares: Dict[str, float], min_limit: int):
+        self.capacity = capacity
+        self.in_flight = 0
+        self.classes = {
+            name: WorkloadClass(name, share, min_limit, max(min_limit, math.ceil(capacity * share)))
+            for name, share in shares.items()
+        }
+
+    """
+    Admit a request of a workload class.
+
+    Args:
+        workload (WorkloadClass): Class of the request.
+
+    Returns:
+        str | None: None when admitted, to release() once served, otherwise why it is rejected
+    """
+    def admit(self, workload: WorkloadClass) -> Optional[str]:
+        if self.in_flight >= self.capacity * workload.share:
+            return "priority"
+        if workload.in_flight >= workload.limit:
+            return "limit"
+        self.in_flight += 1
+        workload.in_flight += 1
+        return None
+
+    def release(self, workload: WorkloadClass, latency: float):
+        workload.record(latency, workload.in_flight)
+        workload.in_flight -= 1
+        self.in_flight -= 1
+
+    def classify(self, path: str) -> Optional[WorkloadClass]:
+        if UNCLASSIFIED_PATHS.match(path):
+            return None
+        for prefix, name in PATH_CLASSES:
+            if path.startswith(prefix):
+                return self.classes.get(name) if name else None
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "classes": {name: workload.snapshot() for name, workload in self.classes.items()},
+        }
+
+
+_controller: Optional[AdmissionController] = None
+
+
+# State of the admission control of this process, None when it is off
+def admission_snapshot() -> Optional[dict]:
+    return _controller.snapshot() if _controller is not None else None
+
+
+"""
+ASGI middleware that rejects the requests the process has no room for.
+
+A rejected request is answered at once with 503 and a Retry-After header, before
+it takes a thread or a pooled connection, instead of queueing behind requests that
+are already slow because the database is. Requests of no workload class pass.
+"""
+class AdmissionMiddleware:
+    def __init__(self, app):
+        global _controller
+        self.app = app
+        self.controller = None
+        if settings.admission_control:
+            capacity = settings.admission_max_in_flight or settings.db_pool_size + settings.db_max_overflow
+            self.controller = _controller = AdmissionController(
+                capacity, settings.admission_shares, settings.admission_min_limit
+            )
+
+    async def __call__(self, scope, receive, send):
+        workload = None
+        if scope["type"] == "http" and self.controller is not None:
+            workload = self.controller.classify(scope["path"])
+        if workload is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = self.controller.admit(workload)
+        if reason is not None:
+            requests_shed.inc(workload.name, reason)
+            response = JSONResponse(
+                {"detail": "Service is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(settings.admission_retry_after_seconds)},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(workload, time.perf_counter() - started)
@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Dict
+
 from pydantic import EmailStr
 from pydantic_settings import BaseSettings
 
@@ -9,6 +12,26 @@ class Settings(BaseSettings):
     db_hostname: str
     db_port: str
     db_name: str
+    # "sync" serves products, cart, orders and checkout from threadpool routes with a Session,
+    # "async" from event loop routes with an AsyncSession over asyncpg
+    db_mode: str = "sync"
+    # Connection pool of each engine, requests of the sync routes queue for one of
+    # db_pool_size + db_max_overflow sessions
+    db_pool_size: int = 10
+    db_max_overflow: int = 30
+    db_pool_timeout_seconds: float = 10.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    # Server side timeouts of every connection, 0 disables them
+    db_statement_timeout_ms: int = 30000
+    db_lock_timeout_ms: int = 5000
+    # Read replicas as comma separated host:port, with the credentials and database name of the
+    # primary. Read-only routes use a replica that answers and lags at most db_replica_max_lag_seconds,
+    # and the primary for db_read_your_writes_seconds after a cart or checkout write of the same user
+    db_replica_hosts: str = ""
+    db_replica_max_lag_seconds: float = 5.0
+    db_replica_check_seconds: float = 2.0
+    db_read_your_writes_seconds: float = 10.0
 
     # JWT Config
     secret_key: str
@@ -21,8 +44,94 @@ class Settings(BaseSettings):
     smtp_email: EmailStr
     smtp_password: str
 
+    # Idempotency Configuration
+    idempotency_cache_size: int = 10000
+    idempotency_key_ttl_hours: int = 24
+    idempotency_wait_seconds: float = 10.0
+    idempotency_sweep_minutes: int = 60
+
+    # Orders Configuration
+    order_detail_cache_size: int = 10000
+    order_partition_months_ahead: int = 3
+
+    # Checkout Configuration ("sync" places the order in the request, "queued" hands it to the order workers)
+    checkout_mode: str = "sync"
+    checkout_workers: int = 2
+    checkout_batch_size: int = 50
+    checkout_batch_wait_ms: int = 10
+    checkout_status_max_wait_seconds: float = 30.0
+
+    # Payment Configuration ("stub" approves locally, "http" calls payment_api_url)
+    payment_provider: str = "stub"
+    payment_api_url: str = ""
+    payment_api_key: str = ""
+    payment_timeout_seconds: float = 10.0
+    payment_breaker_failures: int = 5
+    payment_breaker_reset_seconds: float = 30.0
+    payment_stub_latency_ms: int = 0
+
+    # Products Configuration (popularity sorting counts a sale half as much after this many days)
+    popularity_half_life_days: float = 7.0
+
+    # Recommendations Configuration
+    recommendations_top_k: int = 20
+    recommendations_merge_orders: int = 100
+    recommendations_rebuild_minutes: int = 60
+
+    # Promotions Configuration (other processes see admin changes within this many seconds)
+    promotions_refresh_seconds: float = 30.0
+
+    # Monitoring Configuration (statements at least this slow are logged, a statement repeated this
+    # many times in one request is logged as a possible N+1)
+    sql_slow_query_ms: float = 200.0
+    sql_repeated_statement_warning: int = 10
+    # Bearer token Prometheus must send to scrape /metrics, empty leaves the endpoint open
+    metrics_token: str = ""
+    # Profiling (an admin sends X-Profile; profile_sample_rate also profiles 1 in N requests, 0 never;
+    # the last profile_store_size profiles are kept in memory)
+    profile_sample_rate: int = 0
+    profile_interval_ms: float = 5.0
+    profile_store_size: int = 20
+    profile_top_allocations: int = 20
+    # Tracing (spans are written as OTLP/JSON lines to trace_file, empty disables tracing; a request is
+    # traced when its caller sampled it in the traceparent header, otherwise with trace_sample_rate)
+    trace_file: str = ""
+    trace_sample_rate: float = 1.0
+    trace_queue_size: int = 10000
+    trace_service_name: str = "e-commerce"
+
+    # Admission Configuration (a workload class is answered 503 once the requests in flight fill its share of
+    # admission_max_in_flight, 0 uses db_pool_size + db_max_overflow, or its own limit adapted to its latency)
+    admission_control: bool = True
+    admission_max_in_flight: int = 0
+    admission_shares: Dict[str, float] = {"browse": 0.5, "admin": 0.6, "auth": 0.75, "cart": 0.75, "checkout": 1.0}
+    admission_min_limit: int = 2
+    admission_retry_after_seconds: int = 1
+
+    # Logging Configuration ("json" or "text" records written by a background thread; log_sampling
+    # keeps 1 in N INFO records of a logger and its children, e.g. {"app.auth.dependency": 100};
+    # log_skip_record_lookups turns off the caller, thread and process lookups of the logging module
+    # for the whole process, records then carry no pathname, lineno, thread or process)
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_queue_size: int = 10000
+    log_sampling: Dict[str, int] = {"app.auth.dependency": 100}
+    log_skip_record_lookups: bool = False
+
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings()
+
+
+# Reads the environment and .env on first attribute access instead of at import, so
+# modules that only keep a reference (models, database, CLI tools) import without them
+class LazySettings:
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+
+settings = LazySettings()
@@ -1,30 +1,186 @@
 # imports
-from sqlalchemy import create_engine
+import anyio
+import time
+from functools import lru_cache
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from typing import Generator
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import AsyncGenerator, Dict
 from app.core.config import settings
+from app.core.metrics import PoolMetrics
 
 
-DATABASE_URL = f"postgresql://{settings.db_username}:{settings.db_password}@{settings.db_hostname}:{settings.db_port}/{settings.db_name}"
+# Nothing here connects or reads the settings at import: the engines and session factories are
+# created on first use, or by the lifespan of the app before it serves requests
 
+def database_url(hostname: str, port: str, driver: str = "postgresql") -> str:
+    return f"{driver}://{settings.db_username}:{settings.db_password}@{hostname}:{port}/{settings.db_name}"
 
-# Establish a connection to the PostgreSQL database
-engine = create_engine(DATABASE_URL)
 
+# Checkout metrics and engines by pool name, "async" and the replicas are added when they are created
+pool_metrics: Dict[str, PoolMetrics] = {}
+engines = {}
 
-# Create database tables based on the defined SQLAlchemy models (subclasses of the Base class)
+
+# Pool class that records how long each checkout waited for a connection
+def timed_pool(base: type, name: str) -> type:
+    metrics = pool_metrics.setdefault(name, PoolMetrics())
+
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                metrics.record_timeout()
+                raise
+            finally:
+                metrics.wait_ms.observe((time.perf_counter() - started) * 1000)
+
+    return TimedPool
+
+
+def pool_options() -> dict:
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+# Postgres applies the timeouts to every statement of the connection, 0 disables them
+def timeout_settings() -> dict:
+    return {
+        "statement_timeout": str(settings.db_statement_timeout_ms),
+        "lock_timeout": str(settings.db_lock_timeout_ms),
+    }
+
+
+# Engine with the configured pool and timeouts, registered under name for the pool metrics
+def create_pooled_engine(url: str, name: str, **connect_args):
+    options = " ".join(f"-c {setting}={value}" for setting, value in timeout_settings().items())
+    pooled_engine = create_engine(
+        url,
+        poolclass=timed_pool(QueuePool, name),
+        connect_args={"options": options, **connect_args},
+        **pool_options(),
+    )
+    engines[name] = pooled_engine
+    return pooled_engine
+
+
+def create_pooled_async_engine(url: str, name: str, **connect_args) -> AsyncEngine:
+    async_engine = create_async_engine(
+        url,
+        poolclass=timed_pool(AsyncAdaptedQueuePool, name),
+        connect_args={"server_settings": timeout_settings(), **connect_args},
+        **pool_options(),
+    )
+    engines[name] = async_engine.sync_engine
+    return async_engine
+
+
+# Base class of the SQLAlchemy models, the tables are created and migrated by alembic only
 Base = declarative_base()
-Base.metadata.create_all(engine)
+
+
+# Engine of the PostgreSQL database
+@lru_cache(maxsize=None)
+def get_engine():
+    return create_pooled_engine(database_url(settings.db_hostname, settings.db_port), "sync")
+
+
+@lru_cache(maxsize=None)
+def get_sessionmaker() -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
 
 
 # Connect to the database and provide a session for interacting with it
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def SessionLocal() -> Session:
+    return get_sessionmaker()()
+
+
+# Requests holding a session, created on first use inside the event loop
+_request_slots = None
+
+
+def request_slots() -> anyio.Semaphore:
+    global _request_slots
+    if _request_slots is None:
+        _request_slots = anyio.Semaphore(settings.db_pool_size + settings.db_max_overflow)
+    return _request_slots
+
+
+"""
+Provide a session for the duration of a request.
+
+Sync routes run their dependencies, the route and the response validation as
+separate threadpool tasks, so a request keeps its connection while it waits for a
+thread. If every thread then waits for a connection, the pool is only freed by its
+timeout. Requests therefore wait on the event loop, holding neither a thread nor a
+connection, until one of db_pool_size + db_max_overflow slots is free. Closing the
+session rolls back its open transaction when the connection returns to the pool, a
+round trip to the database, so it runs in the threadpool; shielded, so a cancelled
+request still returns its connection.
+"""
+async def get_db() -> AsyncGenerator:
+    async with request_slots():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(db.close)
+
+
+# Lift the statement timeout until the end of the current transaction, for jobs that scan whole tables
+def without_statement_timeout(db: Session):
+    db.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+"""
+Get the state and checkout waits of the connection pools created so far.
+
+Returns:
+    dict: Per pool name the pool size, checked out and idle connections, overflow,
+    timeouts and the histogram of the checkout waits in milliseconds
+"""
+def pool_stats() -> dict:
+    stats = {}
+    for name, pool_engine in engines.items():
+        pool = pool_engine.pool
+        metrics = pool_metrics[name]
+        stats[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": settings.db_max_overflow,
+            "timeouts": metrics.timeouts,
+            "wait_ms": metrics.wait_ms.snapshot(),
+        }
+    return stats
+
+
+# The async engine is created on first use, so the sync routes run without asyncpg installed
+@lru_cache(maxsize=None)
+def get_async_engine() -> AsyncEngine:
+    # Same database through the asyncpg driver
+    return create_pooled_async_engine(
+        database_url(settings.db_hostname, settings.db_port, "postgresql+asyncpg"), "async"
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_sessionmaker() -> async_sessionmaker:
+    # Objects stay readable after commit, an async session cannot lazy load expired attributes
+    return async_sessionmaker(bind=get_async_engine(), autoflush=False, expire_on_commit=False)
 
 
-def get_db() -> Generator:
-    db = SessionLocal()
-    try:
+async def get_async_db() -> AsyncGenerator:
+    async with get_async_sessionmaker()() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,210 @@
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import Counter
+
+# Format of log_format="text", the format the app logged in before the JSON records
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has, the others were passed with extra= and become JSON fields
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# Size of the buffer the writer thread writes through, it is flushed whenever the queue is empty
+WRITE_BUFFER_BYTES = 1 << 16
+
+# Records dropped because the writer fell behind and the queue was full
+log_records_dropped = Counter()
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+# One JSON object per line: time, level, logger, message and the extra fields of the record
+class JsonFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__()
+        # Only the writer thread formats, so the last formatted second is reused without locking
+        self._second = None
+        self._second_text = ""
+
+    def format(self, record: logging.LogRecord) -> str:
+        second = int(record.created)
+        if second != self._second:
+            self._second, self._second_text = second, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        entry = {
+            "time": f"{self._second_text}.{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+"""
+Keep 1 in N of the INFO and DEBUG records of a logger and its children, the
+warnings and errors are always kept. A kept record carries sample_rate, so a
+count of log lines can be scaled back up. The counts are not locked, under
+concurrent logging a few more or fewer records than 1 in N may be kept.
+"""
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        # Logger name -> N, resolved through the parent loggers once per name
+        self._every = {}
+        self._seen = {}
+
+    def _rate(self, name: str) -> int:
+        every = self._every.get(name)
+        if every is None:
+            every, prefix = 1, name
+            while prefix:
+                if prefix in self.rates:
+                    every = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._every[name] = every
+        return every
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        every = self._rate(record.name)
+        if every <= 1:
+            return True
+        seen = self._seen.get(record.name, 0)
+        self._seen[record.name] = seen + 1
+        if seen % every:
+            return False
+        record.sample_rate = every
+        return True
+
+
+"""
+Queue handler of the request threads: a record is filtered, its message is
+formatted and it is queued, the JSON encoding and the write happen on the writer
+thread. A record that finds max_size records queued is dropped and counted
+instead of blocking the request.
+"""
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The arguments are formatted here, they may change or need this thread once the call returns.
+        # The record is not copied, the formatted message is what any other handler would show.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.max_size:
+            log_records_dropped.inc()
+            return
+        self.queue.put(record)
+
+
+# Stream handler of the writer thread, it writes without flushing and the writer flushes in batches
+class BufferedStreamHandler(logging.StreamHandler):
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+# Writer thread, the handlers are flushed once the records queued so far are written
+class BackgroundWriter(QueueListener):
+    def handle(self, record: logging.LogRecord):
+        super().handle(record)
+        if self.queue.empty():
+            self.flush()
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self):
+        super().stop()
+        self.flush()
+
+
+# The caller frame, thread and process of a record are looked up for every record, no format here uses them.
+# These are process wide flags of the logging module, set only with log_skip_record_lookups
+def skip_record_lookups():
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+
+"""
+Route the records of every logger through a queue to a background writer.
+
+Replaces logging.basicConfig and is called by the lifespan of the app: the root
+logger gets the queue handler with the sampling filter of log_sampling, and the
+writer thread writes the records to stderr as JSON (log_format="json") or text,
+in batches, until stop_logging().
+
+Returns:
+    None
+"""
+def configure_logging():
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    if settings.log_skip_record_lookups:
+        skip_record_lookups()
+
+    try:
+        stream = open(sys.stderr.fileno(), "w", buffering=WRITE_BUFFER_BYTES, encoding="utf-8", closefd=False)
+    except (AttributeError, OSError, ValueError):
+        # Replaced stderr without a file descriptor (captured output), written through unbuffered
+        stream = sys.stderr
+    stream_handler = BufferedStreamHandler(stream)
+    stream_handler.setFormatter(JsonFormatter() if settings.log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = NonBlockingQueueHandler(log_queue, settings.log_queue_size)
+    _queue_handler.addFilter(SamplingFilter(settings.log_sampling))
+
+    root = logging.getLogger()
+    root.setLevel(settings.log_level.upper())
+    root.addHandler(_queue_handler)
+
+    _listener = BackgroundWriter(log_queue, stream_handler)
+    _listener.start()
+
+
+"""
+Detach the queue handler and stop the writer thread after it wrote the queued
+records. Called on shutdown, configure_logging() can start a new writer.
+
+Returns:
+    None
+"""
+def stop_logging():
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        if handler.stream is not sys.stderr:
+            handler.stream.close()
+    _listener, _queue_handler = None, None
@@ -0,0 +1,116 @@
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple
+
+
+"""
+Base of the metrics: every thread writes to its own shard of values without
+taking a lock, and a read adds the shards up. Only the thread owning a shard
+writes to it, so the hot path is a thread local lookup and a dict update; the
+shards of threads that exited are folded into one when the values are read.
+Values are keyed by the tuple of label values.
+"""
+class ShardedMetric(ABC):
+    def __init__(self):
+        self._local = threading.local()
+        # (thread, values) of every thread that wrote
+        self._shards = []
+        # Values of the threads that exited
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _values(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    # Add the values of one shard to the total
+    @abstractmethod
+    def _merge(self, total: dict, values: dict):
+        ...
+
+    def collect(self) -> Dict[Tuple, object]:
+        with self._lock:
+            alive = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    self._merge(self._retired, values)
+            self._shards = alive
+            total = {}
+            self._merge(total, self._retired)
+            for _, values in alive:
+                # A copy, the owning thread may add labels while it is read
+                self._merge(total, values.copy())
+        return total
+
+
+class Counter(ShardedMetric):
+    def inc(self, *labels: str, amount: float = 1):
+        values = self._values()
+        values[labels] = values.get(labels, 0) + amount
+
+    def _merge(self, total: dict, values: dict):
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+
+# Counter that also goes down, a value can be increased on one thread and decreased on another
+class Gauge(Counter):
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+# Histogram with fixed bucket upper bounds, reported cumulatively like Prometheus
+class Histogram(ShardedMetric):
+    def __init__(self, buckets: Sequence[float]):
+        super().__init__()
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        values = self._values()
+        counts = values.get(labels)
+        if counts is None:
+            # One count per bucket, the +Inf bucket and the sum
+            counts = values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _merge(self, total: dict, values: dict):
+        for labels, counts in values.items():
+            merged = total.get(labels)
+            if merged is None:
+                total[labels] = list(counts)
+            else:
+                for index, count in enumerate(counts):
+                    merged[index] += count
+
+    def snapshot(self, *labels: str) -> dict:
+        counts = self.collect().get(labels) or [0] * (len(self.buckets) + 2)
+        buckets, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            buckets.append({"le": bound, "count": cumulative})
+        return {"buckets": buckets, "count": cumulative, "sum": round(counts[-1], 3)}
+
+
+# Upper bounds of the pool checkout wait buckets in milliseconds
+POOL_WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+# Checkout waits and timeouts of one connection pool
+class PoolMetrics:
+    def __init__(self):
+        self.wait_ms = Histogram(POOL_WAIT_BUCKETS_MS)
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
@@ -0,0 +1,241 @@
+import random
+import threading
+import time
+from typing import AsyncGenerator, List, Optional
+
+from fastapi import Depends, Request
+from jose import JWTError, jwt
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.database import (
+    create_pooled_async_engine, create_pooled_engine, database_url, get_async_db, get_db,
+)
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+# A replica that does not answer within this many seconds is ejected
+CONNECT_TIMEOUT_SECONDS = 2
+
+# Users whose last write is remembered for read-your-writes
+RECENT_WRITERS = 100000
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Whether the replica streams from the primary, and the seconds since the last replayed
+# transaction, 0 when everything received is replayed (an idle primary sends nothing) or
+# when the server is not a standby. A replica whose WAL receiver lost the primary has
+# replayed everything it received and would report no lag, so it is not streaming.
+# Without pg_read_all_stats the status is hidden and a running WAL receiver counts.
+LAG_SQL = """
+SELECT
+    NOT pg_is_in_recovery() OR EXISTS (
+        SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'
+    ),
+    CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class Replica:
+    def __init__(self, name: str, hostname: str, port: str):
+        self.name = name
+        self.hostname = hostname
+        self.port = port
+        self.engine = create_pooled_engine(
+            database_url(hostname, port), name, connect_timeout=CONNECT_TIMEOUT_SECONDS
+        )
+        self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        # Unused until the first check succeeds
+        self.healthy = False
+        self.lag_seconds = None
+        self.error = None
+        self._async_engine = None
+        self._async_sessionmaker = None
+
+    # Created on first use like the async engine of the primary
+    def async_sessionmaker(self) -> async_sessionmaker:
+        if self._async_sessionmaker is None:
+            self._async_engine = create_pooled_async_engine(
+                database_url(self.hostname, self.port, "postgresql+asyncpg"), f"{self.name}-async",
+                timeout=CONNECT_TIMEOUT_SECONDS,
+            )
+            self._async_sessionmaker = async_sessionmaker(
+                bind=self._async_engine, autoflush=False, expire_on_commit=False
+            )
+        return self._async_sessionmaker
+
+
+"""
+Routes the sessions of read-only requests to the read replicas.
+
+A background thread checks every replica each check interval: a replica that
+fails the check, does not stream from the primary or lags more than max_lag
+seconds is ejected until a later check passes. Read sessions go to a random healthy replica, or to the primary when none
+is healthy or the user wrote within the last sticky seconds, so a user reads their
+own cart and orders right after changing them. The writes are remembered per
+process, behind a load balancer the sticky window only covers the process that
+served the write.
+"""
+class ReplicaRouter:
+    def __init__(self):
+        # Configured from the settings by start()
+        self.max_lag = 0.0
+        self.check_seconds = 0.0
+        self.sticky_seconds = 0.0
+        self.hosts = []
+        # Engines are created by start(), reads go to the primary until then
+        self.replicas: List[Replica] = []
+        # User ID -> monotonic time until which their reads go to the primary
+        self._recent_writers = LRUCache(RECENT_WRITERS)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        self.max_lag = settings.db_replica_max_lag_seconds
+        self.check_seconds = settings.db_replica_check_seconds
+        self.sticky_seconds = settings.db_read_your_writes_seconds
+        self.hosts = [host.strip() for host in settings.db_replica_hosts.split(",") if host.strip()]
+        if not self.hosts:
+            return
+        if not self.replicas:
+            for number, host in enumerate(self.hosts):
+                hostname, _, port = host.partition(":")
+                self.replicas.append(Replica(f"replica-{number}", hostname, port or settings.db_port))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-checks", daemon=True)
+        self._thread.start()
+        logger.info(f"Checking {len(self.replicas)} read replicas every {self.check_seconds}s")
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self.check()
+            if self._stop.wait(self.check_seconds):
+                return
+
+    def check(self):
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as connection:
+                    streaming, lag = connection.execute(text(LAG_SQL)).one()
+                lag = float(lag)
+                if not streaming:
+                    error = "not streaming from the primary"
+                elif lag > self.max_lag:
+                    error = f"{lag:.1f}s behind the primary"
+                else:
+                    error = None
+            except Exception as e:
+                lag, error = None, str(e)
+            healthy = error is None
+
+            if healthy != replica.healthy:
+                if healthy:
+                    logger.info(f"Read replica {replica.name} is back")
+                else:
+                    logger.warning(f"Read replica {replica.name} ejected: {error}")
+                    # Drop the pooled connections, they may point at a server that went away
+                    replica.engine.dispose()
+            replica.healthy, replica.lag_seconds, replica.error = healthy, lag, error
+
+    def mark_write(self, user_id: int):
+        self._recent_writers.put(user_id, time.monotonic() + self.sticky_seconds)
+
+    """
+    Pick the replica for a read session.
+
+    Args:
+        user_id: ID of the user reading, if known
+
+    Returns:
+        A healthy replica, or None to read from the primary
+    """
+    def pick(self, user_id: Optional[int]) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        if user_id is not None and time.monotonic() < self._recent_writers.get(user_id, 0):
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        return random.choice(healthy) if healthy else None
+
+    def status(self) -> list:
+        return [
+            {"name": replica.name, "host": f"{replica.hostname}:{replica.port}", "healthy": replica.healthy,
+             "lag_seconds": replica.lag_seconds, "error": replica.error}
+            for replica in self.replicas
+        ]
+
+    async def dispose_async_engines(self):
+        for replica in self.replicas:
+            if replica._async_engine is not None:
+                await replica._async_engine.dispose()
+
+
+replica_router = ReplicaRouter()
+
+
+# User ID of the bearer token, only used to route reads, the routes verify the token themselves
+def token_user_id(request: Request) -> Optional[int]:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return int(jwt.get_unverified_claims(token).get("sub"))
+    except (JWTError, TypeError, ValueError):
+        return None
+
+
+"""
+Dependency of the cart and checkout routers: a user who writes reads from the
+primary for the next db_read_your_writes_seconds.
+"""
+async def track_writes(request: Request):
+    if replica_router.replicas and request.method not in READ_METHODS:
+        user_id = token_user_id(request)
+        if user_id is not None:
+            replica_router.mark_write(user_id)
+
+
+"""
+Provide the session of a read-only route: a replica session when a replica may
+serve the request, otherwise the request session of the primary. Taking the
+primary session first keeps the request within its get_db slot.
+"""
+async def get_read_db(request: Request, db: Session = Depends(get_db)) -> AsyncGenerator:
+    replica = replica_router.pick(token_user_id(request))
+    if replica is None:
+        yield db
+        return
+    read_db = replica.sessionmaker()
+    try:
+        yield read_db
+    finally:
+        read_db.close()
+
+
+async def get_async_read_db(request: Request, db: AsyncSession = Depends(get_async_db)) -> AsyncGenerator:
+    replica = replica_router.pick(token_user_id(request))
+    if replica is None:
+        yield db
+        return
+    async with replica.async_sessionmaker()() as read_db:
+        yield read_db
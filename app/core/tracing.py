@@ -0,0 +1,317 @@
+import functools
+import inspect
+import json
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.metrics import Counter
+
+# Span kinds, numbered as in OTLP
+INTERNAL, SERVER, CLIENT, PRODUCER, CONSUMER = 1, 2, 3, 4, 5
+
+# W3C trace context header: version-trace_id-parent_id-flags
+TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$")
+
+# Spans written per OTLP line at most
+EXPORT_BATCH_SIZE = 512
+
+# Spans dropped because the exporter fell behind and the queue was full
+spans_dropped = Counter()
+
+
+# A span of another process (the caller of a request), or of this process across a queue
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "links", "start_ns", "end_ns",
+                 "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int, attributes: Optional[dict],
+                 links=()):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.links = list(links)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def link(self, other):
+        self.links.append(other)
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if _exporter is not None:
+                _exporter.export(self)
+
+    def to_otlp(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "links": [{"traceId": link.trace_id, "spanId": link.span_id} for link in self.links],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+# Span of the code running now: a Span of this process or the SpanContext of a remote parent.
+# Copied into the threadpool tasks, anyio.from_thread calls and greenlets like any context variable.
+_current: ContextVar = ContextVar("current_span", default=None)
+
+
+def current():
+    return _current.get()
+
+
+"""
+Start a span, a child of parent or of the current span. Nothing is recorded
+outside a traced request, so instrumented code costs a context variable lookup
+when tracing is off.
+
+Args:
+    name (str): Name of the operation.
+    kind (int): INTERNAL, SERVER, CLIENT, PRODUCER or CONSUMER.
+    attributes (dict, optional): Attributes of the span.
+    parent (Span | SpanContext, optional): Parent instead of the current span.
+    links (list, optional): Spans of other traces this span relates to.
+
+Returns:
+    Span | None: The started span, to end(); None when there is no trace to add it to
+"""
+def start_span(name: str, kind: int = INTERNAL, attributes: Optional[dict] = None, parent=None, links=()):
+    parent = parent or _current.get()
+    if parent is None:
+        return None
+    return Span(name, parent.trace_id, parent.span_id, kind, attributes, links)
+
+
+"""
+Start the root span of a new trace, or of the local part of a remote trace.
+
+Args:
+    name (str): Name of the operation.
+    kind (int): Kind of the span.
+    remote_parent (SpanContext, optional): Parent span of the caller.
+    links (list, optional): Spans of other traces this trace relates to.
+
+Returns:
+    Span | None: The started span; None when tracing is off
+"""
+def start_trace(name: str, kind: int = INTERNAL, remote_parent: Optional[SpanContext] = None, links=()):
+    if _exporter is None:
+        return None
+    if remote_parent is not None:
+        return Span(name, remote_parent.trace_id, remote_parent.span_id, kind, None, links)
+    return Span(name, _new_id(128), None, kind, None, links)
+
+
+# Make a span the current one for the block, a None span changes nothing
+@contextmanager
+def activate(span):
+    if span is None:
+        yield None
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+# Run the block in a child span of the current span, exceptions are recorded as the error of the span
+@contextmanager
+def span(name: str, kind: int = INTERNAL, attributes: Optional[dict] = None):
+    child = start_span(name, kind, attributes)
+    if child is None:
+        yield None
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+# Decorator running every call of a sync or async function in a span
+def traced(name: str, kind: int = INTERNAL):
+    def decorate(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def traced_coroutine(*args, **kwargs):
+                with span(name, kind):
+                    return await function(*args, **kwargs)
+            return traced_coroutine
+
+        @functools.wraps(function)
+        def traced_function(*args, **kwargs):
+            with span(name, kind):
+                return function(*args, **kwargs)
+        return traced_function
+    return decorate
+
+
+"""
+Parse a W3C traceparent header.
+
+Args:
+    header (str, optional): Value of the traceparent header.
+
+Returns:
+    SpanContext | None: The parent span, None if the header is missing or invalid
+"""
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    match = TRACEPARENT.match(header.strip()) if header else None
+    if match is None:
+        return None
+    version, trace_id, span_id, flags, rest = match.groups()
+    if version == "ff" or (version == "00" and rest) or trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+# Headers carrying the current span to a called service
+def inject() -> Dict[str, str]:
+    parent = _current.get()
+    if parent is None:
+        return {}
+    return {"traceparent": f"00-{parent.trace_id}-{parent.span_id}-01"}
+
+
+"""
+Writer thread of the finished spans. The spans are queued by the threads that
+end them and written in batches, one OTLP/JSON ExportTraceServiceRequest per
+line, the format the file receiver of the OpenTelemetry collector reads.
+"""
+class SpanExporter:
+    def __init__(self, stream, max_size: int, service_name: str):
+        self.stream = stream
+        self.max_size = max_size
+        self.resource = {"attributes": _otlp_attributes({"service.name": service_name})}
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def export(self, span: Span):
+        if self._queue.qsize() >= self.max_size:
+            spans_dropped.inc()
+            return
+        self._queue.put(span)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            spans = [span for span in batch if span is not None]
+            if spans:
+                self._write(spans)
+            if len(spans) < len(batch):
+                return
+
+    def _write(self, spans):
+        request = {"resourceSpans": [{
+            "resource": self.resource,
+            "scopeSpans": [{"scope": {"name": "app"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        try:
+            self.stream.write(json.dumps(request, default=str) + "\n")
+            self.stream.flush()
+        except Exception:
+            spans_dropped.inc(amount=len(spans))
+
+
+_exporter: Optional[SpanExporter] = None
+
+
+def enabled() -> bool:
+    return _exporter is not None
+
+
+"""
+Start writing spans to trace_file, called by the lifespan of the app. Without a
+trace_file tracing stays off and no span is recorded.
+
+Returns:
+    None
+"""
+def configure_tracing():
+    global _exporter
+    if _exporter is not None or not settings.trace_file:
+        return
+    exporter = SpanExporter(open(settings.trace_file, "a", encoding="utf-8"), settings.trace_queue_size,
+                            settings.trace_service_name)
+    exporter.start()
+    _exporter = exporter
+
+
+"""
+Stop recording spans, and close trace_file once the queued spans are written.
+Called on shutdown.
+
+Returns:
+    None
+"""
+def stop_tracing():
+    global _exporter
+    if _exporter is None:
+        return
+    exporter, _exporter = _exporter, None
+    exporter.stop()
+    exporter.stream.close()
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.idempotency import models
+
+# A key that is still unanswered after this long belongs to a request that died midway. The response
+# is written in the transaction that commits the work of the request, so such a request committed nothing
+IN_PROGRESS_TIMEOUT = timedelta(minutes=1)
+
+# Expired keys deleted per transaction by delete_expired_keys()
+SWEEP_BATCH_SIZE = 5000
+
+
+def _key_filter(user_id: int, scope: str, key: str):
+    return and_(
+        models.IdempotencyKeys.user_id == user_id,
+        models.IdempotencyKeys.scope == scope,
+        models.IdempotencyKeys.key == key,
+    )
+
+
+"""
+Function to claim an idempotency key for the current request
+
+Expired keys and keys abandoned by a crashed request are removed first, then the
+key is inserted with ON CONFLICT DO NOTHING so only one request can win the claim.
+
+Args:
+    db: Database Session
+    user_id: ID of the user
+    scope: Operation the key belongs to (e.g. "checkout")
+    key: Value of the Idempotency-Key header
+    request_hash: Fingerprint of the request payload
+    ttl: How long a stored response stays valid
+
+Return:
+    None if the key was claimed, otherwise the existing key row
+"""
+def claim_key(db: Session, user_id: int, scope: str, key: str, request_hash: str, ttl: timedelta):
+    now = datetime.utcnow()
+    db.execute(delete(models.IdempotencyKeys).where(
+        _key_filter(user_id, scope, key),
+        or_(
+            models.IdempotencyKeys.created_at < now - ttl,
+            and_(
+                models.IdempotencyKeys.status_code.is_(None),
+                models.IdempotencyKeys.created_at < now - IN_PROGRESS_TIMEOUT,
+            ),
+        ),
+    ))
+    claimed = db.execute(
+        insert(models.IdempotencyKeys)
+        .values(user_id=user_id, scope=scope, key=key, request_hash=request_hash, created_at=now)
+        .on_conflict_do_nothing(constraint="uq_idempotency_keys_user_scope_key")
+        .returning(models.IdempotencyKeys.id)
+    ).scalar_one_or_none()
+    db.commit()
+
+    if claimed is not None:
+        return None
+    return get_key(db, user_id, scope, key)
+
+
+"""
+Function to read the stored state of an idempotency key
+
+Args:
+    db: Database Session
+    user_id: ID of the user
+    scope: Operation the key belongs to
+    key: Value of the Idempotency-Key header
+
+Return:
+    The key row (always re-read from the database) or None
+"""
+def get_key(db: Session, user_id: int, scope: str, key: str):
+    return db.query(models.IdempotencyKeys).filter(_key_filter(user_id, scope, key)).populate_existing().first()
+
+
+"""
+Function to store the response of the request that owns the key
+
+Args:
+    db: Database Session
+    user_id: ID of the user
+    scope: Operation the key belongs to
+    key: Value of the Idempotency-Key header
+    status_code: HTTP status of the response
+    response_body: JSON encoded response body
+    commit: Commit the transaction, False writes it with the work of the request
+"""
+def complete_key(db: Session, user_id: int, scope: str, key: str, status_code: int, response_body: str,
+                 commit: bool = True):
+    db.execute(
+        update(models.IdempotencyKeys)
+        .where(_key_filter(user_id, scope, key))
+        .values(status_code=status_code, response_body=response_body)
+    )
+    if commit:
+        db.commit()
+
+
+"""
+Function to give up a claimed key so that a retry can run the request again
+
+Args:
+    db: Database Session
+    user_id: ID of the user
+    scope: Operation the key belongs to
+    key: Value of the Idempotency-Key header
+"""
+def release_key(db: Session, user_id: int, scope: str, key: str):
+    db.execute(delete(models.IdempotencyKeys).where(
+        _key_filter(user_id, scope, key),
+        models.IdempotencyKeys.status_code.is_(None),
+    ))
+    db.commit()
+
+
+"""
+Function to delete the keys older than their TTL, in batches of short transactions
+
+Args:
+    db: Database Session
+    ttl: How long a stored response stays valid
+
+Return:
+    Number of deleted keys
+"""
+def delete_expired_keys(db: Session, ttl: timedelta) -> int:
+    created_before = datetime.utcnow() - ttl
+    deleted = 0
+    while True:
+        expired = (
+            select(models.IdempotencyKeys.id)
+            .where(models.IdempotencyKeys.created_at < created_before)
+            .limit(SWEEP_BATCH_SIZE)
+        )
+        count = db.execute(delete(models.IdempotencyKeys).where(models.IdempotencyKeys.id.in_(expired))).rowcount
+        db.commit()
+        deleted += count
+        if count < SWEEP_BATCH_SIZE:
+            return deleted
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, NamedTuple, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.idempotency import idempotency_crud as crud
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+# Interval used to poll the database while another process runs the same key
+POLL_INTERVAL_SECONDS = 0.05
+
+
+# Response stored for an idempotency key, replayed from the cache until the key expires
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    body: dict
+    expires_at: datetime
+
+
+# Stored responses by (user ID, scope, key), sized from the settings on first use
+@lru_cache(maxsize=None)
+def get_response_cache() -> LRUCache:
+    return LRUCache(settings.idempotency_cache_size)
+
+
+# Keys currently being executed by this process, mapped to an event set when they finish
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+"""
+Function to fingerprint a request so a key cannot be reused for a different payload
+
+Args:
+    parts: Values that identify the request (path, body, ...)
+
+Returns:
+    str: Hex encoded SHA-256 of the parts
+"""
+def hash_request(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(jsonable_encoder(part), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _replay(stored: StoredResponse, request_hash: str):
+    if stored.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return stored.status_code, stored.body, True
+
+
+"""
+Run a request handler at most once per idempotency key.
+
+A repeated key returns the stored response without calling the handler. Duplicates
+that arrive while the first request is still running wait for it: inside this
+process on an event, across processes by polling the idempotency_keys table.
+Only successful responses are stored; if the handler raises, the key is released
+so that the client can retry.
+
+The handler is called with store_response(status_code, body), which writes the
+response into the key row without committing. A handler calls it right before the
+commit of its work, so the work and the response commit together: a crash in
+between cannot leave a committed order behind a key that a retry may claim again.
+A handler that does not call it gets the response stored after it returns.
+
+Args:
+    db (Session): Database session.
+    user_id (int): ID of the user, keys are scoped per user.
+    scope (str): Operation the key belongs to (e.g. "checkout").
+    key (str): Value of the Idempotency-Key header.
+    request_hash (str): Fingerprint of the request, see hash_request().
+    handler (Callable): Runs the request with store_response and returns (status_code, body).
+
+Returns:
+    tuple: (status_code, body, replayed)
+"""
+def run_idempotent(db: Session, user_id: int, scope: str, key: str, request_hash: str,
+                   handler: Callable[[Callable[[int, dict], None]], Tuple[int, dict]]):
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+
+    cache_key = (user_id, scope, key)
+    deadline = time.monotonic() + settings.idempotency_wait_seconds
+
+    while True:
+        stored = get_response_cache().get(cache_key)
+        if stored is not None:
+            if datetime.utcnow() < stored.expires_at:
+                return _replay(stored, request_hash)
+            # Past idempotency_key_ttl_hours the key is claimed again, as once its row is deleted
+            get_response_cache().pop(cache_key)
+
+        with _in_flight_lock:
+            done = _in_flight.get(cache_key)
+            if done is None:
+                done = _in_flight[cache_key] = threading.Event()
+                break
+
+        # Another thread runs this key, wait for it and look again
+        if not done.wait(max(0.0, deadline - time.monotonic())):
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    try:
+        return _execute(db, user_id, scope, key, request_hash, handler, deadline)
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(cache_key, None)
+        done.set()
+
+
+def _execute(db, user_id, scope, key, request_hash, handler, deadline):
+    ttl = timedelta(hours=settings.idempotency_key_ttl_hours)
+    # No later than the created_at of a row claimed here, so the cached response expires before it
+    claimed_at = datetime.utcnow()
+    existing = crud.claim_key(db, user_id, scope, key, request_hash, ttl)
+
+    # Another process owns the key, wait until it stores a response or gives up
+    while existing is not None and existing.status_code is None:
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        time.sleep(POLL_INTERVAL_SECONDS)
+        existing = crud.get_key(db, user_id, scope, key)
+        if existing is None:
+            existing = crud.claim_key(db, user_id, scope, key, request_hash, ttl)
+
+    if existing is not None:
+        stored = StoredResponse(
+            existing.request_hash, existing.status_code, json.loads(existing.response_body), existing.created_at + ttl
+        )
+        get_response_cache().put((user_id, scope, key), stored)
+        return _replay(stored, request_hash)
+
+    stored = []
+
+    def store_response(status_code: int, body: dict):
+        crud.complete_key(db, user_id, scope, key, status_code, json.dumps(jsonable_encoder(body)), commit=False)
+        stored.append(status_code)
+
+    try:
+        status_code, body = handler(store_response)
+    except Exception:
+        db.rollback()
+        # A response stored with the committed work is kept, only an unanswered key is released
+        crud.release_key(db, user_id, scope, key)
+        raise
+
+    body = jsonable_encoder(body)
+    if not stored:
+        crud.complete_key(db, user_id, scope, key, status_code, json.dumps(body))
+    get_response_cache().put((user_id, scope, key), StoredResponse(request_hash, status_code, body, claimed_at + ttl))
+    logger.info(f"Stored response for idempotency key of user {user_id} in scope {scope}")
+    return status_code, body, False
+
+
+"""
+Background thread deleting the keys older than idempotency_key_ttl_hours, when the
+application starts and then every idempotency_sweep_minutes. Without it an expired
+key is only deleted when the same key is claimed again.
+"""
+class KeySweeper:
+    def __init__(self):
+        self.interval_seconds = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.interval_seconds = settings.idempotency_sweep_minutes * 60
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="idempotency-sweep", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self.sweep()
+            if self._stop.wait(self.interval_seconds):
+                return
+
+    def sweep(self):
+        db = SessionLocal()
+        try:
+            deleted = crud.delete_expired_keys(db, timedelta(hours=settings.idempotency_key_ttl_hours))
+            if deleted:
+                logger.info(f"Deleted {deleted} expired idempotency keys")
+        except Exception as e:
+            logger.error(f"Deleting the expired idempotency keys failed: {e}")
+        finally:
+            db.close()
+
+
+key_sweeper = KeySweeper()
@@ -1,31 +1,149 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 import logging
 
 # Importing Router from various app modules
 from app.auth.routes import auth_router
-from app.products.routes import admin_product_router
-from app.products.routes import public_product_router
-from app.cart.routes import cart_router
-from app.checkout.routes import checkout_router
-from app.orders.routes import order_router
-
-
-# Initialize Fast API application
-app = FastAPI()
-
-# Include API routers for functionality
-app.include_router(auth_router)
-app.include_router(admin_product_router)
-app.include_router(public_product_router)
-app.include_router(cart_router)
-app.include_router(checkout_router)
-app.include_router(order_router)
-
-# Logging Configurations
-logging.basicConfig(
-    level = logging.INFO,
-    format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+from app.core.admission import AdmissionMiddleware
+from app.core.config import settings
+from app.core.logs import configure_logging, stop_logging
+from app.core.tracing import configure_tracing, stop_tracing
+from app.orders.routes import admin_order_router
+from app.analytics.routes import analytics_router
+from app.recommendations.routes import recommendation_router
+from app.promotions.routes import admin_promotion_router
+from app.monitoring.metrics import MetricsMiddleware
+from app.monitoring.profiling import ProfilingMiddleware
+from app.monitoring.routes import metrics_router, monitoring_router
+from app.monitoring.sql import QueryStatsMiddleware, instrument_queries
+from app.monitoring.tracing import TracingMiddleware
+from app.checkout.order_queue import order_queue
+from app.core.database import SessionLocal, get_async_engine, get_engine
+from app.core.replicas import replica_router
+from app.idempotency.utils import key_sweeper
+from app.orders.partitions import create_partitions
+from app.promotions.engine import promotion_engine
+from app.recommendations.index import related_products
+
+
+# Make sure the monthly order partitions of the coming months exist
+def create_order_partitions():
+    db = SessionLocal()
+    try:
+        create_partitions(db, settings.order_partition_months_ahead)
+    except Exception as e:
+        # New orders fall into the DEFAULT partition until this succeeds
+        logger.error(f"Could not create order partitions: {e}")
+    finally:
+        db.close()
+
+
+# Compile the promotions before the first request, requests serve none until a load succeeds
+def load_promotions():
+    try:
+        promotion_engine.load()
+    except Exception as e:
+        logger.error(f"Could not load the promotions: {e}")
+
+
+"""
+Startup and shutdown of the application.
+
+Importing the app opens no connection or file and starts no thread: logging,
+tracing, the engines and the background work are set up here, before the first
+request. On shutdown the order workers finish the queued orders before the
+connections are closed, then the span exporter and the log writer stop.
+"""
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Records are written as JSON by a background thread
+    configure_logging()
+    # Spans of the traced requests are written to TRACE_FILE by a background thread, off without one
+    configure_tracing()
+    get_engine()
+    if settings.db_mode == "async":
+        get_async_engine()
+    create_order_partitions()
+    load_promotions()
+    # Build the related products index in the background, lookups return none until it is built
+    related_products.start()
+    # Start the order workers when checkout runs in queued mode
+    if settings.checkout_mode == "queued":
+        order_queue.start()
+    # Start the health and lag checks of the read replicas, if any are configured
+    replica_router.start()
+    # Delete the expired idempotency keys now and every idempotency_sweep_minutes
+    key_sweeper.start()
+    logger.info("FastAPI application started successfully")
+
+    yield
+
+    if order_queue.running:
+        order_queue.stop()
+    replica_router.stop()
+    key_sweeper.stop()
+    if settings.db_mode == "async":
+        await get_async_engine().dispose()
+        await replica_router.dispose_async_engines()
+    get_engine().dispose()
+    stop_tracing()
+    stop_logging()
+
+
+"""
+Create the application.
+
+The settings are read here and not at import: db_mode picks the sync or the async
+routes of products, cart, checkout and orders. Run it with
+uvicorn --factory app.main:create_app.
+
+Returns:
+    FastAPI: The application.
+"""
+def create_app() -> FastAPI:
+    if settings.db_mode == "async":
+        # Event loop routes with an AsyncSession over asyncpg
+        from app.products.routes_async import admin_product_router, public_product_router
+        from app.cart.routes_async import cart_router
+        from app.checkout.routes_async import checkout_router
+        from app.orders.routes_async import order_router
+    else:
+        from app.products.routes import admin_product_router
+        from app.products.routes import public_product_router
+        from app.cart.routes import cart_router
+        from app.checkout.routes import checkout_router
+        from app.orders.routes import order_router
+
+    # Initialize Fast API application
+    app = FastAPI(lifespan=lifespan)
+
+    # Count and time the SQL statements of every request
+    instrument_queries()
+    app.add_middleware(QueryStatsMiddleware)
+    # Profile the requests an admin asks for with X-Profile, including the statements they run
+    app.add_middleware(ProfilingMiddleware)
+    # Run the sampled requests in a root span, the spans of auth, SQL, bcrypt and payments are its children
+    app.add_middleware(TracingMiddleware)
+    # Answer 503 to the requests the process has no room for, browsing is shed before checkout
+    app.add_middleware(AdmissionMiddleware)
+    # Time every request by route template, outermost so the time includes the other middleware
+    app.add_middleware(MetricsMiddleware)
+
+    # Include API routers for functionality
+    app.include_router(auth_router)
+    app.include_router(admin_product_router)
+    app.include_router(public_product_router)
+    app.include_router(cart_router)
+    app.include_router(checkout_router)
+    app.include_router(order_router)
+    app.include_router(admin_order_router)
+    app.include_router(analytics_router)
+    app.include_router(recommendation_router)
+    app.include_router(admin_promotion_router)
+    app.include_router(monitoring_router)
+    app.include_router(metrics_router)
+    return app
+
+
 logger = logging.getLogger(__name__)
-logger.info("FastAPI application started successfully")
\ No newline at end of file
@@ -0,0 +1,172 @@
+import time
+from typing import List, Sequence
+
+from app.core.admission import admission_snapshot, requests_shed
+from app.core.database import pool_stats
+from app.core.logs import log_records_dropped
+from app.core.tracing import spans_dropped
+from app.core.metrics import Counter, Gauge, Histogram
+
+# Upper bounds of the request latency buckets in seconds
+REQUEST_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Other methods are counted as "other", so a client cannot create new series
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")
+
+# Route label of the requests that matched no route, the raw path would create a series per URL
+UNMATCHED_ROUTE = "unmatched"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+request_seconds = Histogram(REQUEST_SECONDS_BUCKETS)
+requests_in_flight = Gauge()
+
+# Domain counters, incremented by the routes
+checkouts = Counter()
+cart_adds = Counter()
+search_queries = Counter()
+auth_failures = Counter()
+
+# Name, type, help text and label names of every exposed metric
+METRICS = [
+    ("http_request_duration_seconds", "histogram", "Request latency by route template and status",
+     ("method", "route", "status"), request_seconds),
+    ("http_requests_in_flight", "gauge", "Requests being served", ("method",), requests_in_flight),
+    ("checkouts_total", "counter", "Checkout requests by response status", ("status",), checkouts),
+    ("cart_adds_total", "counter", "Items added to carts", (), cart_adds),
+    ("search_queries_total", "counter", "Product searches by whether anything was found", ("result",),
+     search_queries),
+    ("auth_failures_total", "counter", "Rejected sign ins and tokens by reason", ("reason",), auth_failures),
+    ("log_records_dropped_total", "counter", "Log records dropped because the log queue was full", (),
+     log_records_dropped),
+    ("trace_spans_dropped_total", "counter", "Finished spans dropped because the span queue was full", (),
+     spans_dropped),
+    ("admission_rejected_total", "counter", "Requests answered 503 by workload class and reason", ("class", "reason"),
+     requests_shed),
+]
+
+
+"""
+ASGI middleware that times every request into request_seconds and counts the
+requests in flight.
+
+The route label is the path template of the matched route ("/products/{product_id}"),
+set in the scope by the router, so the number of series stays bounded.
+"""
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in METHODS else "other"
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        requests_in_flight.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_flight.dec(method)
+            route = scope.get("route")
+            request_seconds.observe(
+                time.perf_counter() - started, method, route.path if route else UNMATCHED_ROUTE, str(status)
+            )
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _histogram_lines(name: str, label_names: Sequence[str], labels: Sequence[str], buckets: Sequence,
+                     counts: Sequence[float], total: float) -> List[str]:
+    lines, cumulative = [], 0
+    for bound, count in zip(tuple(buckets) + ("+Inf",), counts):
+        cumulative += count
+        bucket_labels = _format_labels((*label_names, "le"), (*labels, bound))
+        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+    lines.append(f"{name}_sum{_format_labels(label_names, labels)} {total}")
+    lines.append(f"{name}_count{_format_labels(label_names, labels)} {cumulative}")
+    return lines
+
+
+# Connection pool state of every engine, from the same numbers as /admin/monitoring/pool
+def _pool_lines() -> List[str]:
+    stats = pool_stats()
+    lines = []
+    gauges = [
+        ("db_pool_size", "size", "Connections kept open by the pool"),
+        ("db_pool_checked_out", "checked_out", "Connections in use"),
+        ("db_pool_checked_in", "checked_in", "Idle connections"),
+        ("db_pool_overflow", "overflow", "Connections open above the pool size"),
+    ]
+    for name, key, documentation in gauges:
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{pool="{pool}"}} {values[key]}' for pool, values in stats.items()]
+
+    name = "db_pool_checkout_timeouts_total"
+    lines += [f"# HELP {name} Checkouts that timed out waiting for a connection", f"# TYPE {name} counter"]
+    lines += [f'{name}{{pool="{pool}"}} {values["timeouts"]}' for pool, values in stats.items()]
+
+    name = "db_pool_checkout_wait_seconds"
+    lines += [f"# HELP {name} Time waited for a connection", f"# TYPE {name} histogram"]
+    for pool, values in stats.items():
+        waits = values["wait_ms"]
+        buckets = [bucket["le"] / 1000 for bucket in waits["buckets"][:-1]]
+        # The snapshot is cumulative already
+        counts, previous = [], 0
+        for bucket in waits["buckets"]:
+            counts.append(bucket["count"] - previous)
+            previous = bucket["count"]
+        lines += _histogram_lines(name, ("pool",), (pool,), buckets, counts, waits["sum"] / 1000)
+    return lines
+
+
+# Adaptive limit and requests in flight of every workload class, from /admin/monitoring/admission
+def _admission_lines() -> List[str]:
+    snapshot = admission_snapshot()
+    if snapshot is None:
+        return []
+    lines = []
+    gauges = [
+        ("admission_limit", "limit", "Concurrency limit of the workload class"),
+        ("admission_in_flight", "in_flight", "Admitted requests of the workload class being served"),
+    ]
+    for name, key, documentation in gauges:
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{class="{workload}"}} {values[key]}' for workload, values in snapshot["classes"].items()]
+    return lines
+
+
+"""
+Render every metric in the Prometheus text exposition format.
+
+Returns:
+    str: The metrics page served at /metrics
+"""
+def render_metrics() -> str:
+    lines = []
+    for name, kind, documentation, label_names, metric in METRICS:
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+        for labels, value in sorted(metric.collect().items()):
+            if kind == "histogram":
+                lines += _histogram_lines(name, label_names, labels, metric.buckets, value[:-1], value[-1])
+            else:
+                lines.append(f"{name}{_format_labels(label_names, labels)} {value}")
+    lines += _pool_lines()
+    lines += _admission_lines()
+    return "\n".join(lines) + "\n"
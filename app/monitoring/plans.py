@@ -0,0 +1,357 @@
+"""
+Query plan snapshots of the CRUD functions
+
+Runs the product, cart, order history and checkout functions against the
+database configured in .env, inside a transaction that is rolled back, captures
+every statement they execute and plans it with EXPLAIN (FORMAT JSON). A plan is
+reduced to its shape: node types, tables, indexes, join types and sort keys,
+without costs or row estimates, the monthly partitions folded into one.
+
+--save stores the shapes in a snapshot file and --check compares them with it,
+exiting with 1 on a regression:
+- a sequential scan of orders, order_items or cart filtered by their user or order
+  column, with or without a snapshot: the index of the lookup is gone
+- a sequential scan of a table the statement did not scan sequentially before
+- more sort nodes than before
+Other plan changes are printed, save again when they are expected.
+
+Plans depend on the table statistics, take and check the snapshots on data
+seeded with benchmarks.seed_data. On a small database (CI, a laptop) pass
+--no-seqscan: sequential scans are then only planned when no index can serve the
+statement, so the plans show the indexes the statements can use whatever the
+data size. check_plans() runs the check from a test.
+
+Usage:
+    python -m app.monitoring.plans --no-seqscan --save query_plans.json
+    python -m app.monitoring.plans --no-seqscan --check query_plans.json
+"""
+import argparse
+import json
+import re
+import sys
+import uuid
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import event
+
+# The auth models must be loaded first, they import the cart and order models
+from app.auth.models import User
+from app.cart import cart_crud
+from app.cart.schemas import CartItemCreate
+from app.checkout import checkout_crud
+from app.core.database import get_engine, get_sessionmaker
+from app.orders import orders_crud
+from app.orders.models import OrderStatus
+from app.orders.routes import get_order_detail
+from app.products import products_crud
+from app.products.models import Products
+from app.products.schemas import ProductUpdate
+
+# Statements that are planned, the savepoints and settings around them are not
+PLANNED_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+# Monthly partitions of orders and order_items, and of their indexes
+PARTITION_SUFFIX = re.compile(r"_p\d{4}_\d{2}")
+
+# Columns every lookup of these tables filters on, a sequential scan filtering on them lost its index
+INDEXED_LOOKUPS = {"orders": ("user_id",), "order_items": ("order_id",), "cart": ("user_id",)}
+
+# Postgres rightly reads tables and partitions smaller than this (1 MB) sequentially, with or without an index
+SMALL_TABLE_PAGES = 128
+
+SORT_NODES = ("Sort", "Incremental Sort")
+
+
+# Rows the cases run against, created in the rolled back transaction
+class Fixture:
+    def __init__(self, db):
+        self.user = User(name="Plan Check", email=f"plan-check-{uuid.uuid4().hex}@example.com",
+                         hashed_password="-", role="user")
+        self.products = [
+            Products(name=f"plan check {number}", description="plan check", price=10.0 + number, stock=100,
+                     category="plan-check", image_url="")
+            for number in range(2)
+        ]
+        db.add_all([self.user, *self.products])
+        db.flush()
+        self.user_id = self.user.id
+        self.product_id = self.products[0].id
+        self.order = None
+
+
+def _cart_item(fixture: Fixture, quantity: int = 1) -> CartItemCreate:
+    return CartItemCreate(product_id=fixture.product_id, quantity=quantity)
+
+
+def _reserve(db, fixture: Fixture):
+    cart_crud.add_to_cart(db, fixture.user_id, CartItemCreate(product_id=fixture.products[1].id, quantity=1))
+    fixture.order = checkout_crud.reserve_order(db, fixture.user_id)
+
+
+def _order_history_cursor(db, fixture: Fixture):
+    cursor = orders_crud.encode_cursor(datetime.now(), fixture.order.order_id + 1)
+    orders_crud.get_order_history(db, fixture.user_id, 20, cursor)
+
+
+# Name and function of every case, run in this order so the cart and order cases find their rows
+CASES = [
+    ("products.get_product_by_id", lambda db, fixture: products_crud.get_product_by_id(db, fixture.product_id)),
+    ("products.get_products", lambda db, fixture: products_crud.get_products(db)),
+    ("products.get_products.filtered", lambda db, fixture: products_crud.get_products(
+        db, category="plan-check", min_price=5, max_price=50, sort_by="price_asc")),
+    ("products.get_products.popularity", lambda db, fixture: products_crud.get_products(db, sort_by="popularity")),
+    ("products.get_products.deep_page", lambda db, fixture: products_crud.get_products(
+        db, sort_by="price_desc", page=500)),
+    ("products.search_products", lambda db, fixture: products_crud.search_products(db, "lamp")),
+    ("products.update_product_details", lambda db, fixture: products_crud.update_product_details(
+        db, fixture.product_id, ProductUpdate(name="plan check", description="plan check", price=12.0, stock=90,
+                                              category="plan-check", image_url=""))),
+    ("cart.add_to_cart.new", lambda db, fixture: cart_crud.add_to_cart(db, fixture.user_id, _cart_item(fixture))),
+    ("cart.add_to_cart.existing", lambda db, fixture: cart_crud.add_to_cart(
+        db, fixture.user_id, _cart_item(fixture))),
+    ("cart.get_cart", lambda db, fixture: cart_crud.get_cart(db, fixture.user_id)),
+    ("cart.update_quantity", lambda db, fixture: cart_crud.update_quantity(
+        db, fixture.user_id, fixture.product_id, 3)),
+    ("cart.remove_from_cart", lambda db, fixture: cart_crud.remove_from_cart(db, fixture.user_id, fixture.product_id)),
+    ("checkout.reserve_order", _reserve),
+    ("checkout.complete_orders", lambda db, fixture: checkout_crud.complete_orders(db, [fixture.order])),
+    ("checkout.get_order_status", lambda db, fixture: checkout_crud.get_order_status(
+        db, fixture.user_id, fixture.order.order_id)),
+    ("checkout.cancel_stale_orders", lambda db, fixture: checkout_crud.cancel_stale_orders(
+        db, datetime.now() - checkout_crud.PENDING_TIMEOUT, user_id=fixture.user_id)),
+    ("orders.get_order_history", lambda db, fixture: orders_crud.get_order_history(db, fixture.user_id, 20)),
+    ("orders.get_order_history.cursor", _order_history_cursor),
+    ("orders.get_order_history.status", lambda db, fixture: orders_crud.get_order_history(
+        db, fixture.user_id, 20, status=OrderStatus.paid)),
+    ("orders.get_order_detail", lambda db, fixture: get_order_detail(
+        order_id=fixture.order.order_id, created_at=fixture.order.created_at, db=db, user=fixture.user)),
+]
+
+
+# Statements executed on a connection while active, with their parameters as sent to the driver
+class StatementCapture:
+    def __init__(self, connection):
+        self.active = False
+        self.statements = []
+        event.listen(connection, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        words = statement.split(None, 1)
+        if self.active and words and words[0].upper() in PLANNED_STATEMENTS:
+            # One planned statement per executemany, the parameter sets share its plan
+            self.statements.append((statement, parameters[0] if executemany else parameters))
+
+    def take(self) -> List[Tuple[str, object]]:
+        statements, self.statements = self.statements, []
+        return statements
+
+
+def _table(relation: str) -> str:
+    return PARTITION_SUFFIX.sub("", relation).removesuffix("_default")
+
+
+def _node_line(node: dict) -> str:
+    line = node["Operation"] if node["Node Type"] == "ModifyTable" else node["Node Type"]
+    if "Join Type" in node:
+        line += f" ({node['Join Type']})"
+    if "Strategy" in node and node["Strategy"] != "Plain":
+        line += f" ({node['Strategy']})"
+    if "Index Name" in node:
+        line += f" using {PARTITION_SUFFIX.sub('_p*', node['Index Name'])}"
+    if "Relation Name" in node:
+        line += f" on {PARTITION_SUFFIX.sub('_p*', node['Relation Name'])}"
+    if "Sort Key" in node:
+        line += f" by {', '.join(node['Sort Key'])}"
+    return line
+
+
+"""
+Reduce a plan to its shape, one line per node indented by depth. The children
+of an Append that are identical after folding the partitions are kept once, so
+the shape does not change every month.
+
+Args:
+    node (dict): Plan node of EXPLAIN (FORMAT JSON).
+    depth (int): Depth of the node.
+
+Returns:
+    list: Lines of the shape
+"""
+def plan_shape(node: dict, depth: int = 0) -> List[str]:
+    lines = ["  " * depth + _node_line(node)]
+    seen = set()
+    for child in node.get("Plans", []):
+        child_lines = plan_shape(child, depth + 1)
+        if tuple(child_lines) not in seen:
+            seen.add(tuple(child_lines))
+            lines += child_lines
+    return lines
+
+
+# Sequential scans filtering on the column of an indexed lookup, of relations of at least min_pages pages
+def lost_indexes(node: dict, pages: dict, min_pages: int) -> List[str]:
+    found = []
+    if node["Node Type"] == "Seq Scan" and pages.get(node["Relation Name"], 0) >= min_pages:
+        table = _table(node["Relation Name"])
+        for column in INDEXED_LOOKUPS.get(table, ()):
+            if re.search(rf"\b{column}\b", node.get("Filter", "")):
+                found.append(f"sequential scan of {table} filtered by {column}")
+    for child in node.get("Plans", []):
+        found += [issue for issue in lost_indexes(child, pages, min_pages) if issue not in found]
+    return found
+
+
+"""
+Run every case in a rolled back transaction and plan the statements it executed.
+
+Args:
+    no_seqscan (bool): Plan with enable_seqscan off, for databases too small for index scans.
+
+Returns:
+    dict: Case name -> list of {"statement", "plan", "lost_indexes"}, one per statement
+"""
+def capture_plans(no_seqscan: bool = False) -> dict:
+    connection = get_engine().connect()
+    transaction = connection.begin()
+    try:
+        if no_seqscan:
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        pages = dict(connection.exec_driver_sql("SELECT relname, relpages FROM pg_class WHERE relkind = 'r'").all())
+        # Without enable_seqscan a sequential scan means no index fits, whatever the size
+        min_pages = 0 if no_seqscan else SMALL_TABLE_PAGES
+        capture = StatementCapture(connection)
+        # The commits of the CRUD functions release savepoints, the outer transaction is rolled back
+        db = get_sessionmaker()(bind=connection, join_transaction_mode="create_savepoint")
+        fixture = Fixture(db)
+
+        plans = {}
+        for name, case in CASES:
+            capture.active = True
+            try:
+                case(db, fixture)
+            finally:
+                capture.active = False
+            plans[name] = []
+            for statement, parameters in capture.take():
+                explained = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+                plan = explained[0]["Plan"]
+                plans[name].append({
+                    "statement": " ".join(statement.split()),
+                    "plan": plan_shape(plan),
+                    "lost_indexes": lost_indexes(plan, pages, min_pages),
+                })
+        db.close()
+        return plans
+    finally:
+        transaction.rollback()
+        connection.close()
+
+
+def _sorts(plan: List[str]) -> int:
+    return sum(1 for line in plan if line.strip().startswith(SORT_NODES))
+
+
+def _seq_scanned(plan: List[str]) -> set:
+    return {line.strip().rsplit(" on ", 1)[-1] for line in plan if line.strip().startswith("Seq Scan on ")}
+
+
+"""
+Compare captured plans with a snapshot.
+
+Args:
+    saved (dict): Snapshot written by --save.
+    plans (dict): Plans of capture_plans().
+
+Returns:
+    tuple: (regressions, changes), lists of messages
+"""
+def compare(saved: dict, plans: dict):
+    regressions, changes = [], []
+    for name, statements in plans.items():
+        before = saved.get(name)
+        if before is None:
+            changes.append(f"{name}: not in the snapshot")
+        elif len(before) != len(statements):
+            changes.append(f"{name}: {len(statements)} statements, {len(before)} in the snapshot")
+
+        for number, entry in enumerate(statements):
+            label = f"{name} statement {number + 1}"
+            regressions += [f"{label}: {issue}" for issue in entry["lost_indexes"]]
+            if before is None or number >= len(before):
+                continue
+            old_plan, plan = before[number]["plan"], entry["plan"]
+            if old_plan == plan:
+                continue
+            new_scans = _seq_scanned(plan) - _seq_scanned(old_plan)
+            if new_scans:
+                regressions.append(f"{label}: new sequential scan of {', '.join(sorted(new_scans))}")
+            if _sorts(plan) > _sorts(old_plan):
+                regressions.append(f"{label}: {_sorts(plan)} sort nodes, {_sorts(old_plan)} in the snapshot")
+            changes.append(f"{label}: plan changed\n  was:\n    " + "\n    ".join(old_plan)
+                           + "\n  now:\n    " + "\n    ".join(plan))
+
+    for name in saved.keys() - plans.keys():
+        changes.append(f"{name}: in the snapshot but no longer captured")
+    return regressions, changes
+
+
+def _load(path: str) -> dict:
+    with open(path) as snapshot:
+        return json.load(snapshot)
+
+
+"""
+Capture the plans and compare them with a snapshot, for tests.
+
+Args:
+    path (str): Snapshot written by --save.
+
+Returns:
+    list: Regressions, empty when the plans are as good as the snapshot
+"""
+def check_plans(path: str) -> List[str]:
+    saved = _load(path)
+    return compare(saved["cases"], capture_plans(saved["no_seqscan"]))[0]
+
+
+def run(save: str, check: str, no_seqscan: bool) -> int:
+    plans = capture_plans(no_seqscan)
+
+    if save:
+        cases = {name: [{"statement": entry["statement"], "plan": entry["plan"]} for entry in statements]
+                 for name, statements in plans.items()}
+        with open(save, "w") as snapshot:
+            json.dump({"no_seqscan": no_seqscan, "cases": cases}, snapshot, indent=2)
+            snapshot.write("\n")
+        print(f"Saved the plans of {len(plans)} cases to {save}")
+
+    if not check:
+        for name, statements in plans.items():
+            for number, entry in enumerate(statements):
+                print(f"{name} statement {number + 1}: {entry['statement'][:120]}")
+                print("\n".join("    " + line for line in entry["plan"]))
+                for issue in entry["lost_indexes"]:
+                    print(f"    !! {issue}")
+        return 0
+
+    saved = _load(check)
+    if saved["no_seqscan"] != no_seqscan:
+        print(f"The snapshot was taken with no_seqscan={saved['no_seqscan']}, the plans may differ")
+    regressions, changes = compare(saved["cases"], plans)
+    for change in changes:
+        print(change)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(plans)} cases, {len(regressions)} regressions, {len(changes)} changes")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot and check the query plans of the CRUD functions")
+    parser.add_argument("--save", metavar="PATH", help="Write the plans to a snapshot file")
+    parser.add_argument("--check", metavar="PATH", help="Compare the plans with a snapshot, exit 1 on regressions")
+    parser.add_argument("--no-seqscan", action="store_true",
+                        help="Plan with enable_seqscan off, for a database too small for index scans")
+    args = parser.parse_args()
+    sys.exit(run(args.save, args.check, args.no_seqscan))
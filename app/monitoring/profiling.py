@@ -0,0 +1,318 @@
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+from app.auth.dependency import allow_only_admin, extract_user
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# X-Profile value -> (sample the stacks, trace the allocations), any other value does both
+PROFILE_MODES = {"cpu": (True, False), "memory": (False, True)}
+
+# Innermost frames of a parked thread (idle workers, the event loop waiting for I/O, the log writer),
+# their samples are dropped so the profile shows the threads doing work
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select"),
+    ("queue.py", "get"), ("handlers.py", "dequeue"),
+}
+
+# Paths in the profiles are relative to the repository or to site-packages
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SITE_PACKAGES = "site-packages" + os.sep
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    if filename.startswith(ROOT + os.sep):
+        return os.path.relpath(filename, ROOT)
+    if SITE_PACKAGES in filename:
+        return filename.split(SITE_PACKAGES, 1)[1]
+    return os.path.basename(filename)
+
+
+@lru_cache(maxsize=16384)
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+# One line of the collapsed stack format: thread;outermost;...;innermost
+def _fold(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+"""
+Sampling profiler: a thread records the stack of every busy thread of the
+process each interval. A sync route runs on a threadpool thread and an async
+one on the event loop thread, both are sampled; requests served at the same
+time are sampled as well and show up under their own frames.
+"""
+class StackSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own and not _idle(frame):
+                    self.stacks[_fold(frame, names.get(thread_id, str(thread_id)))] += 1
+            self.samples += 1
+
+
+# tracemalloc is process wide, it runs while at least one profiled request traces memory
+_tracing_lock = threading.Lock()
+_tracing = 0
+
+
+def start_tracing():
+    global _tracing
+    with _tracing_lock:
+        if _tracing == 0:
+            tracemalloc.start()
+        _tracing += 1
+
+
+# Peak traced bytes and the top allocation sites still holding memory, then stop when no one else traces
+def stop_tracing(top: int):
+    global _tracing
+    with _tracing_lock:
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        _tracing -= 1
+        if _tracing == 0:
+            tracemalloc.stop()
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ])
+    allocations = [
+        {
+            "site": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:top]
+    ]
+    return round(peak / 1024, 1), allocations
+
+
+# One profiled request
+class Profile:
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.started_at = datetime.utcnow()
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.route = None
+        self.status = None
+        self.duration_ms = None
+        self.interval_ms = None
+        self.samples = 0
+        self.stacks = Counter()
+        self.peak_kb = None
+        self.allocations = []
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "started_at": self.started_at.isoformat(),
+            "trigger": self.trigger,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "interval_ms": self.interval_ms,
+            "peak_kb": self.peak_kb,
+        }
+
+    # Frames by the samples they were the innermost frame of (self time)
+    def top_frames(self, top: int) -> List[dict]:
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        return [{"frame": frame, "samples": count} for frame, count in own.most_common(top)]
+
+    def detail(self) -> dict:
+        return {
+            **self.summary(),
+            "top_frames": self.top_frames(settings.profile_top_allocations),
+            "allocations": self.allocations,
+        }
+
+    # Collapsed stacks, the input of flamegraph.pl, inferno and speedscope
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# The last profile_store_size profiles of this process
+class ProfileStore:
+    def __init__(self):
+        self._profiles = deque()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._profiles.append(profile)
+            while len(self._profiles) > settings.profile_store_size:
+                self._profiles.popleft()
+
+    def list(self) -> List[Profile]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+
+profile_store = ProfileStore()
+
+
+"""
+Check that an Authorization header carries the token of an admin, with the
+same dependencies as the admin routes.
+
+Args:
+    authorization: Value of the Authorization header.
+
+Returns:
+    bool: True if allow_only_admin accepts the user of the token
+"""
+def is_admin(authorization: Optional[str]) -> bool:
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not credentials:
+        return False
+    db = SessionLocal()
+    try:
+        allow_only_admin(extract_user(HTTPAuthorizationCredentials(scheme=scheme, credentials=credentials), db))
+        return True
+    except (HTTPException, TypeError, ValueError):
+        return False
+    finally:
+        db.close()
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+"""
+ASGI middleware that profiles single requests.
+
+A request with an X-Profile header ("cpu", "memory", anything else for both)
+and an admin bearer token is served under the stack sampler and tracemalloc;
+its profile is stored and its ID returned in X-Profile-Id. Without an admin
+token the header is ignored. With profile_sample_rate set, 1 in N of the other
+requests is profiled as well, stack samples only, as tracemalloc slows down the
+whole process. Requests that are not profiled only pay for the header lookup.
+"""
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = _header(scope, PROFILE_HEADER)
+        if requested is not None:
+            # The admin check queries the database, off the event loop
+            if not await run_in_threadpool(is_admin, _header(scope, b"authorization")):
+                logger.warning(f"Profiling of {scope['method']} {scope['path']} requested without an admin token")
+                await self.app(scope, receive, send)
+                return
+            cpu, memory = PROFILE_MODES.get(requested.strip().lower(), (True, True))
+            await self._profile(scope, receive, send, cpu, memory, "admin")
+
+        elif settings.profile_sample_rate and random.random() * settings.profile_sample_rate < 1:
+            await self._profile(scope, receive, send, True, False, "sampled")
+
+        else:
+            await self.app(scope, receive, send)
+
+    async def _profile(self, scope, receive, send, cpu: bool, memory: bool, trigger: str):
+        profile = Profile(scope["method"], scope["path"], trigger)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                if trigger == "admin":
+                    MutableHeaders(scope=message)[PROFILE_ID_HEADER] = profile.id
+            await send(message)
+
+        sampler = None
+        if cpu:
+            profile.interval_ms = settings.profile_interval_ms
+            sampler = StackSampler(settings.profile_interval_ms / 1000)
+            sampler.start()
+        if memory:
+            start_tracing()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            if sampler:
+                sampler.stop()
+                profile.stacks, profile.samples = sampler.stacks, sampler.samples
+            if memory:
+                profile.peak_kb, profile.allocations = await run_in_threadpool(
+                    stop_tracing, settings.profile_top_allocations
+                )
+            route = scope.get("route")
+            profile.route = route.path if route else None
+            profile_store.add(profile)
+            logger.info(
+                "Profiled %s %s (%s): %s ms, %s samples, profile %s",
+                profile.method, profile.path, trigger, profile.duration_ms, profile.samples, profile.id,
+            )
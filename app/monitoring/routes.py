@@ -0,0 +1,182 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from app.auth.dependency import allow_only_admin
+from app.core.admission import admission_snapshot
+from app.core.config import settings
+from app.core.database import pool_stats
+from app.core.replicas import replica_router
+from app.monitoring.metrics import CONTENT_TYPE, render_metrics
+from app.monitoring.profiling import profile_store
+
+import logging
+import secrets
+
+# Create a logger instance for the current module
+logger = logging.getLogger(__name__)
+
+# Create a API Router for the admin runtime metrics
+monitoring_router = APIRouter(prefix="/admin/monitoring", tags=["Admin Monitoring"])
+
+# Create a API Router for the Prometheus scrape endpoint
+metrics_router = APIRouter(tags=["Monitoring"])
+
+
+"""
+Connection pool state and checkout waits (Admin only).
+
+The admin check itself needs a pooled connection, so this waits like any other
+request when the pool is exhausted.
+
+Args:
+    admin: Admin user info.
+
+Returns:
+    dict: Per pool ("sync", and "async" once used) the size, checked out and idle
+    connections, overflow, checkout timeouts and the cumulative histogram of the
+    checkout waits in milliseconds.
+"""
+@monitoring_router.get("/pool")
+def pool_metrics(admin: dict = Depends(allow_only_admin)):
+    try:
+        stats = pool_stats()
+        logger.info("Connection pool metrics retrieved by admin")
+        return stats
+
+    except Exception as e:
+        logger.error(f"Connection pool metrics failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve connection pool metrics")
+
+
+"""
+Health and replication lag of the read replicas (Admin only).
+
+Args:
+    admin: Admin user info.
+
+Returns:
+    list: Per replica its name, host, whether reads are routed to it, the lag in
+    seconds of the last check and the reason it is ejected.
+"""
+@monitoring_router.get("/replicas")
+def replica_status(admin: dict = Depends(allow_only_admin)):
+    try:
+        status = replica_router.status()
+        logger.info("Read replica status retrieved by admin")
+        return status
+
+    except Exception as e:
+        logger.error(f"Read replica status failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve read replica status")
+
+
+"""
+Admission control state of this process (Admin only).
+
+Args:
+    admin: Admin user info.
+
+Returns:
+    dict: The capacity and requests in flight of the process and, per workload
+    class, its adaptive limit, the most it may reach, the requests in flight and
+    the recent and baseline latency. None when admission control is off.
+"""
+@monitoring_router.get("/admission")
+def admission_status(admin: dict = Depends(allow_only_admin)):
+    try:
+        return admission_snapshot()
+
+    except Exception as e:
+        logger.error(f"Admission control status failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve the admission control status")
+
+
+"""
+Profiles of the last requests profiled by this process, newest first (Admin only).
+
+A request is profiled when an admin sends it with an X-Profile header, or when it
+is sampled by profile_sample_rate.
+
+Args:
+    admin: Admin user info.
+
+Returns:
+    list: Per profile its ID, trigger, method, path, route template, status,
+    duration, stack samples and peak traced memory.
+"""
+@monitoring_router.get("/profiles")
+def list_profiles(admin: dict = Depends(allow_only_admin)):
+    try:
+        return [profile.summary() for profile in profile_store.list()]
+
+    except Exception as e:
+        logger.error(f"Listing the profiles failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to list the profiles")
+
+
+"""
+One profile with its hottest frames and top allocation sites (Admin only).
+
+Args:
+    profile_id (str): ID returned in the X-Profile-Id header.
+    admin: Admin user info.
+
+Returns:
+    dict: The summary, the frames with the most samples as the innermost frame
+    and the allocation sites holding the most memory at the end of the request.
+"""
+@monitoring_router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, admin: dict = Depends(allow_only_admin)):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.detail()
+
+
+"""
+Stack samples of a profile in the collapsed stack format (Admin only), one
+"thread;outer frame;...;inner frame count" line per stack, for flamegraph.pl,
+inferno or speedscope.
+
+Args:
+    profile_id (str): ID returned in the X-Profile-Id header.
+    admin: Admin user info.
+
+Returns:
+    PlainTextResponse: The collapsed stacks.
+"""
+@monitoring_router.get("/profiles/{profile_id}/folded")
+def get_profile_folded(profile_id: str, admin: dict = Depends(allow_only_admin)):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.folded())
+
+
+"""
+Metrics in the Prometheus text format: request latency histograms per route
+template and status, requests in flight, connection pools and domain counters.
+
+An async route, so a scrape is answered while the threadpool is busy. When
+metrics_token is set the scraper must send it as a bearer token.
+
+Args:
+    authorization: Value of the Authorization header.
+
+Returns:
+    PlainTextResponse: The metrics page.
+"""
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    if settings.metrics_token and not secrets.compare_digest(
+        authorization or "", f"Bearer {settings.metrics_token}"
+    ):
+        logger.warning("Metrics scrape with a missing or wrong token")
+        raise HTTPException(status_code=401, detail="Invalid token")
+    try:
+        return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+    except Exception as e:
+        logger.error(f"Rendering the metrics failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to render the metrics")
@@ -0,0 +1,184 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from app.core import tracing
+from app.core.config import settings
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+# Statements are logged up to this many characters
+STATEMENT_LOG_LENGTH = 500
+
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+QUERY_TIME_HEADER = "X-DB-Time-Ms"
+SLOWEST_QUERY_HEADER = "X-DB-Slowest-Ms"
+MAX_REPEATS_HEADER = "X-DB-Max-Repeats"
+
+
+# Statements executed while serving one request
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_statement = None
+        # Statement text with placeholders -> executions, the same shape repeated is an N+1 pattern
+        self.shapes = Counter()
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.shapes[statement] += 1
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms, self.slowest_statement = elapsed_ms, statement
+
+    def most_repeated(self):
+        if not self.shapes:
+            return None, 0
+        return self.shapes.most_common(1)[0]
+
+
+# Set by the middleware for the request being served, copied into the threadpool tasks and
+# greenlets of the request, so the statements of both sync and async routes are counted
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+    # A span per statement of a traced request, named after the operation; the parameters are left out
+    context._query_span = None if tracing.current() is None else tracing.start_span(
+        statement.split(None, 1)[0].upper() if statement.strip() else "SQL", tracing.CLIENT,
+        {"db.system": "postgresql", "db.statement": statement[:STATEMENT_LOG_LENGTH]},
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context._query_span is not None:
+        context._query_span.end()
+    elapsed_ms = (time.perf_counter() - context._query_started) * 1000
+    stats = current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+    if elapsed_ms >= settings.sql_slow_query_ms:
+        logger.warning(f"Slow query ({elapsed_ms:.0f} ms): {statement[:STATEMENT_LOG_LENGTH]}")
+
+
+# A failed statement ends its span with the error
+def _handle_error(exception_context):
+    span = getattr(exception_context.execution_context, "_query_span", None)
+    if span is not None:
+        span.record_error(exception_context.original_exception)
+        span.end()
+
+
+"""
+Time every statement of every engine, including the ones created later.
+
+Returns:
+    None
+"""
+def instrument_queries():
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+"""
+ASGI middleware that counts the statements of each request.
+
+The query count, the total and slowest statement times and the highest number of
+executions of one statement shape are added as response headers, and logged as
+fields of a debug record. A warning is logged when one shape runs
+sql_repeated_statement_warning times or more in a request, the usual sign of a
+relationship loaded lazily in a loop.
+"""
+class QueryStatsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_stats.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers[QUERY_COUNT_HEADER] = str(stats.count)
+                headers[QUERY_TIME_HEADER] = f"{stats.total_ms:.1f}"
+                headers[SLOWEST_QUERY_HEADER] = f"{stats.slowest_ms:.1f}"
+                headers[MAX_REPEATS_HEADER] = str(stats.most_repeated()[1])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            current_stats.reset(token)
+            self._log(scope, stats)
+
+    def _log(self, scope, stats: QueryStats):
+        route = f"{scope['method']} {scope['path']}"
+        statement, repeats = stats.most_repeated()
+        if repeats >= settings.sql_repeated_statement_warning:
+            logger.warning(
+                f"{route} ran the same statement {repeats} times, possible N+1: "
+                f"{statement[:STATEMENT_LOG_LENGTH]}"
+            )
+        if stats.count and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"{route} ran {stats.count} queries in {stats.total_ms:.1f} ms",
+                extra={
+                    "db_queries": stats.count,
+                    "db_time_ms": round(stats.total_ms, 1),
+                    "db_slowest_ms": round(stats.slowest_ms, 1),
+                    "db_slowest_statement": (stats.slowest_statement or "")[:STATEMENT_LOG_LENGTH],
+                    "db_max_repeats": repeats,
+                },
+            )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+"""
+Assert that a request stayed within its query budget, for tests against the app
+(TestClient or a running server) with QueryStatsMiddleware installed.
+
+Args:
+    response: Response of the request, with the query headers
+    max_queries: Most statements the request may run
+    max_repeats: Most executions of one statement shape, 1 fails on any repeated statement
+
+Returns:
+    None
+
+Raises:
+    QueryBudgetExceeded: If the request ran more statements or repeated one more often
+"""
+def assert_query_budget(response, max_queries: int, max_repeats: int = 1):
+    count = int(response.headers[QUERY_COUNT_HEADER])
+    repeats = int(response.headers[MAX_REPEATS_HEADER])
+    request = response.request
+    if count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{request.method} {request.url.path} ran {count} queries, the budget is {max_queries}"
+        )
+    if repeats > max_repeats:
+        raise QueryBudgetExceeded(
+            f"{request.method} {request.url.path} ran one statement {repeats} times, "
+            f"at most {max_repeats} allowed (N+1?)"
+        )
@@ -0,0 +1,62 @@
+import random
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core import tracing
+from app.core.config import settings
+
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+"""
+ASGI middleware that runs every traced request in a root span.
+
+A request whose traceparent header is sampled continues the trace of its caller,
+one with an unsampled traceparent is not traced, and any other request is traced
+with trace_sample_rate. The span is named after the route template and gets the
+method, path, route and status; the trace ID is returned in X-Trace-Id. Spans of
+the code serving the request (auth, SQL statements, bcrypt, SMTP, payments) are
+its children. Nothing runs when tracing is off.
+"""
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracing.enabled():
+            await self.app(scope, receive, send)
+            return
+
+        parent = tracing.parse_traceparent(Headers(scope=scope).get("traceparent"))
+        sampled = parent.sampled if parent is not None else random.random() < settings.trace_sample_rate
+        root = tracing.start_trace(scope["method"], tracing.SERVER, parent) if sampled else None
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        root.set("http.request.method", scope["method"])
+        root.set("url.path", scope["path"])
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message)[TRACE_ID_HEADER] = root.trace_id
+            await send(message)
+
+        try:
+            with tracing.activate(root):
+                await self.app(scope, receive, send_with_trace_id)
+        except Exception as e:
+            root.record_error(e)
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+                root.set("http.route", route.path)
+            root.set("http.response.status_code", status)
+            if status >= 500 and root.error is None:
+                root.error = f"HTTP {status}"
+            root.end()
@@ -0,0 +1,19 @@
+from functools import lru_cache
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+"""
+Cache of serialized order details, keyed by (user_id, order_id).
+
+Only paid orders are stored: their items and totals never change afterwards, so
+an entry stays valid until the order changes status. Every status update in
+checkout_crud calls invalidate_order() for the orders it touched.
+"""
+@lru_cache(maxsize=None)
+def get_order_detail_cache() -> LRUCache:
+    return LRUCache(settings.order_detail_cache_size)
+
+
+def invalidate_order(user_id: int, order_id: int):
+    get_order_detail_cache().pop((user_id, order_id))
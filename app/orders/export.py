@@ -0,0 +1,356 @@
+"""
+Streaming export of orders and their items for finance
+
+One row per order item together with its order, read through a server-side
+cursor in chunks, so memory stays constant whatever the size of the date range.
+Rows are ordered by item_id, which is also the first column: an interrupted
+export is resumed by passing the last exported item_id as after_id.
+
+Parquet output needs pyarrow, which is only imported when it is requested.
+
+Usage:
+    python -m app.orders.export --start 2026-09-01 --end 2026-09-30 --format csv --out orders-2026-09.csv
+    python -m app.orders.export --start 2026-09-01 --end 2026-09-30 --format csv --out orders-2026-09.csv --resume
+    python -m app.orders.export --start 2026-09-01 --end 2026-09-30 --format parquet --out orders-2026-09/
+"""
+import argparse
+import csv
+import io
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+# The auth models must be loaded first, they import the cart and order models
+from app.auth.models import User
+from app.orders.models import OrderItem, Orders, OrderStatus
+
+COLUMNS = (
+    "item_id", "order_id", "user_id", "created_at", "status", "total_amount",
+    "product_id", "quantity", "price_at_purchase", "discount_amount", "promotion_id",
+)
+
+# Rows fetched from the server-side cursor at a time
+CHUNK_SIZE = 5000
+
+# Rows per parquet file written by the CLI, a resumed export starts a new file
+ROWS_PER_FILE = 1_000_000
+
+
+# Raised when parquet output is requested but pyarrow is not installed
+class ExportFormatUnavailable(Exception):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ExportFormatUnavailable("Parquet export needs the pyarrow package") from e
+    return pyarrow
+
+
+# Raises ExportFormatUnavailable before a parquet export starts streaming
+def parquet_available():
+    _pyarrow()
+
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ("item_id", pa.int64()), ("order_id", pa.int64()), ("user_id", pa.int64()),
+        ("created_at", pa.timestamp("us")), ("status", pa.string()), ("total_amount", pa.float64()),
+        ("product_id", pa.int64()), ("quantity", pa.int64()), ("price_at_purchase", pa.float64()),
+        ("discount_amount", pa.float64()), ("promotion_id", pa.int64()),
+    ])
+
+
+"""
+Read the order items of a date range in chunks through a server-side cursor.
+
+Both tables are filtered on created_at, so only the monthly partitions of the range
+are scanned.
+
+Args:
+    db (Session): Database session, kept in a transaction until the iterator is exhausted.
+    start (date): First day (inclusive).
+    end (date): Last day (inclusive).
+    after_id (int, optional): Only items with a greater ID (resume point).
+    status (OrderStatus, optional): Only orders with this status.
+    chunk_size (int): Rows per chunk.
+
+Yields:
+    list: Rows with the COLUMNS fields, ordered by item_id.
+"""
+def iter_chunks(db: Session, start: date, end: date, after_id: Optional[int] = None,
+                status: Optional[OrderStatus] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[list]:
+    first = datetime.combine(start, time.min)
+    last = datetime.combine(end + timedelta(days=1), time.min)
+    query = (
+        select(
+            OrderItem.id.label("item_id"), Orders.id.label("order_id"), Orders.user_id, Orders.created_at,
+            Orders.status, Orders.total_amount, OrderItem.product_id, OrderItem.quantity,
+            OrderItem.price_at_purchase, OrderItem.discount_amount, OrderItem.promotion_id,
+        )
+        .join(Orders, (Orders.id == OrderItem.order_id) & (Orders.created_at == OrderItem.created_at))
+        .where(
+            OrderItem.created_at >= first, OrderItem.created_at < last,
+            Orders.created_at >= first, Orders.created_at < last,
+        )
+        .order_by(OrderItem.id)
+    )
+    if after_id is not None:
+        query = query.where(OrderItem.id > after_id)
+    if status is not None:
+        query = query.where(Orders.status == status)
+
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        for rows in result.partitions():
+            yield rows
+    finally:
+        result.close()
+
+
+def _csv_values(row):
+    return [row.item_id, row.order_id, row.user_id, row.created_at.isoformat(), row.status.value,
+            row.total_amount, row.product_id, row.quantity, row.price_at_purchase,
+            row.discount_amount, row.promotion_id]
+
+
+"""
+Encode chunks of export rows as CSV.
+
+Args:
+    chunks (Iterator[list]): Chunks from iter_chunks().
+    header (bool): Start with the header line.
+
+Yields:
+    bytes: CSV text of one chunk.
+"""
+def csv_stream(chunks, header: bool = True) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(COLUMNS)
+    for rows in chunks:
+        writer.writerows(_csv_values(row) for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _record_batch(pa, schema, rows):
+    return pa.RecordBatch.from_pydict({
+        "item_id": [row.item_id for row in rows],
+        "order_id": [row.order_id for row in rows],
+        "user_id": [row.user_id for row in rows],
+        "created_at": [row.created_at for row in rows],
+        "status": [row.status.value for row in rows],
+        "total_amount": [row.total_amount for row in rows],
+        "product_id": [row.product_id for row in rows],
+        "quantity": [row.quantity for row in rows],
+        "price_at_purchase": [row.price_at_purchase for row in rows],
+        "discount_amount": [row.discount_amount for row in rows],
+        "promotion_id": [row.promotion_id for row in rows],
+    }, schema=schema)
+
+
+# Write-only file object handing the written bytes back to the caller, the parquet writer only appends
+class _ByteSink(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+"""
+Encode chunks of export rows as one parquet file, a row group per chunk.
+
+Args:
+    chunks (Iterator[list]): Chunks from iter_chunks().
+
+Yields:
+    bytes: Parts of the parquet file, the footer comes last.
+
+Raises:
+    ExportFormatUnavailable: If pyarrow is not installed.
+"""
+def parquet_stream(chunks) -> Iterator[bytes]:
+    pa = _pyarrow()
+    schema = _parquet_schema(pa)
+    sink = _ByteSink()
+    writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in chunks:
+            writer.write_batch(_record_batch(pa, schema, rows))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# Last item_id of a CSV export, dropping a line that was cut off by an interruption
+def _resume_csv(path: str) -> Optional[int]:
+    with open(path, "rb+") as file:
+        end = position = file.seek(0, os.SEEK_END)
+        tail = b""
+        # Read backwards until the last complete line is in the tail
+        while position > 0 and tail.count(b"\n") < 2:
+            step = min(64 * 1024, position)
+            position -= step
+            file.seek(position)
+            tail = file.read(step) + tail
+        complete = position + tail.rfind(b"\n") + 1
+        if complete != end:
+            file.truncate(complete)
+    lines = tail[:complete - position].splitlines()
+    if not lines or lines[-1].startswith(COLUMNS[0].encode()):
+        return None
+    return int(lines[-1].split(b",", 1)[0])
+
+
+# Last item_id found in the finished parquet files of an export directory
+def _resume_parquet(pa, out_dir: str) -> Optional[int]:
+    last_id = None
+    for name in os.listdir(out_dir):
+        if name.endswith(".parquet"):
+            ids = pa.parquet.read_table(os.path.join(out_dir, name), columns=["item_id"]).column("item_id")
+            file_last_id = pa.compute.max(ids).as_py()
+            if file_last_id is not None and (last_id is None or file_last_id > last_id):
+                last_id = file_last_id
+    return last_id
+
+
+"""
+Export a date range to a CSV file.
+
+Args:
+    db (Session): Database session.
+    start (date): First day (inclusive).
+    end (date): Last day (inclusive).
+    path (str): Output file.
+    status (OrderStatus, optional): Only orders with this status.
+    resume (bool): Continue an interrupted export of the same range in path.
+
+Returns:
+    int: Number of rows written.
+"""
+def export_csv(db: Session, start: date, end: date, path: str, status: Optional[OrderStatus] = None,
+               resume: bool = False) -> int:
+    after_id = None
+    append = False
+    if resume and os.path.exists(path):
+        after_id = _resume_csv(path)
+        append = os.path.getsize(path) > 0
+
+    written = 0
+    with open(path, "a" if append else "w", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        if not append:
+            writer.writerow(COLUMNS)
+        for rows in iter_chunks(db, start, end, after_id, status):
+            writer.writerows(_csv_values(row) for row in rows)
+            written += len(rows)
+        file.flush()
+        os.fsync(file.fileno())
+    return written
+
+
+"""
+Export a date range to a directory of parquet files.
+
+Each file holds up to rows_per_file rows and is named after its first item_id. A
+file is written under a .partial name and renamed once complete, so resuming only
+looks at complete files.
+
+Args:
+    db (Session): Database session.
+    start (date): First day (inclusive).
+    end (date): Last day (inclusive).
+    out_dir (str): Output directory.
+    status (OrderStatus, optional): Only orders with this status.
+    resume (bool): Continue an interrupted export of the same range in out_dir.
+    rows_per_file (int): Maximum rows per file.
+
+Returns:
+    int: Number of rows written.
+
+Raises:
+    ExportFormatUnavailable: If pyarrow is not installed.
+"""
+def export_parquet(db: Session, start: date, end: date, out_dir: str, status: Optional[OrderStatus] = None,
+                   resume: bool = False, rows_per_file: int = ROWS_PER_FILE) -> int:
+    pa = _pyarrow()
+    schema = _parquet_schema(pa)
+    os.makedirs(out_dir, exist_ok=True)
+    after_id = _resume_parquet(pa, out_dir) if resume else None
+
+    written = 0
+    writer = path = None
+    rows_in_file = 0
+    try:
+        for rows in iter_chunks(db, start, end, after_id, status):
+            if writer is None:
+                path = os.path.join(out_dir, f"part-{rows[0].item_id:012d}.parquet")
+                writer = pa.parquet.ParquetWriter(f"{path}.partial", schema, compression="zstd")
+            writer.write_batch(_record_batch(pa, schema, rows))
+            rows_in_file += len(rows)
+            written += len(rows)
+            if rows_in_file >= rows_per_file:
+                writer.close()
+                os.replace(f"{path}.partial", path)
+                writer, rows_in_file = None, 0
+    except Exception:
+        if writer is not None:
+            writer.close()
+        raise
+
+    if writer is not None:
+        writer.close()
+        os.replace(f"{path}.partial", path)
+    return written
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Export orders and order items of a date range")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="Last day (YYYY-MM-DD), inclusive")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--out", required=True, help="CSV file, or directory for parquet files")
+    parser.add_argument("--status", choices=[status.value for status in OrderStatus], help="Only orders with this status")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted export")
+    args = parser.parse_args()
+
+    status = OrderStatus(args.status) if args.status else None
+    db = SessionLocal()
+    try:
+        if args.format == "csv":
+            written = export_csv(db, args.start, args.end, args.out, status, args.resume)
+        else:
+            written = export_parquet(db, args.start, args.end, args.out, status, args.resume)
+        print(f"Exported {written} rows to {args.out}")
+    finally:
+        db.close()
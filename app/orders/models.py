@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer
+from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, ForeignKeyConstraint, Index, Integer
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -16,30 +16,56 @@ class OrderStatus(str,enum.Enum):
 
 
 # SQLAlchemy model for Orders table
+# Range partitioned by month on created_at (see app/orders/partitions.py), so the
+# partition key is part of the primary key
 class Orders(Base):
     __tablename__="orders"
 
-    id = Column(Integer,primary_key=True,index=True)
+    id = Column(Integer,primary_key=True,autoincrement=True,index=True)
     user_id = Column(Integer,ForeignKey("users.id"))
     total_amount = Column(Float, nullable=False)
     status = Column(Enum(OrderStatus,name="order_status"),nullable=False,default="pending")
-    created_at = Column(DateTime,default=datetime.utcnow)
+    created_at = Column(DateTime,primary_key=True,nullable=False,default=datetime.utcnow)
 
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
 
+    # Covers the order history query (filter, sort order and selected columns) for index-only scans
+    __table_args__ = (
+        Index(
+            "ix_orders_user_id_created_at",
+            user_id, created_at.desc(), id.desc(),
+            postgresql_include=["total_amount", "status"],
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
 
 # SQLAlchemy model for OrderItem table
+# Partitioned like orders on the creation time of its order, so an order and its
+# items always live in partitions of the same month
 class OrderItem(Base):
     __tablename__ = "order_items"
 
-    id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    order_id = Column(Integer)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, nullable=False)
     price_at_purchase = Column(Float, nullable=False)
+    # Discount of the line and the promotion it came from, kept without a foreign key
+    # so the order history survives deleting the promotion
+    discount_amount = Column(Float, nullable=False, default=0, server_default="0")
+    promotion_id = Column(Integer)
+    created_at = Column(DateTime, primary_key=True, nullable=False)
 
     order = relationship("Orders", back_populates="items")
     product = relationship("Products")
-        
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["order_id", "created_at"], ["orders.id", "orders.created_at"], name="order_items_order_fkey"
+        ),
+        Index("ix_order_items_order_id_created_at", "order_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
@@ -0,0 +1,138 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session, joinedload
+
+from app.orders import models
+
+
+# Raised when a pagination cursor cannot be decoded
+class InvalidCursor(ValueError):
+    pass
+
+
+"""
+Encode the position of an order in the history as an opaque cursor
+
+Args:
+    created_at (datetime): Creation time of the last returned order.
+    order_id (int): ID of the last returned order.
+
+Returns:
+    str: URL safe cursor
+"""
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{order_id}".encode()).decode()
+
+
+"""
+Decode a cursor created by encode_cursor()
+
+Args:
+    cursor (str): Cursor sent by the client.
+
+Returns:
+    tuple: (created_at, order_id)
+
+Raises:
+    InvalidCursor: If the cursor is malformed.
+"""
+def decode_cursor(cursor: str):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+"""
+Retrieve one page of the order history of a user, newest first.
+
+Uses keyset pagination on (created_at DESC, id DESC) and selects only columns held
+in ix_orders_user_id_created_at, so each page is an index-only range scan no
+matter how deep the client pages.
+
+Args:
+    db (Session): Database session.
+    user_id (int): ID of the user.
+    limit (int): Maximum number of orders to return.
+    cursor (str, optional): Cursor returned with the previous page.
+    start_date (datetime, optional): Only orders created at or after this time.
+    end_date (datetime, optional): Only orders created before this time.
+    status (OrderStatus, optional): Only orders with this status.
+
+Returns:
+    tuple: (orders, next_cursor), next_cursor is None on the last page.
+"""
+def get_order_history(db: Session, user_id: int, limit: int, cursor: Optional[str] = None,
+                      start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                      status: Optional[models.OrderStatus] = None):
+    query = order_history_query(user_id, limit, cursor, start_date, end_date, status)
+    return order_history_page(db.execute(query).all(), limit)
+
+
+# Shared with orders_crud_async. Fetches one extra row to know whether another page exists
+def order_history_query(user_id: int, limit: int, cursor: Optional[str] = None,
+                        start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                        status: Optional[models.OrderStatus] = None):
+    query = select(
+        models.Orders.id,
+        models.Orders.created_at,
+        models.Orders.total_amount,
+        models.Orders.status,
+    ).where(models.Orders.user_id == user_id)
+
+    if start_date is not None:
+        query = query.where(models.Orders.created_at >= start_date)
+
+    if end_date is not None:
+        query = query.where(models.Orders.created_at < end_date)
+
+    if status is not None:
+        query = query.where(models.Orders.status == status)
+
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        query = query.where(tuple_(models.Orders.created_at, models.Orders.id) < tuple_(created_at, order_id))
+
+    return query.order_by(models.Orders.created_at.desc(), models.Orders.id.desc()).limit(limit + 1)
+
+
+# Split the rows of order_history_query into the page and the cursor of the next one
+def order_history_page(orders, limit: int):
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id)
+    return orders, next_cursor
+
+
+"""
+Retrieve an order of a user together with its items, in one statement.
+
+Args:
+    db (Session): Database session.
+    user_id (int): ID of the user.
+    order_id (int): ID of the order.
+    created_at (datetime, optional): Creation time of the order, the partition key.
+
+Returns:
+    Orders | None: The order with its items loaded, or None if not found.
+"""
+def get_order_detail(db: Session, user_id: int, order_id: int, created_at: Optional[datetime] = None):
+    return db.execute(order_detail_query(user_id, order_id, created_at)).unique().scalars().first()
+
+
+# Shared with orders_crud_async. Without created_at every monthly partition is probed for the ID,
+# with it postgres reads the one partition of the order and of its items
+def order_detail_query(user_id: int, order_id: int, created_at: Optional[datetime] = None):
+    query = select(models.Orders).options(joinedload(models.Orders.items)).where(
+        models.Orders.id == order_id,
+        models.Orders.user_id == user_id,
+    )
+    if created_at is not None:
+        query = query.where(models.Orders.created_at == created_at)
+    return query
@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.orders import models
+from app.orders import orders_crud as crud
+
+# Async versions of the order queries for the async routes, the statements of orders_crud through an AsyncSession
+
+
+"""
+Retrieve one page of the order history of a user, newest first.
+
+See orders_crud.get_order_history, the keyset pagination and the index-only
+scan work the same way.
+
+Args:
+    db (AsyncSession): Async database session.
+    user_id (int): ID of the user.
+    limit (int): Maximum number of orders to return.
+    cursor (str, optional): Cursor returned with the previous page.
+    start_date (datetime, optional): Only orders created at or after this time.
+    end_date (datetime, optional): Only orders created before this time.
+    status (OrderStatus, optional): Only orders with this status.
+
+Returns:
+    tuple: (orders, next_cursor), next_cursor is None on the last page.
+"""
+async def get_order_history(db: AsyncSession, user_id: int, limit: int, cursor: Optional[str] = None,
+                            start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                            status: Optional[models.OrderStatus] = None):
+    query = crud.order_history_query(user_id, limit, cursor, start_date, end_date, status)
+    return crud.order_history_page((await db.execute(query)).all(), limit)
+
+
+"""
+Retrieve an order of a user together with its items, in one statement.
+
+Args:
+    db (AsyncSession): Async database session.
+    user_id (int): ID of the user.
+    order_id (int): ID of the order.
+    created_at (datetime, optional): Creation time of the order, the partition key.
+
+Returns:
+    Orders | None: The order with its items loaded, or None if not found.
+"""
+async def get_order_detail(db: AsyncSession, user_id: int, order_id: int, created_at: Optional[datetime] = None):
+    result = await db.execute(crud.order_detail_query(user_id, order_id, created_at))
+    return result.unique().scalars().first()
@@ -0,0 +1,190 @@
+"""
+Maintenance of the monthly partitions of orders and order_items
+
+Both tables are range partitioned on created_at, one partition per month named
+<table>_pYYYY_MM, plus a DEFAULT partition for rows outside every month.
+
+create   adds the partitions of the current month and the next months. It also
+         runs on application startup, so rows normally never reach the DEFAULT
+         partition.
+archive  exports every partition older than the given number of months to a gzip
+         compressed CSV file, then detaches and drops it. Order items are handled
+         before their orders because of the foreign key. The sales rollups are
+         not touched, so analytics still covers the archived months.
+
+Usage:
+    python -m app.orders.partitions create --months-ahead 3
+    python -m app.orders.partitions archive --older-than 12 --out-dir archive
+"""
+import argparse
+import gzip
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+# order_items references orders, so its partitions are dropped first
+PARTITIONED_TABLES = ("order_items", "orders")
+
+PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+# Creating or detaching a partition locks the parent table, give up instead of queueing behind long transactions
+LOCK_TIMEOUT = "5s"
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+"""
+Function to list the monthly partitions of a partitioned table
+
+Args:
+    db (Session): Database session.
+    table (str): "orders" or "order_items".
+
+Returns:
+    list: (month, partition_name) tuples, oldest first. The DEFAULT partition is left out.
+"""
+def list_partitions(db: Session, table: str):
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {"table": table}).scalars().all()
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.search(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+"""
+Function to create the partitions of the current month and the following ones
+
+Partitions that already exist are skipped, so this is cheap to run on every startup.
+
+Args:
+    db (Session): Database session.
+    months_ahead (int): Number of months after the current one to create.
+    months_back (int): Number of months before the current one to create, for loading
+        older orders. Fails if the DEFAULT partition already holds rows of those months.
+
+Returns:
+    list: Names of the partitions that were created.
+"""
+def create_partitions(db: Session, months_ahead: int, months_back: int = 0):
+    current = date.today().replace(day=1)
+    created = []
+    try:
+        db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        for offset in range(-months_back, months_ahead + 1):
+            month = add_months(current, offset)
+            # orders first, the order_items partition is only useful next to it
+            for table in reversed(PARTITIONED_TABLES):
+                name = partition_name(table, month)
+                if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+                    continue
+                db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+                ))
+                created.append(name)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for name in created:
+        logger.info(f"Created partition {name}")
+    return created
+
+
+def _export(db: Session, name: str, out_dir: str) -> str:
+    path = os.path.join(out_dir, f"{name}.csv.gz")
+    partial = f"{path}.partial"
+    cursor = db.connection().connection.cursor()
+    with gzip.open(partial, "wb") as file:
+        cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", file)
+    # The partition is dropped right after, make sure the export is on disk first
+    with open(partial, "rb") as file:
+        os.fsync(file.fileno())
+    os.replace(partial, path)
+    return path
+
+
+"""
+Function to archive the partitions older than a number of months
+
+Each month is exported, detached and dropped in its own transaction. A failure
+leaves the month in place; an export file is only ever written before its
+partition is dropped.
+
+Args:
+    db (Session): Database session.
+    older_than (int): Months before the current one that are kept.
+    out_dir (str): Directory for the <partition>.csv.gz files.
+
+Returns:
+    list: Paths of the written archive files.
+"""
+def archive_partitions(db: Session, older_than: int, out_dir: str):
+    cutoff = add_months(date.today().replace(day=1), -older_than)
+    months = sorted({month for month, _ in list_partitions(db, "orders") if month < cutoff})
+    db.rollback()
+    os.makedirs(out_dir, exist_ok=True)
+
+    archived = []
+    for month in months:
+        try:
+            db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+            for table in PARTITIONED_TABLES:
+                name = partition_name(table, month)
+                archived.append(_export(db, name, out_dir))
+                db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info(f"Archived orders of {month:%Y-%m}")
+    return archived
+
+
+if __name__ == "__main__":
+    # The auth models must be loaded first, they import the cart and order models
+    from app.auth.models import User
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain the monthly order partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create_command = commands.add_parser("create", help="Create the partitions of the coming months")
+    create_command.add_argument("--months-ahead", type=int, default=3, help="Months after the current one")
+    archive_command = commands.add_parser("archive", help="Export and drop old partitions")
+    archive_command.add_argument("--older-than", type=int, default=12, help="Months to keep besides the current one")
+    archive_command.add_argument("--out-dir", default="archive", help="Directory for the compressed exports")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "create":
+            created = create_partitions(db, args.months_ahead)
+            print(f"Created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+        else:
+            for path in archive_partitions(db, args.older_than, args.out_dir):
+                print(f"Wrote {path}")
+    finally:
+        db.close()
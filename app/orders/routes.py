@@ -1,9 +1,15 @@
-from fastapi import Depends, APIRouter, HTTPException
-from sqlalchemy.orm import Session,joinedload
+from datetime import date, datetime
+from typing import Optional
 
-from app.core.database import get_db
-from app.auth.dependency import allow_only_user
-from app.orders import models as order_models, schemas as order_schemas
+from fastapi import Depends, APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.replicas import get_read_db
+from app.auth.dependency import allow_only_admin, allow_only_user
+from app.orders import models as order_models, schemas as order_schemas, orders_crud as crud, export
+from app.orders.cache import get_order_detail_cache
 
 import logging
 
@@ -13,28 +19,57 @@ logger = logging.getLogger(__name__)
 # Create an API Router for Orders and Order History
 order_router = APIRouter(prefix="/orders", tags=["Orders and Orders History"])
 
+# Create an API Router for the admin order export
+admin_order_router = APIRouter(prefix="/admin/orders", tags=["Admin Orders Export"])
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
 
 """
-Get the order history for the authenticated user.
+Get the order history for the authenticated user, newest first.
+
+The history is paginated with a cursor: when more orders exist, the response
+carries an X-Next-Cursor header to pass as `cursor` for the next page.
 
 Args:
+    response (Response): Response used to set the X-Next-Cursor header.
+    cursor (str, optional): Cursor returned with the previous page.
+    limit (int): Maximum number of orders per page.
+    start_date (datetime, optional): Only orders created at or after this time.
+    end_date (datetime, optional): Only orders created before this time.
+    status (OrderStatus, optional): Only orders with this status.
     db (Session): Database session.
     user (User): Authenticated user with role 'user'.
 
 Returns:
-    A list of past orders placed by the user.
+    A page of past orders placed by the user.
 """
 @order_router.get("/", response_model=list[order_schemas.OrderHistory])
-def get_order_history(db: Session = Depends(get_db), user=Depends(allow_only_user)):
+def get_order_history(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    status: Optional[order_models.OrderStatus] = Query(None),
+    db: Session = Depends(get_read_db),
+    user=Depends(allow_only_user),
+):
     try:
         if user.role != "user":
             logger.warning(f"Access denied to order history for user {user.id} with role {user.role}")
             raise HTTPException(status_code=403, detail="Access denied")
 
-        orders = db.query(order_models.Orders).filter(order_models.Orders.user_id == user.id).all()
-        logger.info(f"Order history retrieved for user {user.id} with {len(orders)} orders")
+        orders, next_cursor = crud.get_order_history(db, user.id, limit, cursor, start_date, end_date, status)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        logger.info("Order history retrieved for user %s with %s orders", user.id, len(orders))
         return orders
     
+    except crud.InvalidCursor:
+        logger.warning(f"Invalid order history cursor from user {user.id}")
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
     except HTTPException as http_exception:
         raise http_exception
@@ -47,8 +82,14 @@ def get_order_history(db: Session = Depends(get_db), user=Depends(allow_only_use
 """
 Get the details of a specific order placed by the user.
 
+The order and its items are loaded in one statement, from the partitions of the
+month of the order when created_at is given. Paid orders never change,
+so their serialized JSON is cached and served without touching the database.
+
 Args:
     order_id (int): ID of the order to retrieve.
+    created_at (datetime, optional): Creation time of the order, as returned by
+        checkout and the order history. Only its monthly partition is read.
     db (Session): Database session.
     user (User): Authenticated user with role 'user'.
 
@@ -59,19 +100,26 @@ Raises:
     HTTPException: If the order is not found or internal error occurs.
 """
 @order_router.get("/{order_id}", response_model=order_schemas.OrderDetail)
-def get_order_detail(order_id: int, db: Session = Depends(get_db), user=Depends(allow_only_user)):
+def get_order_detail(order_id: int, created_at: Optional[datetime] = Query(None),
+                     db: Session = Depends(get_read_db), user=Depends(allow_only_user)):
     try:
-        order = db.query(order_models.Orders).filter(
-            order_models.Orders.id == order_id,
-            order_models.Orders.user_id == user.id
-        ).first()
+        cached = get_order_detail_cache().get((user.id, order_id))
+        if cached is not None:
+            logger.info("Order %s details served from cache for user %s", order_id, user.id)
+            return Response(content=cached, media_type="application/json")
+
+        order = crud.get_order_detail(db, user.id, order_id, created_at)
 
         if not order:
             logger.warning(f"Order {order_id} not found for user {user.id}")
             raise HTTPException(status_code=404, detail="Order not found")
 
-        logger.info(f"Order {order_id} details retrieved for user {user.id}")
-        return order
+        body = order_schemas.OrderDetail.model_validate(order, from_attributes=True).model_dump_json().encode()
+        if order.status == order_models.OrderStatus.paid:
+            get_order_detail_cache().put((user.id, order_id), body)
+
+        logger.info("Order %s details retrieved for user %s", order_id, user.id)
+        return Response(content=body, media_type="application/json")
 
     
     except HTTPException as http_exception:
@@ -80,3 +128,72 @@ def get_order_detail(order_id: int, db: Session = Depends(get_db), user=Depends(
     except Exception as e:
         logger.error(f"Error retrieving order {order_id} for user {user.id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve order details")
+
+
+# The response is streamed after the request dependencies are closed, so the export uses its own session
+def _export_stream(start, end, format, status, after_id):
+    db = SessionLocal()
+    try:
+        chunks = export.iter_chunks(db, start, end, after_id, status)
+        if format == "parquet":
+            yield from export.parquet_stream(chunks)
+        else:
+            yield from export.csv_stream(chunks)
+        logger.info("Exported orders from %s to %s as %s", start, end, format)
+    except Exception as e:
+        logger.error(f"Order export from {start} to {end} failed: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
+"""
+Export the orders of a date range with their items (Admin only).
+
+The file is streamed while it is read from the database in chunks, one row per
+order item ordered by item_id. If a download is interrupted, request the rest with
+after_id set to the last item_id received.
+
+Args:
+    start (date): First day (inclusive).
+    end (date): Last day (inclusive).
+    format (str): "csv" or "parquet".
+    status (OrderStatus, optional): Only orders with this status.
+    after_id (int, optional): Only items with a greater ID.
+    admin: Admin user info.
+
+Returns:
+    StreamingResponse: The export file.
+"""
+@admin_order_router.get("/export")
+def export_orders(
+    start: date = Query(...),
+    end: date = Query(...),
+    format: str = Query("csv", regex="^(csv|parquet)$"),
+    status: Optional[order_models.OrderStatus] = Query(None),
+    after_id: Optional[int] = Query(None, ge=0),
+    admin: dict = Depends(allow_only_admin),
+):
+    try:
+        if start > end:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        if format == "parquet":
+            export.parquet_available()
+
+        filename = f"orders_{start}_{end}.{format}"
+        return StreamingResponse(
+            _export_stream(start, end, format, status, after_id),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    except export.ExportFormatUnavailable as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Order export failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to export orders")
@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Depends, APIRouter, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.replicas import get_async_read_db
+from app.auth.dependency import allow_only_user_async
+from app.orders import models as order_models, schemas as order_schemas, orders_crud_async as crud
+from app.orders.cache import get_order_detail_cache
+from app.orders.orders_crud import InvalidCursor
+
+import logging
+
+# Async versions of the order routes, served on the event loop when db_mode is "async".
+# The admin export streams from a server-side cursor and stays in app/orders/routes.py
+
+# Create a logger instance for the current module
+logger = logging.getLogger(__name__)
+
+# Create an API Router for Orders and Order History
+order_router = APIRouter(prefix="/orders", tags=["Orders and Orders History"])
+
+
+"""
+Get the order history for the authenticated user, newest first.
+
+The history is paginated with a cursor: when more orders exist, the response
+carries an X-Next-Cursor header to pass as `cursor` for the next page.
+
+Args:
+    response (Response): Response used to set the X-Next-Cursor header.
+    cursor (str, optional): Cursor returned with the previous page.
+    limit (int): Maximum number of orders per page.
+    start_date (datetime, optional): Only orders created at or after this time.
+    end_date (datetime, optional): Only orders created before this time.
+    status (OrderStatus, optional): Only orders with this status.
+    db (AsyncSession): Async database session.
+    user (User): Authenticated user with role 'user'.
+
+Returns:
+    A page of past orders placed by the user.
+"""
+@order_router.get("/", response_model=list[order_schemas.OrderHistory])
+async def get_order_history(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    status: Optional[order_models.OrderStatus] = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(allow_only_user_async),
+):
+    try:
+        orders, next_cursor = await crud.get_order_history(db, user.id, limit, cursor, start_date, end_date, status)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        logger.info("Order history retrieved for user %s with %s orders", user.id, len(orders))
+        return orders
+
+    except InvalidCursor:
+        logger.warning(f"Invalid order history cursor from user {user.id}")
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Error retrieving order history for user {user.id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve order history")
+
+
+"""
+Get the details of a specific order placed by the user.
+
+Paid orders are served from the same cache as the sync route.
+
+Args:
+    order_id (int): ID of the order to retrieve.
+    created_at (datetime, optional): Creation time of the order, as returned by
+        checkout and the order history. Only its monthly partition is read.
+    db (AsyncSession): Async database session.
+    user (User): Authenticated user with role 'user'.
+
+Returns:
+    OrderDetail: Detailed information about the order including items.
+
+Raises:
+    HTTPException: If the order is not found or internal error occurs.
+"""
+@order_router.get("/{order_id}", response_model=order_schemas.OrderDetail)
+async def get_order_detail(order_id: int, created_at: Optional[datetime] = Query(None),
+                           db: AsyncSession = Depends(get_async_read_db), user=Depends(allow_only_user_async)):
+    try:
+        cached = get_order_detail_cache().get((user.id, order_id))
+        if cached is not None:
+            logger.info("Order %s details served from cache for user %s", order_id, user.id)
+            return Response(content=cached, media_type="application/json")
+
+        order = await crud.get_order_detail(db, user.id, order_id, created_at)
+        if not order:
+            logger.warning(f"Order {order_id} not found for user {user.id}")
+            raise HTTPException(status_code=404, detail="Order not found")
+
+        body = order_schemas.OrderDetail.model_validate(order, from_attributes=True).model_dump_json().encode()
+        if order.status == order_models.OrderStatus.paid:
+            get_order_detail_cache().put((user.id, order_id), body)
+
+        logger.info("Order %s details retrieved for user %s", order_id, user.id)
+        return Response(content=body, media_type="application/json")
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Error retrieving order {order_id} for user {user.id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve order details")
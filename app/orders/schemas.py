@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -7,6 +7,8 @@ class OrderItem(BaseModel):
     product_id: int
     quantity: int
     price_at_purchase :float
+    discount_amount: float = 0
+    promotion_id: Optional[int] = None
 
     class Config:
         orm_mode = True
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+
+"""
+Circuit breaker guarding calls to an external service.
+
+After `failure_threshold` consecutive failures the circuit opens and calls are
+rejected without reaching the service. Once `reset_timeout` seconds have passed a
+single trial call is let through (half open): success closes the circuit again,
+failure re-opens it for another `reset_timeout`.
+"""
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit {self.name} closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logger.warning(f"Circuit {self.name} opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
@@ -0,0 +1,76 @@
+import asyncio
+from functools import lru_cache
+from typing import List
+
+from app.core import tracing
+from app.core.config import settings
+from app.payments.circuit_breaker import CircuitBreaker
+from app.payments.providers import HttpPaymentProvider, PaymentProvider, PaymentResult, StubPaymentProvider
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+
+"""
+Payment step of checkout.
+
+Wraps a PaymentProvider with a timeout and a circuit breaker. It never touches
+the database: checkout commits the reserved order before calling it and opens a
+new transaction only to finalize, so no pooled connection is held while waiting
+on the provider.
+"""
+class PaymentGateway:
+    def __init__(self, provider: PaymentProvider, timeout: float, breaker: CircuitBreaker):
+        self.provider = provider
+        self.timeout = timeout
+        self.breaker = breaker
+
+    async def charge(self, order_id: int, user_id: int, amount: float) -> PaymentResult:
+        with tracing.span("payment.charge", tracing.CLIENT, {"order.id": order_id}) as span:
+            result = await self._charge(order_id, user_id, amount)
+            if span is not None:
+                span.set("payment.success", result.success)
+                if not result.success:
+                    span.error = result.error
+            return result
+
+    async def _charge(self, order_id: int, user_id: int, amount: float) -> PaymentResult:
+        if not self.breaker.allow():
+            logger.warning(f"Payment of order {order_id} rejected, circuit {self.breaker.name} is open")
+            return PaymentResult(success=False, error="Payment provider unavailable")
+
+        try:
+            result = await asyncio.wait_for(self.provider.charge(order_id, user_id, amount), self.timeout)
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            logger.error(f"Payment of order {order_id} timed out after {self.timeout}s")
+            return PaymentResult(success=False, error="Payment provider timed out")
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.error(f"Payment of order {order_id} failed: {e}")
+            return PaymentResult(success=False, error="Payment provider error")
+
+        # A declined card still means the provider is healthy
+        self.breaker.record_success()
+        return result
+
+    async def charge_many(self, orders) -> List[PaymentResult]:
+        return await asyncio.gather(*(self.charge(order.order_id, order.user_id, order.total) for order in orders))
+
+
+def _build_provider() -> PaymentProvider:
+    if settings.payment_provider == "http":
+        return HttpPaymentProvider(settings.payment_api_url, settings.payment_api_key, settings.payment_timeout_seconds)
+    return StubPaymentProvider(latency=settings.payment_stub_latency_ms / 1000)
+
+
+# Gateway of the configured provider, created on first use
+@lru_cache(maxsize=None)
+def get_payment_gateway() -> PaymentGateway:
+    return PaymentGateway(
+        provider=_build_provider(),
+        timeout=settings.payment_timeout_seconds,
+        breaker=CircuitBreaker("payments", settings.payment_breaker_failures, settings.payment_breaker_reset_seconds),
+    )
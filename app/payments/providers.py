@@ -0,0 +1,86 @@
+import asyncio
+import weakref
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+
+from app.core import tracing
+
+
+# Outcome of a charge
+class PaymentResult(NamedTuple):
+    success: bool
+    reference: Optional[str] = None
+    error: Optional[str] = None
+
+
+# Interface every payment provider implements
+class PaymentProvider(ABC):
+
+    """
+    Charge the amount of an order.
+
+    Args:
+        order_id (int): ID of the order, also used as the provider side idempotency key.
+        user_id (int): ID of the paying user.
+        amount (float): Amount to charge.
+
+    Returns:
+        PaymentResult: success flag with the provider reference or the decline reason.
+    """
+    @abstractmethod
+    async def charge(self, order_id: int, user_id: int, amount: float) -> PaymentResult:
+        ...
+
+
+# Local provider approving every charge, optionally after a simulated network delay
+class StubPaymentProvider(PaymentProvider):
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def charge(self, order_id: int, user_id: int, amount: float) -> PaymentResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return PaymentResult(success=True, reference=f"stub-{order_id}")
+
+
+"""
+Provider talking to a JSON payment API over HTTP.
+
+POSTs {order_id, user_id, amount} to <base_url>/charges with the order id as
+Idempotency-Key, so a charge retried after a timeout is not taken twice. One
+AsyncClient (and its connection pool) is kept per event loop because the request
+threads and the order workers run on different loops.
+"""
+class HttpPaymentProvider(PaymentProvider):
+    def __init__(self, base_url: str, api_key: str, timeout: float):
+        import httpx
+
+        self._httpx = httpx
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+        return client
+
+    async def charge(self, order_id: int, user_id: int, amount: float) -> PaymentResult:
+        response = await self._client().post(
+            "/charges",
+            json={"order_id": order_id, "user_id": user_id, "amount": amount},
+            # The trace of the checkout continues at the provider if it reads traceparent
+            headers={"Idempotency-Key": f"order-{order_id}", **tracing.inject()},
+        )
+        # 4xx is a decline, anything else unexpected is a provider failure
+        if 400 <= response.status_code < 500:
+            return PaymentResult(success=False, error=response.json().get("detail", "Payment declined"))
+        response.raise_for_status()
+        return PaymentResult(success=True, reference=response.json().get("id"))
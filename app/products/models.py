@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer,Float
+from sqlalchemy import Column, String, Integer,Float, Index
 
 from app.core.database import Base
 
@@ -12,4 +12,12 @@ class Products(Base):
     price = Column(Float, nullable=False)
     stock = Column(Integer, nullable=False)
     category = Column(String)
-    image_url = Column(String)
\ No newline at end of file
+    image_url = Column(String)
+    # Units sold with forward decay, see app/products/popularity.py
+    popularity = Column(Float, nullable=False, default=0, server_default="0")
+
+    # Serve sort_by=popularity with and without a category filter from an index
+    __table_args__ = (
+        Index("ix_products_popularity", popularity.desc(), id),
+        Index("ix_products_category_popularity", category, popularity.desc(), id),
+    )
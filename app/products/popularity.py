@@ -0,0 +1,109 @@
+"""
+Popularity score of products: units sold, decayed exponentially with age
+
+Forward decay: a sale at time t adds quantity * 2 ** ((t - EPOCH) / half_life)
+to the score instead of shrinking every score as time passes. Newer sales weigh
+more, and the ranking equals the one of a score where each sale halves every
+half_life, while checkout only ever adds to a single column.
+
+rebuild recomputes every score from the order history, e.g. after changing
+popularity_half_life_days or moving EPOCH forward (scores grow by 2 every half
+life and would overflow after about 20 years with a 7 day half life).
+
+Usage:
+    python -m app.products.popularity
+"""
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import bindparam, text, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import without_statement_timeout
+from app.products.models import Products
+
+EPOCH = datetime(2026, 1, 1)
+
+RESET_SQL = "UPDATE products SET popularity = 0 WHERE popularity <> 0"
+
+REBUILD_SQL = """
+    UPDATE products SET popularity = sales.score
+    FROM (
+        SELECT i.product_id,
+               SUM(i.quantity * power(2, extract(epoch FROM o.created_at - :epoch) / :half_life_seconds)) AS score
+        FROM order_items i
+        JOIN orders o ON o.id = i.order_id AND o.created_at = i.created_at
+        WHERE o.status = 'paid'
+        GROUP BY i.product_id
+    ) AS sales
+    WHERE products.id = sales.product_id
+"""
+
+
+def weight(at: datetime) -> float:
+    return 2 ** ((at - EPOCH).total_seconds() / (settings.popularity_half_life_days * 86400))
+
+
+"""
+Add the units of newly paid orders to the popularity of their products.
+
+Runs inside the caller's transaction. Products are updated in ID order so that
+concurrent checkouts lock them in the same order.
+
+Args:
+    db (Session): Database session.
+    orders (list): Paid orders, each with created_at and lines (product_id, quantity).
+
+Returns:
+    None
+"""
+def record_orders(db: Session, orders):
+    scores = defaultdict(float)
+    for order in orders:
+        order_weight = weight(order.created_at)
+        for line in order.lines:
+            scores[line.product_id] += line.quantity * order_weight
+    if not scores:
+        return
+
+    db.connection().execute(
+        update(Products.__table__)
+        .where(Products.__table__.c.id == bindparam("product_id"))
+        .values(popularity=Products.__table__.c.popularity + bindparam("score")),
+        [{"product_id": product_id, "score": score} for product_id, score in sorted(scores.items())],
+    )
+
+
+"""
+Recompute the popularity of every product from the paid orders.
+
+Args:
+    db (Session): Database session.
+
+Returns:
+    None
+"""
+def rebuild(db: Session):
+    without_statement_timeout(db)
+    db.execute(text(RESET_SQL))
+    db.execute(text(REBUILD_SQL), {
+        "epoch": EPOCH,
+        "half_life_seconds": settings.popularity_half_life_days * 86400,
+    })
+    db.commit()
+
+
+if __name__ == "__main__":
+    # The auth models must be loaded first, they import the cart and order models
+    from app.auth.models import User
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        rebuild(db)
+        print(f"Rebuilt product popularity in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
@@ -1,5 +1,5 @@
 from fastapi import Depends
-from sqlalchemy import or_
+from sqlalchemy import func, or_, select
 from sqlalchemy.orm import Session
 from app.products import models, schemas
 
@@ -30,9 +30,15 @@ Returns:
     List of all the products
 """
 def get_all_products(db: Session):
-    all_products =  db.query(models.Products).all()
+    all_products = db.execute(all_products_query()).scalars().all()
     return all_products
 
+
+# The statements below are shared with products_crud_async
+def all_products_query():
+    return select(models.Products)
+
+
 """
 Retrieve a product by its ID 
 
@@ -44,10 +50,14 @@ Returns:
     Products | None: Product if found, otherwise None.
 """
 def get_product_by_id(db: Session, product_id: int):
-    search_product = db.query(models.Products).filter(models.Products.id == product_id).first()
+    search_product = db.execute(product_by_id_query(product_id)).scalar_one_or_none()
     return  search_product
 
 
+def product_by_id_query(product_id: int):
+    return select(models.Products).where(models.Products.id == product_id)
+
+
 """
 Update the details of an existing product.
 
@@ -60,7 +70,7 @@ Returns:
     Products | None: The updated product instance, or None if not found.
 """
 def update_product_details(db: Session, product_id: int, product: schemas.ProductUpdate):
-    product_in_db = db.query(models.Products).filter(models.Products.id == product_id).first()
+    product_in_db = get_product_by_id(db, product_id)
     if product_in_db:
         for key, value in product.dict().items():
             setattr(product_in_db, key, value)
@@ -80,7 +90,7 @@ Return:
     Products | None: The deleted product instance, or None if not found.
 """
 def delete_product(db: Session, product_id: int):
-    product_in_db = db.query(models.Products).filter(models.Products.id == product_id).first()
+    product_in_db = get_product_by_id(db, product_id)
     if product_in_db:
         db.delete(product_in_db)
         db.commit()
@@ -95,7 +105,7 @@ Args:
     category (str, optional): Filter by product category.
     min_price (float, optional): Minimum price filter.
     max_price (float, optional): Maximum price filter.
-    sort_by (str, optional): Sort products by 'price_asc' or 'price_desc'.
+    sort_by (str, optional): Sort products by 'price_asc', 'price_desc' or 'popularity' (best sellers first).
     page (int, optional): Page number for pagination. Defaults to 1.
     page_size (int, optional): Number of products per page. Defaults to 10.
 
@@ -104,27 +114,39 @@ Returns:
 """
 def get_products(db: Session, category: str = None, min_price: float = None, max_price: float = None,
                  sort_by: str = None, page: int = 1, page_size: int = 10):
-    query = db.query(models.Products)
+    count_query, page_query = products_page_query(category, min_price, max_price, sort_by, page, page_size)
+    total = db.execute(count_query).scalar_one()
+    items = db.execute(page_query).scalars().all()
+
+    return {"total": total, "items": items}
+
+
+# Count of the matching products and the requested page of them
+def products_page_query(category: str = None, min_price: float = None, max_price: float = None,
+                        sort_by: str = None, page: int = 1, page_size: int = 10):
+    query = select(models.Products)
 
     if category:
-        query = query.filter(models.Products.category == category)
+        query = query.where(models.Products.category == category)
 
     if min_price is not None:
-        query = query.filter(models.Products.price >= min_price)
+        query = query.where(models.Products.price >= min_price)
 
     if max_price is not None:
-        query = query.filter(models.Products.price <= max_price)
+        query = query.where(models.Products.price <= max_price)
+
+    count_query = select(func.count()).select_from(query.subquery())
 
     if sort_by == "price_asc":
         query = query.order_by(models.Products.price.asc())
-        
+
     elif sort_by == "price_desc":
         query = query.order_by(models.Products.price.desc())
 
-    total = query.count()
-    items = query.offset((page - 1) * page_size).limit(page_size).all()
+    elif sort_by == "popularity":
+        query = query.order_by(models.Products.popularity.desc(), models.Products.id)
 
-    return {"total": total, "items": items}
+    return count_query, query.offset((page - 1) * page_size).limit(page_size)
 
 
 """
@@ -138,11 +160,14 @@ Returns:
     list[Products]: List of matching products.
 """
 def search_products(db: Session, keyword: str):
-    return db.query(models.Products).filter(
+    return db.execute(search_products_query(keyword)).scalars().all()
+
+
+def search_products_query(keyword: str):
+    return select(models.Products).where(
         or_(
             models.Products.name.ilike(f"%{keyword}%"),
             models.Products.description.ilike(f"%{keyword}%"),
             models.Products.category.ilike(f"%{keyword}%")
         )
-    ).all()
-
+    )
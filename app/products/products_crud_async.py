@@ -0,0 +1,124 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.products import models, schemas
+from app.products import products_crud as crud
+
+# Async versions of products_crud for the async routes, the statements of products_crud through an AsyncSession
+
+"""
+Create a new product and store it in the database.
+
+Args:
+    db (AsyncSession): Async database session.
+    product (ProductCreate): Product creation schema with name, price, etc.
+
+Returns:
+    Products: The newly created product instance.
+"""
+async def create_product(db: AsyncSession, product: schemas.ProductCreate):
+    product_in_db = models.Products(**product.dict())
+    db.add(product_in_db)
+    await db.commit()
+    await db.refresh(product_in_db)
+    return product_in_db
+
+"""
+Retrieve all the product.
+
+Args:
+    db (AsyncSession): Async database session.
+
+Returns:
+    List of all the products
+"""
+async def get_all_products(db: AsyncSession):
+    return (await db.execute(crud.all_products_query())).scalars().all()
+
+"""
+Retrieve a product by its ID
+
+Args:
+    db (AsyncSession): Async database session.
+    product_id (int): Product ID.
+
+Returns:
+    Products | None: Product if found, otherwise None.
+"""
+async def get_product_by_id(db: AsyncSession, product_id: int):
+    return (await db.execute(crud.product_by_id_query(product_id))).scalar_one_or_none()
+
+
+"""
+Update the details of an existing product.
+
+Args:
+    db: Async database session.
+    product_id: ID of the product to update.
+    product : Fields to update.
+
+Returns:
+    Products | None: The updated product instance, or None if not found.
+"""
+async def update_product_details(db: AsyncSession, product_id: int, product: schemas.ProductUpdate):
+    product_in_db = await get_product_by_id(db, product_id)
+    if product_in_db:
+        for key, value in product.dict().items():
+            setattr(product_in_db, key, value)
+        await db.commit()
+        await db.refresh(product_in_db)
+    return product_in_db
+
+
+"""
+Delete a product from the database.
+
+Args:
+    db: Async database session.
+    product_id (int): ID of the product to delete.
+
+Return:
+    Products | None: The deleted product instance, or None if not found.
+"""
+async def delete_product(db: AsyncSession, product_id: int):
+    product_in_db = await get_product_by_id(db, product_id)
+    if product_in_db:
+        await db.delete(product_in_db)
+        await db.commit()
+    return product_in_db
+
+
+"""
+Retrieve products with optional filters and pagination.
+
+Args:
+    db (AsyncSession): Async database session.
+    category (str, optional): Filter by product category.
+    min_price (float, optional): Minimum price filter.
+    max_price (float, optional): Maximum price filter.
+    sort_by (str, optional): Sort products by 'price_asc', 'price_desc' or 'popularity' (best sellers first).
+    page (int, optional): Page number for pagination. Defaults to 1.
+    page_size (int, optional): Number of products per page. Defaults to 10.
+
+Returns:
+    dict: Dictionary containing total number of matching products and paginated items.
+"""
+async def get_products(db: AsyncSession, category: str = None, min_price: float = None, max_price: float = None,
+                       sort_by: str = None, page: int = 1, page_size: int = 10):
+    count_query, page_query = crud.products_page_query(category, min_price, max_price, sort_by, page, page_size)
+    total = (await db.execute(count_query)).scalar_one()
+    items = (await db.execute(page_query)).scalars().all()
+
+    return {"total": total, "items": items}
+
+
+"""
+Search products by keyword in name, description, or category.
+
+Args:
+    db (AsyncSession): Async database session.
+    keyword (str): Search keyword.
+
+Returns:
+    list[Products]: List of matching products.
+"""
+async def search_products(db: AsyncSession, keyword: str):
+    return (await db.execute(crud.search_products_query(keyword))).scalars().all()
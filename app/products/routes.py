@@ -5,7 +5,9 @@ import logging
 
 from app.auth.dependency import allow_only_admin
 from app.core.database import get_db
+from app.core.replicas import get_read_db
 from app.products import schemas, products_crud as crud
+from app.monitoring.metrics import search_queries
 
 # Create a logger instance for the current module
 logger = logging.getLogger(__name__)
@@ -29,7 +31,7 @@ def create(product: schemas.ProductCreate, db: Session = Depends(get_db), admin:
     
     try:
         created = crud.create_product(db, product)
-        logger.info(f"Product created: {created.name}")
+        logger.info("Product created: %s", created.name)
         return created
     except Exception as e:
         logger.error(f"Create failed: {str(e)}")
@@ -158,7 +160,7 @@ Args:
     category (str, optional): Filter by category.
     min_price (float, optional): Minimum price filter.
     max_price (float, optional): Maximum price filter.
-    sort_by (str, optional): Sort by price (asc/desc).
+    sort_by (str, optional): Sort by price (asc/desc) or popularity.
     page (int): Page number.
     page_size (int): Number of items per page.
 
@@ -167,11 +169,11 @@ Returns:
 """
 @public_product_router.get("/", response_model=List[schemas.ProductResponse])
 def list_products(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     category: Optional[str] = Query(None),
     min_price: Optional[float] = Query(None),
     max_price: Optional[float] = Query(None),
-    sort_by: Optional[str] = Query(None, regex="^(price_asc|price_desc)?$"),
+    sort_by: Optional[str] = Query(None, regex="^(price_asc|price_desc|popularity)?$"),
     page: int = 1,
     page_size: int = 10,
 ):
@@ -203,9 +205,10 @@ Returns:
     List[ProductResponse]: Matching products.
 """
 @public_product_router.get("/search", response_model=List[schemas.ProductResponse])
-def search_products(keyword: str, db: Session = Depends(get_db)):
+def search_products(keyword: str, db: Session = Depends(get_read_db)):
     try:
         results = crud.search_products(db, keyword)
+        search_queries.inc("found" if results else "empty")
 
         if results:
             logger.info("Product details found.")
@@ -233,14 +236,14 @@ Returns:
     ProductResponse: Product details.
 """
 @public_product_router.get("/{product_id}", response_model=schemas.ProductResponse)
-def get_product_detail(product_id: int, db: Session = Depends(get_db)):
+def get_product_detail(product_id: int, db: Session = Depends(get_read_db)):
     
     try:
         product = crud.get_product_by_id(db, product_id)
         if not product:
             logger.warning("Product not found in the database")
             raise HTTPException(status_code=404, detail="Product not found with this id")
-        logger.info(f"Product details found with product ID :{product_id}")
+        logger.info("Product details found with product ID :%s", product_id)
         return product
     
     except HTTPException as http_exception:   
@@ -0,0 +1,307 @@
+import threading
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.promotions import promotions_crud as crud
+from app.promotions.models import PromotionKind
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+
+# Cart line the promotions are evaluated on
+class CartLine(NamedTuple):
+    product_id: int
+    quantity: int
+    price: float
+    category: Optional[str]
+
+
+# Discount of one cart line, promotion_id is None when no promotion applies
+class LineDiscount(NamedTuple):
+    discount: float
+    promotion_id: Optional[int]
+
+
+def _window_open(promotion, now: datetime) -> bool:
+    return (promotion.starts_at is None or promotion.starts_at <= now) and \
+           (promotion.ends_at is None or promotion.ends_at > now)
+
+
+"""
+Active promotions compiled into arrays for evaluating whole carts at once.
+
+- category_percent: one slot per category holding the best percentage, looked up
+  through a category -> slot dict. A trailing zero slot serves unknown categories.
+- buy_x_get_y: rules sorted by product; the rules of every cart line are found by
+  binary search and evaluated together.
+- cart_threshold: thresholds sorted ascending with a running maximum of the
+  percentage, so the best reachable rule is one binary search away.
+
+Each line gets the single best discount among the rules that apply to it,
+promotions do not stack. The cart threshold is checked against the subtotal
+before discounts.
+"""
+class CompiledPromotions:
+    def __init__(self, promotions, now: datetime):
+        live = [promotion for promotion in promotions if _window_open(promotion, now)]
+
+        # Best percentage per category
+        best_by_category = {}
+        for promotion in live:
+            if promotion.kind == PromotionKind.category_percent:
+                best = best_by_category.get(promotion.category)
+                if best is None or promotion.percent_off > best[0]:
+                    best_by_category[promotion.category] = (promotion.percent_off, promotion.id)
+        self.category_slots = {category: slot for slot, category in enumerate(best_by_category)}
+        self.category_percent = np.array([percent for percent, _ in best_by_category.values()] + [0.0])
+        self.category_promotion = np.array([promotion_id for _, promotion_id in best_by_category.values()] + [0],
+                                           dtype=np.int64)
+
+        # Buy X get Y rules sorted by product
+        bundles = sorted(
+            (promotion.product_id, promotion.buy_quantity + promotion.get_quantity, promotion.get_quantity, promotion.id)
+            for promotion in live if promotion.kind == PromotionKind.buy_x_get_y
+        )
+        bundles = np.array(bundles, dtype=np.int64).reshape(-1, 4)
+        self.bundle_product, self.bundle_size, self.bundle_free, self.bundle_promotion = bundles.T.copy()
+
+        # Cart thresholds sorted ascending, with the best percentage reachable at each threshold
+        thresholds = sorted(
+            (promotion.min_subtotal, promotion.percent_off, promotion.id)
+            for promotion in live if promotion.kind == PromotionKind.cart_threshold
+        )
+        self.threshold_min = np.array([minimum for minimum, _, _ in thresholds])
+        percents = np.array([percent for _, percent, _ in thresholds])
+        best_index = np.zeros(len(thresholds), dtype=np.int64)
+        for index in range(1, len(thresholds)):
+            best_index[index] = index if percents[index] > percents[best_index[index - 1]] else best_index[index - 1]
+        self.threshold_percent = percents[best_index]
+        self.threshold_promotion = np.array([thresholds[index][2] for index in best_index], dtype=np.int64)
+
+        # The result changes when a scheduled promotion starts or ends
+        boundaries = [
+            moment for promotion in promotions for moment in (promotion.starts_at, promotion.ends_at)
+            if moment is not None and moment > now
+        ]
+        self.next_change = min(boundaries, default=None)
+        self.rule_count = len(live)
+
+    """
+    Compute the discount of every line of a cart.
+
+    Args:
+        product_ids (list): Product ID of each line.
+        quantities (list): Quantity of each line.
+        prices (list): Unit price of each line.
+        categories (list): Product category of each line.
+
+    Returns:
+        tuple: (discounts, promotion_ids) arrays, promotion ID 0 where no promotion applies.
+    """
+    def evaluate(self, product_ids, quantities, prices, categories):
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        line_totals = quantities * prices
+        discounts = np.zeros(len(product_ids))
+        promotion_ids = np.zeros(len(product_ids), dtype=np.int64)
+
+        def apply(candidate, candidate_promotions, lines=slice(None)):
+            better = candidate > discounts[lines]
+            target = np.arange(len(discounts))[lines][better]
+            discounts[target] = candidate[better]
+            promotion_ids[target] = candidate_promotions[better]
+
+        # Category percentages, unknown categories read the trailing zero slot
+        slots = np.fromiter((self.category_slots.get(category, -1) for category in categories),
+                            dtype=np.int64, count=len(product_ids))
+        apply(line_totals * self.category_percent[slots] / 100, self.category_promotion[slots])
+
+        # Buy X get Y: pair every line with the rules of its product
+        first = np.searchsorted(self.bundle_product, product_ids, side="left")
+        counts = np.searchsorted(self.bundle_product, product_ids, side="right") - first
+        if counts.any():
+            lines = np.repeat(np.arange(len(product_ids)), counts)
+            rules = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            free_units = quantities[lines] // self.bundle_size[rules] * self.bundle_free[rules]
+            candidate = free_units * prices[lines]
+            # Keep the best rule of each line
+            order = np.lexsort((-candidate, lines))
+            best = order[np.r_[True, lines[order][1:] != lines[order][:-1]]]
+            apply(candidate[best], self.bundle_promotion[rules[best]], lines[best])
+
+        # Best cart threshold reached by the subtotal
+        reached = np.searchsorted(self.threshold_min, line_totals.sum(), side="right") - 1
+        if reached >= 0:
+            apply(line_totals * self.threshold_percent[reached] / 100,
+                  np.full(len(product_ids), self.threshold_promotion[reached]))
+
+        return np.round(discounts, 2), promotion_ids
+
+
+"""
+Keeps the compiled promotions of this process up to date.
+
+The rules are compiled again when a scheduled promotion starts or ends, after an
+admin change made through this process, and at least every refresh interval to
+pick up changes made through other processes.
+
+Requests never wait for the database: the current rules are served while a
+background thread compiles the new ones, and no promotions apply until the first
+load succeeds. Request threads already hold a pooled connection, and waiting for
+a second one to reload could exhaust the pool. Only the startup load and the
+admin request that changed a promotion compile the rules in the calling thread,
+so the next request sees the change.
+"""
+class PromotionEngine:
+    def __init__(self):
+        self._compiled = None
+        self._expires_at = None
+        # Bumped by invalidate(), a load that started before is outdated when it finishes
+        self._version = 0
+        self._installed_version = -1
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    """
+    Compile the promotions now, in the calling thread.
+
+    Args:
+        db (Session, optional): Session to read the promotions with, a new one by default.
+
+    Returns:
+        None
+    """
+    def load(self, db: Optional[Session] = None):
+        with self._lock:
+            version = self._version
+        now = datetime.now()
+        compiled = self._load(now, db)
+        with self._lock:
+            self._install(compiled, now, version)
+
+    """
+    Compile the promotions again after an admin change.
+
+    The change is compiled in the calling request with its session, so the rules
+    from before the change are not served once it returns. If that fails the
+    background thread retries.
+
+    Args:
+        db (Session, optional): Session of the admin request, committed.
+
+    Returns:
+        None
+    """
+    def invalidate(self, db: Optional[Session] = None):
+        with self._lock:
+            self._version += 1
+            self._expires_at = datetime.min
+        try:
+            self.load(db)
+        except Exception as e:
+            logger.error(f"Compiling the promotions after a change failed: {e}")
+            with self._lock:
+                self._start_refresh()
+
+    def _load(self, now: datetime, db: Optional[Session] = None) -> CompiledPromotions:
+        session = db or SessionLocal()
+        try:
+            promotions = crud.get_live_promotions(session, now)
+        finally:
+            if db is None:
+                session.close()
+        compiled = CompiledPromotions(promotions, now)
+        logger.info(f"Compiled {compiled.rule_count} active promotions")
+        return compiled
+
+    # Called with the lock held
+    def _install(self, compiled: CompiledPromotions, now: datetime, version: int):
+        # A load that started before the installed one must not replace it
+        if version < self._installed_version:
+            return
+        expires_at = now + timedelta(seconds=settings.promotions_refresh_seconds)
+        if compiled.next_change is not None:
+            expires_at = min(expires_at, compiled.next_change)
+        if version != self._version:
+            expires_at = datetime.min
+        self._compiled, self._expires_at, self._installed_version = compiled, expires_at, version
+
+    # Called with the lock held
+    def _start_refresh(self):
+        if not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh, name="promotions-refresh", daemon=True).start()
+
+    def _refresh(self):
+        # Load again until no invalidate() happened during the load
+        while True:
+            version = self._version
+            try:
+                now = datetime.now()
+                compiled = self._load(now)
+            except Exception as e:
+                logger.error(f"Compiling the promotions failed: {e}")
+                with self._lock:
+                    self._refreshing = False
+                return
+            with self._lock:
+                self._install(compiled, now, version)
+                if version == self._version:
+                    self._refreshing = False
+                    return
+
+    """
+    Get the promotions compiled for the current time.
+
+    Returns:
+        CompiledPromotions
+    """
+    def current(self) -> CompiledPromotions:
+        now = datetime.now()
+        compiled = self._compiled
+        if compiled is not None and now < self._expires_at:
+            return compiled
+
+        with self._lock:
+            if self._compiled is None:
+                # The startup load failed, serve no promotions until the background load succeeds
+                self._compiled, self._expires_at = CompiledPromotions([], now), datetime.min
+            self._start_refresh()
+            return self._compiled
+
+    """
+    Compute the discounts of cart lines with the current promotions.
+
+    Args:
+        lines (list): Rows with product_id, quantity, price and category.
+        compiled (CompiledPromotions, optional): Promotions to apply, the current ones by default.
+
+    Returns:
+        List[LineDiscount]: One entry per line.
+    """
+    def discounts(self, lines, compiled: Optional[CompiledPromotions] = None) -> List[LineDiscount]:
+        if not lines:
+            return []
+        compiled = compiled or self.current()
+        discounts, promotion_ids = compiled.evaluate(
+            [line.product_id for line in lines],
+            [line.quantity for line in lines],
+            [line.price for line in lines],
+            [line.category for line in lines],
+        )
+        return [
+            LineDiscount(float(discount), int(promotion_id) if promotion_id else None)
+            for discount, promotion_id in zip(discounts.tolist(), promotion_ids.tolist())
+        ]
+
+
+promotion_engine = PromotionEngine()
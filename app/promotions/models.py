@@ -0,0 +1,34 @@
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, Enum, Float, ForeignKey, Integer, String
+
+from app.core.database import Base
+
+import enum
+
+# Enum for the kinds of promotion
+class PromotionKind(str, enum.Enum):
+    # percent_off on every item of a category
+    category_percent = "category_percent"
+    # for every buy_quantity units of a product, get_quantity more are free
+    buy_x_get_y = "buy_x_get_y"
+    # percent_off on the whole cart once its subtotal reaches min_subtotal
+    cart_threshold = "cart_threshold"
+
+
+# SQLAlchemy model for Promotions table
+class Promotions(Base):
+    __tablename__ = "promotions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    kind = Column(Enum(PromotionKind, name="promotion_kind"), nullable=False)
+    category = Column(String)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
+    percent_off = Column(Float)
+    buy_quantity = Column(Integer)
+    get_quantity = Column(Integer)
+    min_subtotal = Column(Float)
+    active = Column(Boolean, nullable=False, default=True)
+    starts_at = Column(DateTime)
+    ends_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.promotions import models, schemas
+
+"""
+Create a new promotion.
+
+Args:
+    db (Session): Database session.
+    promotion (PromotionCreate): Promotion details.
+
+Returns:
+    Promotions: The newly created promotion.
+"""
+def create_promotion(db: Session, promotion: schemas.PromotionCreate):
+    promotion_in_db = models.Promotions(**promotion.model_dump())
+    db.add(promotion_in_db)
+    db.commit()
+    db.refresh(promotion_in_db)
+    return promotion_in_db
+
+
+"""
+Retrieve all the promotions.
+
+Args:
+    db (Session): Database session.
+
+Returns:
+    List of all the promotions, newest first
+"""
+def get_all_promotions(db: Session):
+    return db.query(models.Promotions).order_by(models.Promotions.id.desc()).all()
+
+
+"""
+Retrieve a promotion by its ID
+
+Args:
+    db (Session): Database session.
+    promotion_id (int): Promotion ID.
+
+Returns:
+    Promotions | None: Promotion if found, otherwise None.
+"""
+def get_promotion_by_id(db: Session, promotion_id: int):
+    return db.query(models.Promotions).filter(models.Promotions.id == promotion_id).first()
+
+
+"""
+Update an existing promotion.
+
+Args:
+    db (Session): Database session.
+    promotion_id (int): ID of the promotion to update.
+    promotion (PromotionUpdate): New promotion details.
+
+Returns:
+    Promotions | None: The updated promotion, or None if not found.
+"""
+def update_promotion(db: Session, promotion_id: int, promotion: schemas.PromotionUpdate):
+    promotion_in_db = get_promotion_by_id(db, promotion_id)
+    if promotion_in_db:
+        for key, value in promotion.model_dump().items():
+            setattr(promotion_in_db, key, value)
+        db.commit()
+        db.refresh(promotion_in_db)
+    return promotion_in_db
+
+
+"""
+Delete a promotion. Order items keep the ID of the promotion they were discounted by.
+
+Args:
+    db (Session): Database session.
+    promotion_id (int): ID of the promotion to delete.
+
+Returns:
+    Promotions | None: The deleted promotion, or None if not found.
+"""
+def delete_promotion(db: Session, promotion_id: int):
+    promotion_in_db = get_promotion_by_id(db, promotion_id)
+    if promotion_in_db:
+        db.delete(promotion_in_db)
+        db.commit()
+    return promotion_in_db
+
+
+"""
+Retrieve the promotions that are active now or will start later.
+
+Args:
+    db (Session): Database session.
+    now (datetime): Current time.
+
+Returns:
+    list[Promotions]: Enabled promotions that have not ended.
+"""
+def get_live_promotions(db: Session, now: datetime):
+    return db.query(models.Promotions).filter(
+        models.Promotions.active.is_(True),
+        or_(models.Promotions.ends_at.is_(None), models.Promotions.ends_at > now),
+    ).all()
@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+import logging
+
+from app.auth.dependency import allow_only_admin
+from app.core.database import get_db
+from app.products import products_crud
+from app.promotions import schemas, promotions_crud as crud
+from app.promotions.engine import promotion_engine
+
+# Create a logger instance for the current module
+logger = logging.getLogger(__name__)
+
+# Create a API Router for Admin Promotion Management
+admin_promotion_router = APIRouter(prefix="/admin/promotions", tags=["Admin Promotions Management"])
+
+
+def check_product(db: Session, promotion: schemas.PromotionBase):
+    if promotion.product_id is not None and not products_crud.get_product_by_id(db, promotion.product_id):
+        logger.warning(f"Promotion refers to a missing product with the id:{promotion.product_id}")
+        raise HTTPException(status_code=404, detail="Product not found")
+
+
+"""
+Create a new promotion (Admin only).
+
+Args:
+    promotion (PromotionCreate): Promotion details.
+    db (Session): Database session.
+    admin (dict): Admin user info from authentication dependency.
+
+Returns:
+    PromotionResponse: The newly created promotion.
+"""
+@admin_promotion_router.post("/", response_model=schemas.PromotionResponse, status_code=201)
+def create(promotion: schemas.PromotionCreate, db: Session = Depends(get_db), admin: dict = Depends(allow_only_admin)):
+    try:
+        check_product(db, promotion)
+        created = crud.create_promotion(db, promotion)
+        promotion_engine.invalidate(db)
+        logger.info(f"Promotion created: {created.name}")
+        return created
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Create promotion failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to create promotion")
+
+
+"""
+Retrieve all promotions (Admin only).
+
+Args:
+    db (Session): Database session.
+    admin (dict): Admin user info.
+
+Returns:
+    List[PromotionResponse]: List of all promotions.
+"""
+@admin_promotion_router.get("/", response_model=List[schemas.PromotionResponse])
+def read_promotions(db: Session = Depends(get_db), admin: dict = Depends(allow_only_admin)):
+    try:
+        promotions = crud.get_all_promotions(db)
+        logger.info("All promotions retrieved by admin")
+        return promotions
+    except Exception as e:
+        logger.error(f"Fetch promotions failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch promotions")
+
+
+"""
+Retrieve promotion by ID (Admin only).
+
+Args:
+    promotion_id (int): ID of the promotion.
+    db (Session): Database session.
+    admin (dict): Admin user info.
+
+Returns:
+    PromotionResponse: Promotion details.
+"""
+@admin_promotion_router.get("/{promotion_id}", response_model=schemas.PromotionResponse)
+def read_promotion(promotion_id: int, db: Session = Depends(get_db), admin: dict = Depends(allow_only_admin)):
+    try:
+        promotion = crud.get_promotion_by_id(db, promotion_id)
+        if not promotion:
+            logger.warning(f"Promotion not found with the id:{promotion_id}")
+            raise HTTPException(status_code=404, detail="Promotion not found")
+        return promotion
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Error fetching promotion: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch promotion")
+
+
+"""
+Update promotion details (Admin only).
+
+Args:
+    promotion_id (int): ID of the promotion to update.
+    promotion (PromotionUpdate): Updated promotion data.
+    db (Session): Database session.
+    admin (dict): Admin user info.
+
+Returns:
+    PromotionResponse: Updated promotion.
+"""
+@admin_promotion_router.put("/{promotion_id}", response_model=schemas.PromotionResponse)
+def update(promotion_id: int, promotion: schemas.PromotionUpdate, db: Session = Depends(get_db), admin: dict = Depends(allow_only_admin)):
+    try:
+        check_product(db, promotion)
+        updated = crud.update_promotion(db, promotion_id, promotion)
+        if not updated:
+            raise HTTPException(status_code=404, detail="Promotion not found")
+        promotion_engine.invalidate(db)
+        return updated
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Error updating promotion: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to update promotion")
+
+
+"""
+Delete a promotion (Admin only).
+
+Args:
+    promotion_id (int): ID of the promotion to delete.
+    db (Session): Database session.
+    admin (dict): Admin user info.
+
+Returns:
+    dict: Deletion confirmation message.
+"""
+@admin_promotion_router.delete("/{promotion_id}", status_code=200)
+def delete(promotion_id: int, db: Session = Depends(get_db), admin: dict = Depends(allow_only_admin)):
+    try:
+        deleted = crud.delete_promotion(db, promotion_id)
+        if not deleted:
+            logger.warning(f"Promotion not found at id:{promotion_id}")
+            raise HTTPException(status_code=404, detail="Promotion not found")
+        promotion_engine.invalidate(db)
+        logger.info("Promotion deleted successfully from the db")
+        return {"message": "Promotion Deleted Successfully"}
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Error deleting promotion: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to delete promotion")
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from app.promotions.models import PromotionKind
+
+# Fields each kind of promotion needs
+REQUIRED_FIELDS = {
+    PromotionKind.category_percent: ("category", "percent_off"),
+    PromotionKind.buy_x_get_y: ("product_id", "buy_quantity", "get_quantity"),
+    PromotionKind.cart_threshold: ("min_subtotal", "percent_off"),
+}
+
+# Promotion Base Model Schema
+class PromotionBase(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    kind: PromotionKind
+    category: Optional[str] = None
+    product_id: Optional[int] = None
+    percent_off: Optional[float] = Field(None, gt=0, le=100)
+    buy_quantity: Optional[int] = Field(None, ge=1)
+    get_quantity: Optional[int] = Field(None, ge=1)
+    min_subtotal: Optional[float] = Field(None, ge=0)
+    active: bool = True
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_kind_fields(self):
+        missing = [field for field in REQUIRED_FIELDS[self.kind] if getattr(self, field) is None]
+        if missing:
+            raise ValueError(f"{self.kind.value} promotions need {', '.join(missing)}")
+        if self.starts_at and self.ends_at and self.starts_at >= self.ends_at:
+            raise ValueError("starts_at must be before ends_at")
+        return self
+
+# Schema for Create Promotion
+class PromotionCreate(PromotionBase):
+    pass
+
+# Schema for Update Promotion
+class PromotionUpdate(PromotionBase):
+    pass
+
+# Schema for Promotion Response
+class PromotionResponse(PromotionBase):
+    id: int
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,295 @@
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.database import SessionLocal, without_statement_timeout
+from app.recommendations import recommendations_crud as crud
+
+import logging
+
+# Create a logger instance  for current module
+logger = logging.getLogger(__name__)
+
+# Pending orders older than this are merged on the next read or write
+MERGE_INTERVAL_SECONDS = 10.0
+
+# A failed build is started again by a lookup after this many seconds
+BUILD_RETRY_SECONDS = 30.0
+
+
+def _cooccurrence(order_ids, product_ids, size: int):
+    from scipy import sparse
+
+    # Binary order x product matrix, its Gram matrix counts the orders containing both products
+    _, rows = np.unique(order_ids, return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, product_ids)), shape=(rows.max() + 1, size)
+    )
+    baskets.data[:] = 1
+    counts = (baskets.T @ baskets).tocsr()
+    counts = counts - sparse.diags(counts.diagonal(), format="csr", dtype=np.int32)
+    counts.eliminate_zeros()
+    return counts
+
+
+"""
+"Frequently bought together" index built from the co-occurrence of products in paid orders.
+
+The co-occurrence counts are kept in sparse product x product matrices, the counts
+of the last build plus the counts of the orders merged since, and the top_k related
+products of every product are precomputed into one dense (products x 2 x top_k)
+int32 array of IDs and counts, so a lookup is a row copy. Orders completed by
+checkout are buffered and merged in batches on a background thread: only the rows
+of the products they contain are counted and ranked again, and each of them is
+replaced with a single assignment. Orders completed by other processes are picked
+up by the periodic full rebuild.
+
+Readers take no lock: a row is written in one assignment, and a grown array is
+filled before it replaces the old one.
+"""
+class RelatedProductsIndex:
+    def __init__(self):
+        # Configured from the settings by start()
+        self.top_k = 0
+        self.merge_orders = 0
+        self.rebuild_seconds = 0.0
+        # Sparse co-occurrence counts of the last build and of the orders merged since, scipy is
+        # only imported by the first build
+        self._counts = None
+        self._recent = None
+        # Per product its related product IDs (-1 past the last one) and their counts
+        self._top = np.empty((0, 2, 0), dtype=np.int32)
+        self._pending = []
+        self._pending_since = None
+        self._pending_lock = threading.Lock()
+        # One build at a time, merges wait for the running build to swap in its result
+        self._build_lock = threading.RLock()
+        self._update_lock = threading.Lock()
+        self._building = False
+        self._built_at = None
+        self._rebuilding = False
+        self._failed_at = None
+        self._merging = False
+
+    @property
+    def built(self) -> bool:
+        return self._built_at is not None
+
+    def _empty_top(self, size: int):
+        top = np.zeros((size, 2, self.top_k), dtype=np.int32)
+        top[:, 0] = -1
+        return top
+
+    # Rank row i of counts into the row targets[i] of top
+    def _rank_rows(self, counts, targets, top):
+        k = self.top_k
+        for position, target in enumerate(targets):
+            start, end = counts.indptr[position], counts.indptr[position + 1]
+            ids, scores = counts.indices[start:end], counts.data[start:end]
+            if len(ids) > k:
+                keep = np.argpartition(scores, -k)[-k:]
+                ids, scores = ids[keep], scores[keep]
+            # Highest count first, lower product ID first on ties
+            order = np.lexsort((ids, -scores))
+            row = np.zeros((2, k), dtype=np.int32)
+            row[0] = -1
+            row[0, :len(order)] = ids[order]
+            row[1, :len(order)] = scores[order]
+            top[target] = row
+
+    def _grow(self, size: int):
+        # Make room for products created after the last build, with some headroom so this stays rare
+        if size <= len(self._top):
+            return
+        size = max(size, len(self._top) + len(self._top) // 4)
+        top = self._empty_top(size)
+        top[:len(self._top)] = self._top
+        self._counts.resize((size, size))
+        self._recent.resize((size, size))
+        self._top = top
+
+    """
+    Build the index from every paid order in the database.
+
+    The database is read without blocking lookups or checkout. Orders added while
+    the build runs stay pending and are merged once the new index is swapped in.
+
+    Returns:
+        None
+    """
+    def build(self):
+        from scipy import sparse
+
+        with self._build_lock:
+            self._building = True
+            try:
+                started = time.perf_counter()
+                db = SessionLocal()
+                try:
+                    size = crud.get_max_product_id(db) + 1
+                    # Sorting every paid order item for the cursor can take longer than a request may
+                    without_statement_timeout(db)
+                    counts = sparse.csr_matrix((size, size), dtype=np.int32)
+                    for order_ids, product_ids in crud.iter_baskets(db):
+                        size = max(size, int(product_ids.max()) + 1)
+                        counts.resize((size, size))
+                        counts = counts + _cooccurrence(order_ids, product_ids, size)
+                finally:
+                    db.close()
+
+                top = self._empty_top(size)
+                self._rank_rows(counts, range(size), top)
+                with self._update_lock:
+                    self._counts = counts
+                    self._recent = sparse.csr_matrix((size, size), dtype=np.int32)
+                    self._top = top
+                    self._built_at = time.monotonic()
+            finally:
+                self._building = False
+            logger.info(
+                f"Built related products index for {size} products with {counts.nnz} pairs "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        self.merge()
+
+    """
+    Read the size of the index and the merge and rebuild intervals from the settings,
+    then build the index on a background thread.
+
+    Returns:
+        None
+    """
+    def start(self):
+        self.top_k = settings.recommendations_top_k
+        self.merge_orders = settings.recommendations_merge_orders
+        self.rebuild_seconds = settings.recommendations_rebuild_minutes * 60
+        self.start_build()
+
+    """
+    Build the index on a background thread, unless a build is already running.
+
+    Returns:
+        None
+    """
+    def start_build(self):
+        with self._pending_lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name="related-products-rebuild", daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            self.build()
+            self._failed_at = None
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            logger.error(f"Building the related products index failed: {e}")
+        finally:
+            self._rebuilding = False
+
+    """
+    Buffer newly paid orders, merging them in the background once enough are pending.
+
+    Args:
+        baskets (List[List[int]]): Product IDs of each order.
+
+    Returns:
+        None
+    """
+    def add_orders(self, baskets: List[List[int]]):
+        baskets = [basket for basket in baskets if len(basket) > 1]
+        if not baskets:
+            return
+        with self._pending_lock:
+            self._pending.extend(baskets)
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            due = len(self._pending) >= self.merge_orders
+        if due:
+            self._start_merge()
+
+    def _start_merge(self):
+        with self._pending_lock:
+            if self._merging:
+                return
+            self._merging = True
+        threading.Thread(target=self._merge_in_background, name="related-products-merge", daemon=True).start()
+
+    def _merge_in_background(self):
+        try:
+            while True:
+                self.merge()
+                with self._pending_lock:
+                    if len(self._pending) < self.merge_orders:
+                        self._merging = False
+                        return
+        except Exception as e:
+            logger.error(f"Merging orders into the related products index failed: {e}")
+            with self._pending_lock:
+                self._merging = False
+
+    """
+    Add the pending orders to the counts and rank the products they contain again.
+
+    Returns:
+        None
+    """
+    def merge(self):
+        with self._update_lock:
+            if not self.built or self._building:
+                return
+            with self._pending_lock:
+                baskets, self._pending, self._pending_since = self._pending, [], None
+            if not baskets:
+                return
+
+            order_ids = np.repeat(np.arange(len(baskets)), [len(basket) for basket in baskets])
+            product_ids = np.concatenate([np.asarray(basket, dtype=np.int64) for basket in baskets])
+            self._grow(int(product_ids.max()) + 1)
+            delta = _cooccurrence(order_ids, product_ids, len(self._top))
+            # Grows with the orders merged since the last build, the counts of the build are not copied
+            self._recent = self._recent + delta
+            rows = np.flatnonzero(np.diff(delta.indptr))
+            self._rank_rows(self._counts[rows] + self._recent[rows], rows, self._top)
+            logger.info(f"Merged {len(baskets)} orders into the related products index")
+
+    def _maintain(self):
+        if self._pending_since is not None and time.monotonic() - self._pending_since >= MERGE_INTERVAL_SECONDS:
+            self._start_merge()
+        if time.monotonic() - self._built_at >= self.rebuild_seconds:
+            self.start_build()
+
+    """
+    Related products of a product, most often bought together first.
+
+    Request threads never build: until the first build finished no product has
+    related products, and a lookup starts the build again if it failed.
+
+    Args:
+        product_id (int): ID of the product.
+        limit (int): Maximum number of products, at most top_k.
+
+    Returns:
+        list: (product_id, orders_together) tuples.
+    """
+    def related(self, product_id: int, limit: int):
+        if not self.built:
+            if self._failed_at is not None and time.monotonic() - self._failed_at >= BUILD_RETRY_SECONDS:
+                self.start_build()
+            return []
+        self._maintain()
+
+        top = self._top
+        if product_id < 0 or product_id >= len(top):
+            return []
+        row = top[product_id].copy()
+        ids, scores = row[0, :limit], row[1, :limit]
+        found = ids >= 0
+        return list(zip(ids[found].tolist(), scores[found].tolist()))
+
+
+related_products = RelatedProductsIndex()
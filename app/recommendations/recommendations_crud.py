@@ -0,0 +1,75 @@
+from typing import Iterator, List
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.orders.models import OrderItem, Orders, OrderStatus
+from app.products.models import Products
+
+# Order items fetched from the server-side cursor at a time
+CHUNK_SIZE = 100_000
+
+
+"""
+Retrieve the highest product ID.
+
+Args:
+    db (Session): Database session.
+
+Returns:
+    int: Highest product ID, 0 if there are no products.
+"""
+def get_max_product_id(db: Session) -> int:
+    return db.execute(select(func.max(Products.id))).scalar() or 0
+
+
+"""
+Read the products of every paid order in chunks.
+
+Items are read through a server-side cursor ordered by order, and a chunk always
+holds whole orders: the items of the last order of a chunk are carried over to
+the next one.
+
+Args:
+    db (Session): Database session.
+    chunk_size (int): Order items per chunk.
+
+Yields:
+    tuple: (order_ids, product_ids) NumPy arrays of the same length.
+"""
+def iter_baskets(db: Session, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    query = (
+        select(OrderItem.order_id, OrderItem.product_id)
+        .join(Orders, (Orders.id == OrderItem.order_id) & (Orders.created_at == OrderItem.created_at))
+        .where(Orders.status == OrderStatus.paid, OrderItem.product_id.isnot(None))
+        .order_by(OrderItem.order_id)
+    )
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    carry = np.empty((0, 2), dtype=np.int64)
+    try:
+        for rows in result.partitions():
+            chunk = np.concatenate([carry, np.array(rows, dtype=np.int64)])
+            split = np.searchsorted(chunk[:, 0], chunk[-1, 0])
+            carry = chunk[split:]
+            if split:
+                yield chunk[:split, 0], chunk[:split, 1]
+    finally:
+        result.close()
+    if len(carry):
+        yield carry[:, 0], carry[:, 1]
+
+
+"""
+Retrieve products by ID.
+
+Args:
+    db (Session): Database session.
+    product_ids (List[int]): IDs of the products.
+
+Returns:
+    dict: Products keyed by ID, IDs that no longer exist are missing.
+"""
+def get_products(db: Session, product_ids: List[int]):
+    products = db.query(Products).filter(Products.id.in_(product_ids)).all()
+    return {product.id: product for product in products}
@@ -0,0 +1,56 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.replicas import get_read_db
+from app.products import products_crud
+from app.products.schemas import ProductResponse
+from app.recommendations import schemas, recommendations_crud as crud
+from app.recommendations.index import related_products
+
+import logging
+
+# Create a logger instance for the current module
+logger = logging.getLogger(__name__)
+
+# Create a API Router for the product recommendations
+recommendation_router = APIRouter(prefix="/products", tags=["Recommendations"])
+
+
+"""
+Products frequently bought together with a product.
+
+Args:
+    product_id (int): Product ID.
+    limit (int): Maximum number of related products.
+    db (Session): Database session.
+
+Returns:
+    List[RelatedProduct]: Related products, most often bought together first.
+"""
+@recommendation_router.get("/{product_id}/related", response_model=List[schemas.RelatedProduct])
+def get_related_products(product_id: int, limit: int = Query(10, ge=1, le=100), db: Session = Depends(get_read_db)):
+    try:
+        if not products_crud.get_product_by_id(db, product_id):
+            logger.warning(f"Related products requested for unknown product {product_id}")
+            raise HTTPException(status_code=404, detail="Product not found with this id")
+
+        related = related_products.related(product_id, limit)
+        products = crud.get_products(db, [related_id for related_id, _ in related])
+
+        # Products deleted since the index was built are left out
+        result = [
+            {**ProductResponse.model_validate(products[related_id], from_attributes=True).model_dump(),
+             "bought_together": bought_together}
+            for related_id, bought_together in related if related_id in products
+        ]
+        logger.info("Found %s related products for product %s", len(result), product_id)
+        return result
+
+    except HTTPException as http_exception:
+        raise http_exception
+
+    except Exception as e:
+        logger.error(f"Error getting related products: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error getting related products")
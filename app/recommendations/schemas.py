@@ -0,0 +1,7 @@
+from app.products.schemas import ProductResponse
+
+
+# Schema for a product related to another one
+class RelatedProduct(ProductResponse):
+    # Number of paid orders containing both products
+    bought_together: int
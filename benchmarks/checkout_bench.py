@@ -0,0 +1,94 @@
+"""
+Checkout latency benchmark
+
+Fills the cart of a dedicated benchmark user with 1 to 200 items and measures
+how long the two transactional checkout phases (reserve_order + complete_orders)
+take for each cart size. The payment step in between does not touch the database
+and is left out. Needs the database configured in .env with the schema created
+by alembic.
+
+Usage:
+    python -m benchmarks.checkout_bench --repeat 20
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import delete, insert, select
+
+from app.auth.models import User
+from app.cart.models import Cart
+from app.checkout import checkout_crud
+from app.core.database import SessionLocal
+from app.orders.models import Orders, OrderItem
+from app.products.models import Products
+
+BENCH_EMAIL = "checkout-bench@example.com"
+CART_SIZES = [1, 5, 10, 25, 50, 100, 200]
+
+
+# Create the benchmark user and enough products for the largest cart
+def setup(db, product_count):
+    user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+    if user is None:
+        user = User(name="Checkout Bench", email=BENCH_EMAIL, hashed_password="-", role="user")
+        db.add(user)
+        db.commit()
+
+    product_ids = db.execute(insert(Products).returning(Products.id), [
+        {"name": f"bench-{i}", "description": "benchmark product", "price": 1.0 + i % 50,
+         "stock": 1000, "category": "bench", "image_url": ""}
+        for i in range(product_count)
+    ]).scalars().all()
+    db.commit()
+    return user.id, product_ids
+
+
+# Remove every row created by the benchmark
+def teardown(db, user_id, product_ids):
+    order_ids = select(Orders.id).where(Orders.user_id == user_id)
+    db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+    db.execute(delete(Orders).where(Orders.user_id == user_id))
+    db.execute(delete(Cart).where(Cart.user_id == user_id))
+    db.execute(delete(Products).where(Products.id.in_(product_ids)))
+    db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+
+
+def fill_cart(db, user_id, product_ids):
+    db.execute(insert(Cart), [
+        {"user_id": user_id, "product_id": product_id, "quantity": 1 + product_id % 3}
+        for product_id in product_ids
+    ])
+    db.commit()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(repeat):
+    db = SessionLocal()
+    user_id, product_ids = setup(db, max(CART_SIZES))
+    try:
+        print(f"{'items':>6} {'min ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for size in CART_SIZES:
+            samples = []
+            for _ in range(repeat):
+                fill_cart(db, user_id, product_ids[:size])
+                started = time.perf_counter()
+                reserved = checkout_crud.reserve_order(db, user_id)
+                checkout_crud.complete_orders(db, [reserved])
+                samples.append((time.perf_counter() - started) * 1000)
+            print(f"{size:>6} {min(samples):>9.2f} {statistics.median(samples):>9.2f} {percentile(samples, 0.95):>9.2f}")
+    finally:
+        teardown(db, user_id, product_ids)
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure checkout latency by cart size")
+    parser.add_argument("--repeat", type=int, default=20, help="Checkouts per cart size")
+    args = parser.parse_args()
+    run(args.repeat)
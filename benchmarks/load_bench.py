@@ -0,0 +1,170 @@
+"""
+Sync vs async route load benchmark
+
+Starts the API with uvicorn once per db_mode ("sync" and "async"), then keeps
+--concurrency clients busy for --duration seconds with a read mix (product
+listing, cart view with promotion preview, order history) and reports
+throughput and latency percentiles. Sync routes run in the AnyIO threadpool
+(40 threads), async routes on the event loop. Needs the database configured in
+.env with the schema created by alembic; the benchmark users and products are
+removed afterwards.
+
+Usage:
+    python -m benchmarks.load_bench --concurrency 50 200 --duration 15
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+from sqlalchemy import delete, select
+
+from app.auth.models import User
+from app.cart.models import Cart
+from app.core.database import SessionLocal
+from app.products.models import Products
+
+MODES = ["sync", "async"]
+PRODUCTS = 20
+STARTUP_TIMEOUT_SECONDS = 60
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, port: int):
+    # The benchmarks measure how much load the API serves, not how much it sheds
+    env = {**os.environ, "DB_MODE": mode, "ADMISSION_CONTROL": "false"}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "app.main:create_app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url: str):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/docs", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("The server did not start")
+
+
+def sign_up(base_url: str, email: str, role: str) -> dict:
+    httpx.post(f"{base_url}/auth/signup",
+               json={"name": "Load Bench", "email": email, "password": "loadbench", "role": role})
+    token = httpx.post(f"{base_url}/auth/signin", json={"email": email, "password": "loadbench"}).json()
+    return {"Authorization": f"Bearer {token['access_token']}"}
+
+
+# Create an admin, a user and a few products, and fill the cart of the user
+def setup(base_url: str, run_id: str):
+    admin = sign_up(base_url, f"load-admin-{run_id}@example.com", "admin")
+    user = sign_up(base_url, f"load-user-{run_id}@example.com", "user")
+    product_ids = []
+    for number in range(PRODUCTS):
+        product = httpx.post(f"{base_url}/admin/products/", headers=admin, json={
+            "name": f"load-{run_id}-{number}", "description": "load benchmark product", "price": 5.0 + number,
+            "stock": 1000, "category": f"load-{run_id}", "image_url": "",
+        }).json()
+        product_ids.append(product["id"])
+    for product_id in product_ids[:5]:
+        httpx.post(f"{base_url}/cart/", headers=user, json={"product_id": product_id, "quantity": 2})
+    return user, product_ids
+
+
+# Remove every row created by the benchmark
+def teardown(run_id: str, product_ids):
+    db = SessionLocal()
+    try:
+        user_ids = select(User.id).where(User.email.like(f"load-%-{run_id}@example.com"))
+        db.execute(delete(Cart).where(Cart.user_id.in_(user_ids)))
+        db.execute(delete(Products).where(Products.id.in_(product_ids)))
+        db.execute(delete(User).where(User.email.like(f"load-%-{run_id}@example.com")))
+        db.commit()
+    finally:
+        db.close()
+
+
+def requests_for(run_id: str, user: dict):
+    return [
+        ("GET", f"/products/?category=load-{run_id}&sort_by=price_asc&page_size=10", {}),
+        ("GET", "/cart/", user),
+        ("GET", "/orders/?limit=20", user),
+    ]
+
+
+async def client(http, mix, stop_at, latencies, errors):
+    while time.monotonic() < stop_at:
+        method, path, headers = random.choice(mix)
+        started = time.perf_counter()
+        try:
+            response = await http.request(method, path, headers=headers)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def load(base_url: str, mix, concurrency: int, duration: float):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        stop_at = time.monotonic() + duration
+        await asyncio.gather(*(client(http, mix, stop_at, latencies, errors) for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(concurrencies, duration, warmup):
+    run_id = uuid.uuid4().hex[:8]
+    product_ids = []
+    print(f"{'mode':>6} {'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    try:
+        for mode in MODES:
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = start_server(mode, port)
+            try:
+                wait_ready(base_url)
+                if not product_ids:
+                    user, product_ids = setup(base_url, run_id)
+                mix = requests_for(run_id, user)
+                asyncio.run(load(base_url, mix, min(concurrencies), warmup))
+                # Lowest load first, so queues left by a heavier run do not slow down a lighter one
+                for concurrency in sorted(concurrencies):
+                    latencies, errors = asyncio.run(load(base_url, mix, concurrency, duration))
+                    latencies.sort()
+                    print(f"{mode:>6} {concurrency:>8} {len(latencies) / duration:>9.0f} "
+                          f"{percentile(latencies, 0.5):>9.1f} {percentile(latencies, 0.95):>9.1f} "
+                          f"{percentile(latencies, 0.99):>9.1f} {len(errors):>7}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        teardown(run_id, product_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the sync and async routes under concurrent load")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200], help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per measurement")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of load before measuring")
+    args = parser.parse_args()
+    run(args.concurrency, args.duration, args.warmup)
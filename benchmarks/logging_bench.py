@@ -0,0 +1,115 @@
+"""
+Logging overhead benchmark
+
+Logs --records INFO records of a typical request line ("Item 12 added to cart
+for user 34.") and reports the time per call on the logging thread, and the
+time until every record is written, for:
+- the previous setup: logging.basicConfig with an f-string message, formatted
+  and written synchronously by the calling thread
+- the queue handler with JSON records written by the background writer
+- the same with the logger sampled 1 in 100, like "Access granted"
+and the cost of a DEBUG call below the log level, with an f-string and with
+lazy %-style arguments. The queued setups skip the caller and thread lookups
+like configure_logging with LOG_SKIP_RECORD_LOOKUPS=true. Records are written to os.devnull, no database needed.
+
+Usage:
+    python -m benchmarks.logging_bench --records 200000
+"""
+import argparse
+import logging
+import os
+import queue
+import time
+
+from app.core.logs import (
+    TEXT_FORMAT, BackgroundWriter, BufferedStreamHandler, JsonFormatter, NonBlockingQueueHandler, SamplingFilter,
+    log_records_dropped, skip_record_lookups,
+)
+
+LOGGER_NAME = "bench.cart"
+
+
+def log_fstrings(logger: logging.Logger, records: int):
+    for number in range(records):
+        logger.info(f"Item {number} added to cart for user {number % 1000}.")
+
+
+def log_lazy(logger: logging.Logger, records: int):
+    for number in range(records):
+        logger.info("Item %s added to cart for user %s.", number, number % 1000)
+
+
+def debug_fstrings(logger: logging.Logger, records: int):
+    for number in range(records):
+        logger.debug(f"Item {number} added to cart for user {number % 1000}.")
+
+
+def debug_lazy(logger: logging.Logger, records: int):
+    for number in range(records):
+        logger.debug("Item %s added to cart for user %s.", number, number % 1000)
+
+
+def bench_logger(handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def synchronous(devnull, log, records: int):
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    logger = bench_logger(handler)
+    started = time.perf_counter()
+    log(logger, records)
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+def queued(devnull, log, records: int, sampling=None):
+    stream_handler = BufferedStreamHandler(devnull)
+    stream_handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    handler = NonBlockingQueueHandler(log_queue, records)
+    if sampling:
+        handler.addFilter(SamplingFilter(sampling))
+    writer = BackgroundWriter(log_queue, stream_handler)
+    writer.start()
+    logger = bench_logger(handler)
+    started = time.perf_counter()
+    log(logger, records)
+    caller = time.perf_counter() - started
+    writer.stop()
+    return caller, time.perf_counter() - started
+
+
+def run(records: int):
+    print(f"{'setup':>34} {'caller us':>10} {'written us':>11}")
+    with open(os.devnull, "w") as devnull:
+        caller, written = synchronous(devnull, log_fstrings, records)
+        print(f"{'basicConfig, f-string':>34} {caller / records * 1e6:>10.2f} {written / records * 1e6:>11.2f}")
+
+        # As configure_logging does with log_skip_record_lookups
+        skip_record_lookups()
+        for name, sampling in [("queue + JSON, lazy", None), ("queue + JSON, lazy, 1 in 100", {LOGGER_NAME: 100})]:
+            caller, written = queued(devnull, log_lazy, records, sampling)
+            print(f"{name:>34} {caller / records * 1e6:>10.2f} {written / records * 1e6:>11.2f}")
+
+        logger = bench_logger(logging.NullHandler())
+        for name, log in [("DEBUG below the level, f-string", debug_fstrings), ("DEBUG below the level, lazy", debug_lazy)]:
+            started = time.perf_counter()
+            log(logger, records)
+            elapsed = time.perf_counter() - started
+            print(f"{name:>34} {elapsed / records * 1e6:>10.2f}")
+
+    dropped = sum(log_records_dropped.collect().values())
+    if dropped:
+        print(f"{dropped} records dropped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the per call cost of the logging setup")
+    parser.add_argument("--records", type=int, default=200000, help="Records logged per measurement")
+    args = parser.parse_args()
+    run(args.records)
@@ -0,0 +1,100 @@
+"""
+Metrics overhead benchmark
+
+Measures what the metrics cost a request, without a database:
+- the MetricsMiddleware around a minimal ASGI app against the bare app
+- Counter.inc and Histogram.observe on one thread, and from several threads at
+  once next to a counter behind a lock, the design the per-thread shards replace
+- rendering /metrics with the series recorded by the run
+
+Usage:
+    python -m benchmarks.metrics_bench --requests 200000 --threads 4
+"""
+import argparse
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from app.core.metrics import Counter, Histogram
+from app.monitoring.metrics import REQUEST_SECONDS_BUCKETS, MetricsMiddleware, render_metrics
+
+ROUTES = [SimpleNamespace(path=f"/bench/{number}/{{item_id}}") for number in range(20)]
+STATUSES = [200, 200, 200, 404]
+
+START = {"type": "http.response.start", "status": 200, "headers": []}
+BODY = {"type": "http.response.body", "body": b"{}"}
+
+
+# Stands in for FastAPI: sets the matched route in the scope and answers
+async def bare_app(scope, receive, send):
+    scope["route"] = ROUTES[scope["number"] % len(ROUTES)]
+    await send({**START, "status": STATUSES[scope["number"] % len(STATUSES)]})
+    await send(BODY)
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def serve(app, requests: int) -> float:
+    started = time.perf_counter()
+    for number in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/bench", "number": number}, receive, send)
+    return time.perf_counter() - started
+
+
+# Same interface as Counter.inc, with every increment behind one lock
+class LockedCounter:
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+def per_op_ns(function, operations: int, threads: int) -> float:
+    def work():
+        for _ in range(operations):
+            function()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / (operations * threads) * 1e9
+
+
+def run(requests: int, threads: int):
+    bare = min(asyncio.run(serve(bare_app, requests)) for _ in range(3))
+    timed = min(asyncio.run(serve(MetricsMiddleware(bare_app), requests)) for _ in range(3))
+    print(f"bare app:            {bare / requests * 1e6:8.2f} us/request")
+    print(f"with middleware:     {timed / requests * 1e6:8.2f} us/request "
+          f"(+{(timed - bare) / requests * 1e6:.2f} us)")
+
+    counter, locked, histogram = Counter(), LockedCounter(), Histogram(REQUEST_SECONDS_BUCKETS)
+    for count in sorted({1, threads}):
+        print(f"{count} thread(s): Counter.inc {per_op_ns(lambda: counter.inc('200'), requests, count):6.0f} ns, "
+              f"locked counter {per_op_ns(lambda: locked.inc('200'), requests, count):6.0f} ns, "
+              f"Histogram.observe {per_op_ns(lambda: histogram.observe(0.042, '/bench'), requests, count):6.0f} ns")
+
+    started = time.perf_counter()
+    page = render_metrics()
+    print(f"render /metrics:     {(time.perf_counter() - started) * 1000:8.2f} ms "
+          f"for {len(page.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the per request cost of the metrics")
+    parser.add_argument("--requests", type=int, default=200000, help="Requests and operations per measurement")
+    parser.add_argument("--threads", type=int, default=4, help="Threads updating the same metric at once")
+    args = parser.parse_args()
+    run(args.requests, args.threads)
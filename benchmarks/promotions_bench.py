@@ -0,0 +1,116 @@
+"""
+Promotion engine benchmark
+
+Compiles 10k active promotions (category percentages, buy X get Y and cart
+thresholds) and measures how long evaluating a cart of 1 to 200 items takes,
+next to a plain loop checking every rule against every line. The rules are
+built in memory, no database is needed. The carts timed with the loop are also
+used to check the engine's results.
+
+Usage:
+    python -m benchmarks.promotions_bench --rules 10000 --repeat 200
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime
+
+# The auth models must be loaded first, they import the cart and order models
+from app.auth.models import User
+from app.promotions.engine import CompiledPromotions
+from app.promotions.models import PromotionKind, Promotions
+
+CART_SIZES = [1, 5, 10, 25, 50, 100, 200]
+PRODUCTS = 20_000
+CATEGORIES = 500
+
+
+# Random mix of rules: half category percentages, 40% buy X get Y, 10% cart thresholds
+def make_rules(count, rng):
+    rules = []
+    for promotion_id in range(1, count + 1):
+        draw = rng.random()
+        if draw < 0.5:
+            rule = Promotions(kind=PromotionKind.category_percent, category=f"category-{rng.randrange(CATEGORIES)}",
+                              percent_off=rng.randint(1, 50))
+        elif draw < 0.9:
+            rule = Promotions(kind=PromotionKind.buy_x_get_y, product_id=rng.randrange(1, PRODUCTS),
+                              buy_quantity=rng.randint(1, 4), get_quantity=rng.randint(1, 2))
+        else:
+            rule = Promotions(kind=PromotionKind.cart_threshold, min_subtotal=rng.randint(10, 5000),
+                              percent_off=rng.randint(1, 30))
+        rule.id = promotion_id
+        rules.append(rule)
+    return rules
+
+
+def make_cart(size, rng):
+    product_ids = rng.sample(range(1, PRODUCTS), size)
+    return (
+        product_ids,
+        [rng.randint(1, 6) for _ in product_ids],
+        [round(rng.uniform(1, 200), 2) for _ in product_ids],
+        [f"category-{product_id % CATEGORIES}" for product_id in product_ids],
+    )
+
+
+# Every rule against every line, the best discount of each line
+def naive(rules, product_ids, quantities, prices, categories):
+    subtotal = sum(quantity * price for quantity, price in zip(quantities, prices))
+    discounts = []
+    for product_id, quantity, price, category in zip(product_ids, quantities, prices, categories):
+        best = 0.0
+        for rule in rules:
+            if rule.kind == PromotionKind.category_percent and rule.category == category:
+                discount = quantity * price * rule.percent_off / 100
+            elif rule.kind == PromotionKind.buy_x_get_y and rule.product_id == product_id:
+                discount = quantity // (rule.buy_quantity + rule.get_quantity) * rule.get_quantity * price
+            elif rule.kind == PromotionKind.cart_threshold and subtotal >= rule.min_subtotal:
+                discount = quantity * price * rule.percent_off / 100
+            else:
+                continue
+            best = max(best, discount)
+        discounts.append(round(best, 2))
+    return discounts
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def run(rule_count, repeat, seed):
+    rng = random.Random(seed)
+    rules = make_rules(rule_count, rng)
+    compile_ms, compiled = timed(CompiledPromotions, rules, datetime.now())
+    print(f"Compiled {rule_count} rules in {compile_ms:.1f} ms")
+
+    print(f"{'items':>6} {'engine p50 ms':>14} {'engine p95 ms':>14} {'loop p50 ms':>12}")
+    for size in CART_SIZES:
+        engine_samples, loop_samples = [], []
+        for iteration in range(repeat):
+            cart = make_cart(size, rng)
+            engine_ms, (discounts, _) = timed(compiled.evaluate, *cart)
+            engine_samples.append(engine_ms)
+            # The loop is slow, a few runs are enough
+            if iteration < 5:
+                loop_ms, expected = timed(naive, rules, *cart)
+                loop_samples.append(loop_ms)
+                # Half cent ties may round either way in floating point
+                assert all(abs(got - want) < 0.011 for got, want in zip(discounts.tolist(), expected)), \
+                    "engine and loop disagree"
+        engine_samples.sort()
+        print(f"{size:>6} {statistics.median(engine_samples):>14.3f} "
+              f"{engine_samples[int(0.95 * (len(engine_samples) - 1))]:>14.3f} "
+              f"{statistics.median(loop_samples):>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure promotion evaluation latency by cart size")
+    parser.add_argument("--rules", type=int, default=10_000, help="Active promotions")
+    parser.add_argument("--repeat", type=int, default=200, help="Carts per cart size")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+    run(args.rules, args.repeat, args.seed)
@@ -0,0 +1,328 @@
+"""
+Synthetic data generator for scaling tests
+
+Loads users, products, orders with their items and carts into the database
+configured in .env, in volumes the app meets in production: millions of
+products and tens of millions of order items.
+
+- Deterministic: every chunk of rows is generated from --seed, the table and the
+  chunk number, so the same options produce the same rows whatever --workers is
+  (the order dates are relative to the day of the run).
+- Skewed like real traffic: product sales and user activity follow Zipf
+  distributions (--product-skew, --user-skew), categories differ in size, order
+  sizes are geometric around --items-per-order with a long tail and most lines
+  have a quantity of 1.
+- Fast: rows are generated with NumPy and bulk loaded with COPY, one chunk per
+  transaction, by --workers processes. The password is hashed once and shared
+  by every user. Order items and cart rows take their IDs from the table
+  sequences; the ID ranges of users, products and orders are reserved up front.
+
+Users are <tag>-user-<n>@example.com with the password of --password, user 0 is
+<tag>-admin@example.com with the admin role. Orders spread over the last
+--months months, their partitions are created first. Afterwards the tables are
+analyzed; recompute the product popularity and the sales rollups with
+`python -m app.products.popularity` and `python -m app.analytics.backfill`.
+
+Usage:
+    python -m benchmarks.seed_data --users 100000 --products 1000000 --orders 5000000 --workers 4
+"""
+import argparse
+import io
+import multiprocessing
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+from app.auth.utils import hash_password
+from app.core.config import settings
+from app.core.database import SessionLocal, get_engine
+from app.orders.partitions import add_months, create_partitions
+
+CATEGORY_WORDS = [
+    "electronics", "books", "kitchen", "garden", "toys", "sports", "fashion", "beauty", "automotive", "music",
+    "office", "pets", "health", "tools", "games", "furniture", "grocery", "baby", "outdoor", "jewelry",
+]
+ADJECTIVES = [
+    "red", "blue", "green", "black", "white", "steel", "wooden", "smart", "compact", "classic", "portable",
+    "silent", "solar", "wireless", "foldable", "premium", "vintage", "waterproof", "ergonomic", "mini",
+]
+NOUNS = [
+    "lamp", "chair", "kettle", "speaker", "backpack", "watch", "blender", "router", "jacket", "drill",
+    "notebook", "camera", "mug", "pillow", "bicycle", "charger", "headphones", "tent", "keyboard", "vase",
+]
+FIRST_NAMES = ["Asha", "Ben", "Chen", "Diana", "Emeka", "Farah", "Gabriel", "Hana", "Ivan", "Jun", "Kofi", "Lena"]
+LAST_NAMES = ["Patel", "Smith", "Wang", "Garcia", "Okafor", "Khan", "Silva", "Sato", "Petrov", "Kim", "Mensah"]
+
+# Numbers mixed into the seed of every chunk, so the tables draw independent rows
+STREAMS = {"users": 1, "products": 2, "orders": 3, "carts": 4, "product_ranks": 5, "user_ranks": 6}
+
+# Longest generated order and the skew of the category sizes
+MAX_ORDER_ITEMS = 100
+CATEGORY_SKEW = 0.8
+PAID_FRACTION = 0.95
+MAX_CART_ITEMS = 5
+
+# Options shared by the worker processes, set by _init_worker
+_plan = None
+_cache = {}
+
+
+# Everything a worker needs to generate any chunk
+class Plan:
+    def __init__(self, args, hashed_password: str, first_ids: dict, start: datetime, end: datetime):
+        self.seed = args.seed
+        self.tag = args.tag
+        self.users = args.users
+        self.products = args.products
+        self.orders = args.orders
+        self.categories = args.categories
+        self.chunk_size = args.chunk_size
+        self.items_per_order = args.items_per_order
+        self.product_skew = args.product_skew
+        self.user_skew = args.user_skew
+        self.cart_fraction = args.cart_fraction
+        self.hashed_password = hashed_password
+        self.first_ids = first_ids
+        self.start = np.datetime64(start, "s")
+        self.span_seconds = int((end - start).total_seconds())
+
+
+def chunk_rng(stream: str, index: int) -> np.random.Generator:
+    return np.random.default_rng([_plan.seed, STREAMS[stream], index])
+
+
+# Zipf weights over randomly ranked items, the most popular item is not simply the first ID
+def zipf_weights(stream: str, count: int, skew: float) -> np.ndarray:
+    ranks = np.random.default_rng([_plan.seed, STREAMS[stream]]).permutation(count)
+    weights = 1.0 / np.power(ranks + 1.0, skew)
+    return weights / weights.sum()
+
+
+# Drawn first from the chunk generator, so the order chunks can recompute the prices of every product
+def draw_prices(rng: np.random.Generator, count: int) -> np.ndarray:
+    return np.maximum(np.round(rng.lognormal(3.5, 1.0, count), 2), 0.5)
+
+
+def cached(name: str, build):
+    if name not in _cache:
+        _cache[name] = build()
+    return _cache[name]
+
+
+def product_prices() -> np.ndarray:
+    prices = np.empty(_plan.products)
+    for first in range(0, _plan.products, _plan.chunk_size):
+        count = min(_plan.chunk_size, _plan.products - first)
+        prices[first:first + count] = draw_prices(chunk_rng("products", first // _plan.chunk_size), count)
+    return prices
+
+
+def category_names() -> list:
+    return [
+        CATEGORY_WORDS[number % len(CATEGORY_WORDS)] + (f"-{number // len(CATEGORY_WORDS)}" if number >= len(CATEGORY_WORDS) else "")
+        for number in range(_plan.categories)
+    ]
+
+
+def csv_buffer(rows) -> io.StringIO:
+    return io.StringIO("".join(rows))
+
+
+def users_chunk(index: int, first: int, count: int) -> dict:
+    rng = chunk_rng("users", index)
+    first_names = rng.integers(0, len(FIRST_NAMES), count)
+    last_names = rng.integers(0, len(LAST_NAMES), count)
+    first_id, tag, hashed = _plan.first_ids["users"] + first, _plan.tag, _plan.hashed_password
+    rows = []
+    for offset in range(count):
+        number = first + offset
+        email, role = (f"{tag}-admin@example.com", "admin") if number == 0 else (f"{tag}-user-{number}@example.com", "user")
+        rows.append(f"{first_id + offset},{FIRST_NAMES[first_names[offset]]} {LAST_NAMES[last_names[offset]]},"
+                    f"{email},{hashed},{role}\n")
+    return {"users (id, name, email, hashed_password, role)": csv_buffer(rows)}
+
+
+def products_chunk(index: int, first: int, count: int) -> dict:
+    rng = chunk_rng("products", index)
+    prices = draw_prices(rng, count)
+    categories = cached("categories", category_names)
+    category = rng.choice(len(categories), count, p=cached(
+        "category_weights", lambda: zipf_weights("product_ranks", _plan.categories, CATEGORY_SKEW)))
+    adjectives = rng.integers(0, len(ADJECTIVES), count)
+    nouns = rng.integers(0, len(NOUNS), count)
+    stock = rng.integers(10, 10000, count)
+    first_id = _plan.first_ids["products"] + first
+    rows = []
+    for offset in range(count):
+        adjective, noun = ADJECTIVES[adjectives[offset]], NOUNS[nouns[offset]]
+        rows.append(f"{first_id + offset},{adjective} {noun} {first + offset},A {adjective} {noun} for everyday use,"
+                    f"{prices[offset]},{stock[offset]},{categories[category[offset]]},,0\n")
+    return {"products (id, name, description, price, stock, category, image_url, popularity)": csv_buffer(rows)}
+
+
+def orders_chunk(index: int, first: int, count: int) -> dict:
+    rng = chunk_rng("orders", index)
+    prices = cached("prices", product_prices)
+    product_weights = cached("product_weights", lambda: zipf_weights("product_ranks", _plan.products, _plan.product_skew))
+    user_weights = cached("user_weights", lambda: zipf_weights("user_ranks", _plan.users, _plan.user_skew))
+
+    order_ids = _plan.first_ids["orders"] + first + np.arange(count)
+    user_ids = _plan.first_ids["users"] + rng.choice(_plan.users, count, p=user_weights)
+    # Scaled uniform draws, an integer draw bounded by the span would consume a different amount of the stream each day
+    offsets = (rng.random(count) * _plan.span_seconds).astype("timedelta64[s]")
+    created = (_plan.start + offsets).astype(str)
+    sizes = np.minimum(rng.geometric(1.0 / _plan.items_per_order, count), MAX_ORDER_ITEMS)
+    paid = rng.random(count) < PAID_FRACTION
+
+    products = rng.choice(_plan.products, int(sizes.sum()), p=product_weights)
+    quantities = rng.geometric(0.7, len(products))
+    line_prices = prices[products]
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    totals = np.round(np.add.reduceat(quantities * line_prices, starts), 2)
+
+    order_rows = [
+        f"{order_ids[offset]},{user_ids[offset]},{totals[offset]},{'paid' if paid[offset] else 'cancelled'},"
+        f"{created[offset]}\n"
+        for offset in range(count)
+    ]
+    item_orders = np.repeat(np.arange(count), sizes)
+    product_ids = _plan.first_ids["products"] + products
+    item_rows = [
+        f"{order_ids[order]},{product_ids[line]},{quantities[line]},{line_prices[line]},0,,{created[order]}\n"
+        for line, order in enumerate(item_orders)
+    ]
+    return {
+        "orders (id, user_id, total_amount, status, created_at)": csv_buffer(order_rows),
+        "order_items (order_id, product_id, quantity, price_at_purchase, discount_amount, promotion_id, created_at)":
+            csv_buffer(item_rows),
+    }
+
+
+def carts_chunk(index: int, first: int, count: int) -> dict:
+    rng = chunk_rng("carts", index)
+    product_weights = cached("product_weights", lambda: zipf_weights("product_ranks", _plan.products, _plan.product_skew))
+    shoppers = first + np.flatnonzero(rng.random(count) < _plan.cart_fraction)
+    sizes = rng.integers(1, MAX_CART_ITEMS + 1, len(shoppers))
+    users = np.repeat(shoppers, sizes)
+    products = rng.choice(_plan.products, len(users), p=product_weights)
+    # One row per user and product, like adding the same product twice in the app
+    pairs = np.unique(np.stack([users, products], axis=1), axis=0)
+    quantities = rng.integers(1, 4, len(pairs))
+    user_base, product_base = _plan.first_ids["users"], _plan.first_ids["products"]
+    rows = [
+        f"{user_base + user},{product_base + product},{quantity}\n"
+        for (user, product), quantity in zip(pairs.tolist(), quantities.tolist())
+    ]
+    return {"cart (user_id, product_id, quantity)": csv_buffer(rows)}
+
+
+GENERATORS = {"users": users_chunk, "products": products_chunk, "orders": orders_chunk, "carts": carts_chunk}
+
+
+def _init_worker(plan: Plan):
+    global _plan
+    _plan = plan
+
+
+# Generate one chunk and COPY its rows in one transaction, returns the rows per table
+def load_chunk(task) -> dict:
+    kind, index, first, count = task
+    tables = GENERATORS[kind](index, first, count)
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        loaded = {}
+        for table, rows in tables.items():
+            cursor.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv)", rows)
+            loaded[table.split(" ")[0]] = cursor.rowcount
+        connection.commit()
+        return loaded
+    finally:
+        connection.close()
+
+
+# Reserve count IDs of the sequence of a table, returns the first
+def reserve_ids(db, table: str, count: int) -> int:
+    if count == 0:
+        return 1
+    last = db.execute(text(
+        "SELECT setval(pg_get_serial_sequence(:table, 'id'), nextval(pg_get_serial_sequence(:table, 'id')) + :count - 1)"
+    ), {"table": table, "count": count}).scalar()
+    return last - count + 1
+
+
+def chunks(kind: str, total: int, chunk_size: int):
+    return [(kind, index, first, min(chunk_size, total - first))
+            for index, first in enumerate(range(0, total, chunk_size))]
+
+
+def run_phase(pool, tasks, totals: dict):
+    started = time.perf_counter()
+    for loaded in pool.imap_unordered(load_chunk, tasks):
+        for table, rows in loaded.items():
+            totals[table] += rows
+        elapsed = time.perf_counter() - started
+        print(", ".join(f"{table} {rows:,}" for table, rows in totals.items()) + f" ({elapsed:.0f}s)")
+
+
+def run(args):
+    started = time.perf_counter()
+    end = datetime.utcnow().replace(microsecond=0)
+    start = datetime.combine(add_months(end.date().replace(day=1), -args.months), datetime.min.time())
+
+    db = SessionLocal()
+    try:
+        try:
+            create_partitions(db, settings.order_partition_months_ahead, args.months)
+        except Exception as e:
+            print(f"Could not create the order partitions of the last {args.months} months, "
+                  f"their orders go to the DEFAULT partition: {e}")
+        first_ids = {
+            "users": reserve_ids(db, "users", args.users),
+            "products": reserve_ids(db, "products", args.products),
+            "orders": reserve_ids(db, "orders", args.orders),
+        }
+        db.commit()
+    finally:
+        db.close()
+
+    plan = Plan(args, hash_password(args.password), first_ids, start, end)
+    totals = defaultdict(int)
+    # Spawned workers open their own connections instead of inheriting the pool of this process
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers, initializer=_init_worker, initargs=(plan,)) as pool:
+        run_phase(pool, chunks("users", args.users, args.chunk_size)
+                  + chunks("products", args.products, args.chunk_size), totals)
+        # Orders and carts reference the users and products
+        run_phase(pool, chunks("orders", args.orders, args.chunk_size)
+                  + (chunks("carts", args.users, args.chunk_size) if args.products else []), totals)
+
+    with get_engine().connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute(
+            text("ANALYZE users, products, orders, order_items, cart")
+        )
+    print(f"Loaded in {time.perf_counter() - started:.1f}s. Recompute the popularity and the sales rollups with "
+          f"python -m app.products.popularity and python -m app.analytics.backfill")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load deterministic synthetic users, products, orders and carts")
+    parser.add_argument("--users", type=int, default=10000, help="Users, user 0 is an admin")
+    parser.add_argument("--products", type=int, default=100000, help="Products")
+    parser.add_argument("--orders", type=int, default=100000, help="Orders, with their items")
+    parser.add_argument("--items-per-order", type=float, default=3, help="Mean items of an order")
+    parser.add_argument("--categories", type=int, default=50, help="Product categories")
+    parser.add_argument("--product-skew", type=float, default=1.1, help="Zipf exponent of the product sales")
+    parser.add_argument("--user-skew", type=float, default=0.7, help="Zipf exponent of the orders per user")
+    parser.add_argument("--cart-fraction", type=float, default=0.05, help="Share of the users with a filled cart")
+    parser.add_argument("--months", type=int, default=12, help="Months of order history")
+    parser.add_argument("--tag", default="seed", help="Prefix of the user emails, must differ between loads")
+    parser.add_argument("--password", default="seed-password", help="Password of every generated user")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the generated data")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="Loading processes")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows generated and loaded per transaction")
+    args = parser.parse_args()
+    run(args)
@@ -0,0 +1,110 @@
+"""
+Startup benchmark: import time and time to first request
+
+Creates the app with app.main.create_app() in fresh interpreters with
+`python -X importtime` and reports the median time spent importing, with the
+packages that take the most of it, then starts
+the API with uvicorn and measures the time until the first product listing is
+served (interpreter start, imports, lifespan startup and one database request).
+Creating the app must not connect to the database; the first request needs the
+database configured in .env with the schema created by alembic.
+
+With --budget-ms the benchmark exits with status 1 when the median import time
+is over the budget, so it can guard the import time in CI.
+
+Usage:
+    python -m benchmarks.startup_bench --runs 5 --budget-ms 2000
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+FIRST_REQUEST_PATH = "/products/?page_size=1"
+STARTUP_TIMEOUT_SECONDS = 60
+TOP_PACKAGES = 10
+
+
+# Self time per top level package and the total import time of creating the app, in milliseconds
+def import_profile():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from app.main import create_app; create_app()"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Creating the app failed:\n{result.stderr[-2000:]}")
+
+    packages = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        packages[name.split(".")[0]] += int(self_us) / 1000
+    return sum(packages.values()), packages
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Seconds from starting uvicorn until the first product listing is answered
+def time_to_first_request() -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "app.main:create_app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < STARTUP_TIMEOUT_SECONDS:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}{FIRST_REQUEST_PATH}", timeout=5)
+                if response.status_code < 500:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("The server did not answer")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(runs: int, budget_ms: float):
+    totals, packages = [], defaultdict(list)
+    for _ in range(runs):
+        total, profile = import_profile()
+        totals.append(total)
+        for package, ms in profile.items():
+            packages[package].append(ms)
+
+    median = statistics.median(totals)
+    print(f"imports of create_app(): median {median:.0f} ms, min {min(totals):.0f} ms over {runs} runs")
+    print(f"{'package':>24} {'self ms':>9}")
+    slowest = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:TOP_PACKAGES]
+    for package, times in slowest:
+        print(f"{package:>24} {statistics.median(times):>9.1f}")
+
+    first = [time_to_first_request() for _ in range(runs)]
+    print(f"time to first request: median {statistics.median(first) * 1000:.0f} ms, "
+          f"min {min(first) * 1000:.0f} ms")
+
+    if budget_ms and median > budget_ms:
+        print(f"Import time {median:.0f} ms is over the budget of {budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import time and time to first request of the API")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--budget-ms", type=float, default=0, help="Fail when the median import time is higher")
+    args = parser.parse_args()
+    run(args.runs, args.budget_ms)
@@ -0,0 +1,401 @@
+"""
+Mixed workload benchmark for every public router
+
+Seeds products, users and past orders into the database configured in .env,
+starts the API with uvicorn and keeps --concurrency clients busy for --duration
+seconds with a weighted mix of scenarios:
+
+    browse          product listing by category, sort order and page
+    product_detail  one product
+    search          keyword search
+    related         products bought together with one product
+    cart_churn      add an item, change its quantity and remove it
+    cart_view       cart with the promotion preview
+    checkout        add 1-3 items and check out
+    order_history   first page of the order history
+    order_detail    one order of the user
+    sign_in         sign in with the password (bcrypt, CPU heavy)
+
+Every client has its own user and its own random generator derived from --seed,
+so two runs with the same options send the same requests. Throughput and the
+p50/p95/p99 latency are reported per endpoint. --save stores the results as
+JSON; --baseline compares against stored results and exits with status 1 when an
+endpoint got slower, or the total throughput dropped, by more than
+--max-regression. The seeded rows and the orders placed by the run are removed
+afterwards; the daily sales totals keep the checkouts of the run.
+
+Usage:
+    python -m benchmarks.workload_bench --concurrency 20 --duration 30 --save baseline.json
+    python -m benchmarks.workload_bench --concurrency 20 --duration 30 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import delete, insert, select
+
+from app.analytics.models import SalesDailyCategory
+from app.auth.models import User
+from app.auth.utils import create_access_token, hash_password
+from app.cart.models import Cart
+from app.core.database import SessionLocal
+from app.idempotency.models import IdempotencyKeys
+from app.orders.models import OrderItem, Orders, OrderStatus
+from app.products.models import Products
+from benchmarks.load_bench import free_port, percentile, start_server, wait_ready
+
+PASSWORD = "workload-bench"
+CATEGORIES = 10
+ADJECTIVES = ["red", "blue", "steel", "wooden", "smart", "compact", "classic", "portable", "silent", "solar"]
+NOUNS = ["lamp", "chair", "kettle", "speaker", "backpack", "watch", "blender", "router", "jacket", "drill"]
+
+# Scenario -> weight in the mix
+DEFAULT_MIX = {
+    "browse": 30, "product_detail": 15, "search": 8, "related": 5, "cart_churn": 12,
+    "cart_view": 10, "checkout": 5, "order_history": 10, "order_detail": 4, "sign_in": 1,
+}
+
+# Scenario results that are part of the workload and not errors
+EXPECTED_STATUSES = {"GET /products/search": {404}, "POST /checkout/": {400, 409}}
+
+
+# Seeded rows of one run
+class Dataset:
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.categories = [f"wl-{run_id}-{number}" for number in range(CATEGORIES)]
+        self.product_ids = []
+        # (user ID, email, headers) per client
+        self.users = []
+        # User ID -> IDs of its orders, the clients add the orders they place
+        self.order_ids = defaultdict(list)
+
+
+"""
+Insert the products, the users and their past orders of a run.
+
+Args:
+    run_id: Suffix of the seeded names and emails
+    products: Number of products
+    users: Number of users, one per client
+    orders_per_user: Paid orders of every user, spread over the last 60 days
+    seed: Seed of the generated data
+
+Returns:
+    Dataset: IDs and credentials of the seeded rows
+"""
+def seed(run_id: str, products: int, users: int, orders_per_user: int, seed: int) -> Dataset:
+    rng = random.Random(seed)
+    dataset = Dataset(run_id)
+    db = SessionLocal()
+    try:
+        rows = []
+        for number in range(products):
+            adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+            rows.append({
+                "name": f"{adjective} {noun} {number}", "description": f"A {adjective} {noun} for the workload benchmark",
+                "price": round(rng.uniform(2, 500), 2), "stock": 1_000_000,
+                "category": dataset.categories[number % CATEGORIES], "image_url": "",
+            })
+        dataset.product_ids = db.execute(
+            insert(Products).returning(Products.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        # One bcrypt hash for every user, hashing per user would take most of the setup
+        hashed_password = hash_password(PASSWORD)
+        emails = [f"wl-{number}-{run_id}@example.com" for number in range(users)]
+        user_ids = db.execute(insert(User).returning(User.id, sort_by_parameter_order=True), [
+            {"name": "Workload Bench", "email": email, "hashed_password": hashed_password, "role": "user"}
+            for email in emails
+        ]).scalars().all()
+        for user_id, email in zip(user_ids, emails):
+            token = create_access_token(data={"sub": str(user_id), "role": "user"})
+            dataset.users.append((user_id, email, {"Authorization": f"Bearer {token}"}))
+
+        now = datetime.utcnow()
+        orders = [
+            {"user_id": user_id, "total_amount": 0, "status": OrderStatus.paid,
+             "created_at": now - timedelta(minutes=rng.randint(60, 60 * 24 * 60))}
+            for user_id in user_ids for _ in range(orders_per_user)
+        ]
+        if orders:
+            created = db.execute(
+                insert(Orders).returning(Orders.id, sort_by_parameter_order=True), orders
+            ).scalars().all()
+            items = []
+            for order_id, order in zip(created, orders):
+                dataset.order_ids[order["user_id"]].append(order_id)
+                for product_id in rng.sample(dataset.product_ids, rng.randint(1, 4)):
+                    items.append({"order_id": order_id, "product_id": product_id, "quantity": rng.randint(1, 3),
+                                  "price_at_purchase": 10.0, "created_at": order["created_at"]})
+            db.execute(insert(OrderItem), items)
+        db.commit()
+    finally:
+        db.close()
+    return dataset
+
+
+# Remove the seeded rows and everything the run created for its users
+def teardown(dataset: Dataset):
+    db = SessionLocal()
+    try:
+        user_ids = select(User.id).where(User.email.like(f"wl-%-{dataset.run_id}@example.com"))
+        order_ids = select(Orders.id).where(Orders.user_id.in_(user_ids))
+        db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+        db.execute(delete(Orders).where(Orders.user_id.in_(user_ids)))
+        db.execute(delete(Cart).where(Cart.user_id.in_(user_ids)))
+        db.execute(delete(IdempotencyKeys).where(IdempotencyKeys.user_id.in_(user_ids)))
+        db.execute(delete(SalesDailyCategory).where(SalesDailyCategory.category.in_(dataset.categories)))
+        db.execute(delete(Products).where(Products.id.in_(dataset.product_ids)))
+        db.execute(delete(User).where(User.email.like(f"wl-%-{dataset.run_id}@example.com")))
+        db.commit()
+    finally:
+        db.close()
+
+
+# Latencies and errors per endpoint
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, http: httpx.AsyncClient, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await http.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+        if response is None or (response.status_code >= 400
+                                and response.status_code not in EXPECTED_STATUSES.get(endpoint, ())):
+            self.errors[endpoint] += 1
+        return response
+
+
+# State of one client: its user, random generator and the recorder of the current phase
+class Client:
+    def __init__(self, http: httpx.AsyncClient, dataset: Dataset, user, rng: random.Random):
+        self.http = http
+        self.dataset = dataset
+        self.user_id, self.email, self.headers = user
+        self.rng = rng
+        self.recorder = None
+
+    def request(self, endpoint: str, method: str, path: str, **kwargs):
+        return self.recorder.request(self.http, endpoint, method, path, **kwargs)
+
+    def product_id(self) -> int:
+        return self.rng.choice(self.dataset.product_ids)
+
+    async def browse(self):
+        params = {"category": self.rng.choice(self.dataset.categories), "page": self.rng.randint(1, 3),
+                  "page_size": 20, "sort_by": self.rng.choice(["price_asc", "price_desc", "popularity"])}
+        await self.request("GET /products/", "GET", "/products/", params=params)
+
+    async def product_detail(self):
+        await self.request("GET /products/{product_id}", "GET", f"/products/{self.product_id()}")
+
+    async def search(self):
+        keyword = f"{self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)}"
+        await self.request("GET /products/search", "GET", "/products/search", params={"keyword": keyword})
+
+    async def related(self):
+        await self.request("GET /products/{product_id}/related", "GET",
+                           f"/products/{self.product_id()}/related", params={"limit": 10})
+
+    async def cart_churn(self):
+        product_id = self.product_id()
+        await self.request("POST /cart/", "POST", "/cart/", headers=self.headers,
+                           json={"product_id": product_id, "quantity": 1})
+        await self.request("PUT /cart/{product_id}", "PUT", f"/cart/{product_id}", headers=self.headers,
+                           json={"quantity": self.rng.randint(2, 5)})
+        await self.request("DELETE /cart/{product_id}", "DELETE", f"/cart/{product_id}", headers=self.headers)
+
+    async def cart_view(self):
+        await self.request("GET /cart/", "GET", "/cart/", headers=self.headers)
+
+    async def checkout(self):
+        for product_id in self.rng.sample(self.dataset.product_ids, self.rng.randint(1, 3)):
+            await self.request("POST /cart/", "POST", "/cart/", headers=self.headers,
+                               json={"product_id": product_id, "quantity": 1})
+        response = await self.request("POST /checkout/", "POST", "/checkout/", headers=self.headers)
+        if response is not None and response.status_code in (200, 202):
+            self.dataset.order_ids[self.user_id].append(response.json()["order_id"])
+
+    async def order_history(self):
+        await self.request("GET /orders/", "GET", "/orders/", headers=self.headers, params={"limit": 20})
+
+    async def order_detail(self):
+        order_ids = self.dataset.order_ids[self.user_id]
+        if order_ids:
+            await self.request("GET /orders/{order_id}", "GET", f"/orders/{self.rng.choice(order_ids)}",
+                               headers=self.headers)
+
+    async def sign_in(self):
+        await self.request("POST /auth/signin", "POST", "/auth/signin", json={"email": self.email, "password": PASSWORD})
+
+    async def run(self, mix: dict, recorder: Recorder, stop_at: float):
+        self.recorder = recorder
+        scenarios, weights = [getattr(self, name) for name in mix], list(mix.values())
+        while time.monotonic() < stop_at:
+            await self.rng.choices(scenarios, weights)[0]()
+
+
+async def drive(base_url: str, dataset: Dataset, mix: dict, concurrency: int, duration: float, warmup: float,
+                seed: int) -> Recorder:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        clients = [Client(http, dataset, dataset.users[number], random.Random(seed * 1000 + number))
+                   for number in range(concurrency)]
+        if warmup:
+            stop_at = time.monotonic() + warmup
+            await asyncio.gather(*(client.run(mix, Recorder(), stop_at) for client in clients))
+        recorder = Recorder()
+        stop_at = time.monotonic() + duration
+        await asyncio.gather(*(client.run(mix, recorder, stop_at) for client in clients))
+    return recorder
+
+
+def summarize(recorder: Recorder, duration: float) -> dict:
+    endpoints = {}
+    everything = []
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        everything += latencies
+        endpoints[endpoint] = {
+            "requests": len(latencies), "rps": round(len(latencies) / duration, 2),
+            "p50_ms": round(percentile(latencies, 0.5), 2), "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2), "errors": recorder.errors[endpoint],
+        }
+    everything.sort()
+    total = {
+        "requests": len(everything), "rps": round(len(everything) / duration, 2),
+        "p50_ms": round(percentile(everything, 0.5), 2) if everything else 0,
+        "p95_ms": round(percentile(everything, 0.95), 2) if everything else 0,
+        "p99_ms": round(percentile(everything, 0.99), 2) if everything else 0,
+        "errors": sum(recorder.errors.values()),
+    }
+    return {"endpoints": endpoints, "total": total}
+
+
+def print_results(results: dict):
+    print(f"{'endpoint':>34} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    rows = list(results["endpoints"].items()) + [("total", results["total"])]
+    for endpoint, row in rows:
+        print(f"{endpoint:>34} {row['requests']:>9} {row['rps']:>8.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['errors']:>7}")
+
+
+"""
+Compare results with a baseline.
+
+An endpoint regressed when its p95 is more than max_regression higher and at
+least min_delta_ms slower than in the baseline, so very fast endpoints do not
+fail on noise. Endpoints with fewer than min_requests requests in either run
+are shown but not judged, their p95 is mostly noise. The run regressed when the total throughput is more than
+max_regression lower, or when an endpoint has errors it did not have before.
+
+Returns:
+    list: Description of every regression, empty when there is none
+"""
+def compare(results: dict, baseline: dict, max_regression: float, min_delta_ms: float, min_requests: int) -> list:
+    regressions = []
+    print(f"\n{'endpoint':>34} {'base p95':>9} {'p95':>8} {'change':>8}")
+    for endpoint, row in results["endpoints"].items():
+        base = baseline["endpoints"].get(endpoint)
+        if base is None:
+            continue
+        change = (row["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0
+        judged = min(row["requests"], base["requests"]) >= min_requests
+        print(f"{endpoint:>34} {base['p95_ms']:>9.1f} {row['p95_ms']:>8.1f} {change:>+8.0%}"
+              f"{'' if judged else '  (too few requests)'}")
+        if judged and change > max_regression and row["p95_ms"] - base["p95_ms"] >= min_delta_ms:
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']} ms -> {row['p95_ms']} ms ({change:+.0%})")
+        if row["errors"] and not base["errors"]:
+            regressions.append(f"{endpoint}: {row['errors']} errors, none in the baseline")
+
+    base_rps, rps = baseline["total"]["rps"], results["total"]["rps"]
+    if base_rps and (base_rps - rps) / base_rps > max_regression:
+        regressions.append(f"throughput {base_rps} -> {rps} req/s ({(rps - base_rps) / base_rps:+.0%})")
+    return regressions
+
+
+def parse_mix(value: str) -> dict:
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, value.split(",")):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name}, choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def run(args):
+    run_id = uuid.uuid4().hex[:8]
+    dataset = seed(run_id, args.products, args.concurrency, args.orders_per_user, args.seed)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(args.db_mode, port)
+    try:
+        wait_ready(base_url)
+        recorder = asyncio.run(drive(base_url, dataset, args.mix, args.concurrency, args.duration, args.warmup,
+                                     args.seed))
+    finally:
+        server.terminate()
+        server.wait()
+        teardown(dataset)
+
+    results = summarize(recorder, args.duration)
+    results["config"] = {
+        "db_mode": args.db_mode, "concurrency": args.concurrency, "duration": args.duration,
+        "products": args.products, "orders_per_user": args.orders_per_user, "seed": args.seed, "mix": args.mix,
+    }
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nResults saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        changed = [key for key, value in results["config"].items()
+                   if key != "duration" and baseline.get("config", {}).get(key) != value]
+        if changed:
+            print(f"\nThe baseline was recorded with another {', '.join(changed)}, the numbers are not comparable")
+        regressions = compare(results, baseline, args.max_regression, args.min_delta_ms, args.min_requests)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regression against the baseline")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive a mixed workload against every router")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients, each with its own user")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before measuring")
+    parser.add_argument("--db-mode", choices=["sync", "async"], default="sync", help="db_mode of the server")
+    parser.add_argument("--products", type=int, default=2000, help="Seeded products")
+    parser.add_argument("--orders-per-user", type=int, default=20, help="Seeded past orders per user")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the data and of the requests")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="Scenario weights to change, e.g. checkout=10,sign_in=0")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results saved by --save")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed p95 increase and throughput drop, as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=5, help="Smallest p95 increase that counts")
+    parser.add_argument("--min-requests", type=int, default=100, help="Fewest requests of a judged endpoint")
+    args = parser.parse_args()
+    run(args)
@@ -0,0 +1,80 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+
+"""
+Tests run against the database configured in .env or the environment, like the
+application. The tests needing it take the database fixture and are skipped when
+no database is configured or it does not answer.
+"""
+def database_error():
+    try:
+        from app.core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT 1"))
+        finally:
+            db.close()
+    except Exception as e:
+        return str(e).splitlines()[0]
+    return None
+
+
+@pytest.fixture(scope="session")
+def database():
+    error = database_error()
+    if error is not None:
+        pytest.skip(f"No database configured: {error}")
+
+
+# Application with its lifespan, against the configured database
+@pytest.fixture(scope="session")
+def client(database):
+    from fastapi.testclient import TestClient
+
+    from app.main import create_app
+
+    with TestClient(create_app()) as client:
+        yield client
+
+
+"""
+Sign up users and admins for a test, they are deleted with their orders, cart and
+idempotency keys afterwards.
+
+Returns:
+    Function returning the Authorization header of a new user with the given role
+"""
+@pytest.fixture
+def sign_up(client):
+    suffix = uuid.uuid4().hex[:8]
+
+    def sign_up(role: str = "user") -> dict:
+        email = f"{role}-{uuid.uuid4().hex[:6]}-{suffix}@example.com"
+        client.post("/auth/signup", json={"name": "Tester", "email": email, "password": "secret123", "role": role})
+        response = client.post("/auth/signin", json={"email": email, "password": "secret123"})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    yield sign_up
+
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        user_ids = db.execute(
+            text("SELECT id FROM users WHERE email LIKE :pattern"), {"pattern": f"%-{suffix}@example.com"}
+        ).scalars().all()
+        for table in ("idempotency_keys", "cart"):
+            db.execute(text(f"DELETE FROM {table} WHERE user_id = ANY(:ids)"), {"ids": user_ids})
+        db.execute(
+            text("DELETE FROM order_items WHERE order_id IN (SELECT id FROM orders WHERE user_id = ANY(:ids))"),
+            {"ids": user_ids},
+        )
+        db.execute(text("DELETE FROM orders WHERE user_id = ANY(:ids)"), {"ids": user_ids})
+        db.execute(text("DELETE FROM users WHERE id = ANY(:ids)"), {"ids": user_ids})
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,54 @@
+import pytest
+
+from app.monitoring.sql import QueryBudgetExceeded, assert_query_budget
+
+
+"""
+Query budgets of the order detail and checkout, pinned with the headers of
+QueryStatsMiddleware. The budgets do not depend on the number of items: a
+statement run per item fails on max_repeats before it shows in the count.
+"""
+
+ITEMS = 5
+
+# Authentication, then the order with its items in one statement
+ORDER_DETAIL_BUDGET = 2
+
+# Authentication, reservation (cart lines, expired pending orders, pending check, new order),
+# completion (status, items, cart, popularity) and the three daily sales rollups
+CHECKOUT_BUDGET = 12
+
+
+@pytest.fixture
+def cart(client, sign_up):
+    admin, user = sign_up("admin"), sign_up("user")
+    for number in range(ITEMS):
+        product = client.post("/admin/products/", json={
+            "name": f"Budget {number}", "description": "d", "price": 10.0, "stock": 10, "category": "budget",
+            "image_url": "x",
+        }, headers=admin).json()
+        client.post("/cart/", json={"product_id": product["id"], "quantity": 1}, headers=user)
+    return user
+
+
+def test_checkout_query_budget(client, cart):
+    response = client.post("/checkout/", headers=cart)
+    assert response.status_code in (200, 202)
+    assert_query_budget(response, CHECKOUT_BUDGET)
+
+
+def test_order_detail_query_budget(client, cart):
+    order = client.post("/checkout/", headers=cart).json()
+    # A queued order gets its items from the order workers
+    client.get(f"/checkout/{order['order_id']}/status", params={"wait": 10}, headers=cart)
+
+    response = client.get(f"/orders/{order['order_id']}", headers=cart)
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == ITEMS
+    assert_query_budget(response, ORDER_DETAIL_BUDGET)
+
+
+def test_budget_exceeded_names_the_route(client, cart):
+    response = client.get("/cart/", headers=cart)
+    with pytest.raises(QueryBudgetExceeded, match="GET /cart/ ran"):
+        assert_query_budget(response, 0)
@@ -0,0 +1,12 @@
+from pathlib import Path
+
+
+# Taken with: python -m app.monitoring.plans --no-seqscan --save query_plans.json
+SNAPSHOT = Path(__file__).resolve().parent.parent / "query_plans.json"
+
+
+def test_query_plans_match_the_snapshot(database):
+    from app.monitoring.plans import check_plans
+
+    regressions = check_plans(str(SNAPSHOT))
+    assert not regressions, "\n".join(regressions)
@@ -0,0 +1,131 @@
+import time
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+
+"""
+Routing of reads to a streaming replica, with the primary of .env and the replica
+of DB_REPLICA_HOSTS as two local database instances, e.g.
+
+    pg_basebackup -h localhost -U postgres -D /tmp/replica -R -X stream
+    pg_ctl -D /tmp/replica -o "-p 5433" start
+    DB_REPLICA_HOSTS=localhost:5433 pytest tests/test_replicas.py
+
+Pausing the replay and stopping the WAL receiver need a superuser on the replica.
+"""
+
+MAX_LAG_SECONDS = 1.0
+
+
+@pytest.fixture
+def router(database):
+    from app.core.config import settings
+    from app.core.replicas import ReplicaRouter
+
+    if not settings.db_replica_hosts:
+        pytest.skip("No replica configured in DB_REPLICA_HOSTS")
+    router = ReplicaRouter()
+    # Creates the replica engines, the checks below run in the test
+    router.start()
+    router.stop()
+    router.max_lag = MAX_LAG_SECONDS
+    yield router
+    for replica in router.replicas:
+        replica.engine.dispose()
+
+
+def run_on_replica(router, sql: str):
+    with router.replicas[0].engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        result = connection.execute(text(sql))
+        return result.scalar() if result.returns_rows else None
+
+
+def run_on_primary(sql: str, **params):
+    from app.core.database import get_engine
+
+    with get_engine().begin() as connection:
+        result = connection.execute(text(sql), params)
+        return result.scalar() if result.returns_rows else None
+
+
+def wait_until(condition, seconds: float = 15.0):
+    deadline = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.2)
+    return True
+
+
+def checked_healthy(router) -> bool:
+    router.check()
+    return router.replicas[0].healthy
+
+
+def test_streaming_replica_serves_reads(router):
+    router.check()
+    replica = router.replicas[0]
+    assert replica.healthy, replica.error
+    assert router.pick(None) is replica
+
+    # A row written on the primary is read from the replica
+    name = f"replica-test-{uuid.uuid4().hex[:8]}"
+    product_id = run_on_primary(
+        "INSERT INTO products (name, price, stock) VALUES (:name, 1, 1) RETURNING id", name=name
+    )
+    try:
+        def replicated():
+            read_db = router.pick(None).sessionmaker()
+            try:
+                return read_db.execute(text("SELECT name FROM products WHERE id = :id"), {"id": product_id}).scalar()
+            finally:
+                read_db.close()
+
+        assert wait_until(lambda: replicated() == name)
+    finally:
+        run_on_primary("DELETE FROM products WHERE id = :id", id=product_id)
+
+
+def test_writer_reads_from_primary(router):
+    router.check()
+    router.mark_write(1)
+    assert router.pick(1) is None
+    assert router.pick(2) is router.replicas[0]
+
+
+def test_lagging_replica_is_ejected(router):
+    product_id = run_on_primary("INSERT INTO products (name, price, stock) VALUES ('replica-lag', 1, 1) RETURNING id")
+    run_on_replica(router, "SELECT pg_wal_replay_pause()")
+    try:
+        # The replica receives the updates but does not replay them
+        run_on_primary("UPDATE products SET stock = stock + 1 WHERE id = :id", id=product_id)
+        time.sleep(MAX_LAG_SECONDS + 0.5)
+        run_on_primary("UPDATE products SET stock = stock + 1 WHERE id = :id", id=product_id)
+        assert wait_until(lambda: not checked_healthy(router))
+        assert "behind the primary" in router.replicas[0].error
+        assert router.pick(None) is None
+    finally:
+        run_on_replica(router, "SELECT pg_wal_replay_resume()")
+        run_on_primary("DELETE FROM products WHERE id = :id", id=product_id)
+
+    assert wait_until(lambda: checked_healthy(router))
+    assert router.pick(None) is router.replicas[0]
+
+
+def test_replica_without_wal_receiver_is_ejected(router):
+    # Everything received is replayed, so the replica shows no lag while it stops receiving
+    primary_conninfo = run_on_replica(router, "SHOW primary_conninfo")
+    run_on_replica(router, "ALTER SYSTEM SET primary_conninfo = ''")
+    run_on_replica(router, "SELECT pg_reload_conf()")
+    try:
+        assert wait_until(lambda: not checked_healthy(router))
+        assert router.replicas[0].error == "not streaming from the primary"
+        assert router.replicas[0].lag_seconds == 0
+        assert router.pick(None) is None
+    finally:
+        run_on_replica(router, f"ALTER SYSTEM SET primary_conninfo = '{primary_conninfo.replace(chr(39), chr(39) * 2)}'")
+        run_on_replica(router, "SELECT pg_reload_conf()")
+
+    assert wait_until(lambda: checked_healthy(router), seconds=30)